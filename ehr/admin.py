@@ -3,7 +3,7 @@ from django.contrib import admin
 # Register your models here.
 # ehr/admin.py
 from django.contrib import admin
-from .models import Patient, Practitioner, Observation
+from .models import Patient, Practitioner, Observation, PatientRiskSummary
 
 @admin.register(Patient)
 class PatientAdmin(admin.ModelAdmin):
@@ -15,10 +15,18 @@ class PatientAdmin(admin.ModelAdmin):
 class ObservationAdmin(admin.ModelAdmin):
     list_display = ("code","value","patient","effective_date", "performer")
     search_fields = ("code","value","patient__family","remarks")
-    list_filter = ("code",)
+    list_filter = ("code", "confirmed_outcome")
     readonly_fields = ()
 
 
+@admin.register(PatientRiskSummary)
+class PatientRiskSummaryAdmin(admin.ModelAdmin):
+    list_display = ("disease_key", "risk_score", "alert", "risk_band", "patient", "effective_date")
+    search_fields = ("deidentified_patient_hash", "patient__family")
+    list_filter = ("disease_key", "alert", "risk_band")
+    readonly_fields = ("observation",)
+
+
 @admin.register(Practitioner)
 class PractitionerAdmin(admin.ModelAdmin):
     list_display = ("name", "identifier", "specialty", "user")
@@ -0,0 +1,79 @@
+# ehr/explanations.py
+"""
+Why a self-check score is high: per-feature contributions (see
+ml_nhanes_module/explain.py), kept on Observation.explanation.
+
+Scoring never computes them. The first time a scored Observation is viewed,
+get_explanation() computes them from its stored features and saves them, so
+later views read the JSON. explain_observations() does the same for many rows
+with one batched call per disease (cohort reports, backfills).
+An explanation must come from the model version that scored the Observation
+(Observation.model_version): once another version is promoted, unexplained
+Observations of the old one are not explained. Rows scored before versions were
+recorded (model_version empty) are explained by the served version.
+"""
+import logging
+
+from . import ml_nhanes_module as ml
+from .models import Observation
+
+logger = logging.getLogger("ehr.explanations")
+
+
+def explainable(obs):
+    return bool(obs.disease_key and obs.features and obs.scoring_status == Observation.SCORING_DONE)
+
+
+def same_version(obs, version):
+    """Whether an explanation by model version `version` describes obs's score."""
+    return not obs.model_version or obs.model_version == version
+
+
+def get_explanation(obs):
+    """
+    The cached explanation of obs, computed and saved on first use. None if obs cannot be
+    explained, including when the model version that scored it is no longer served.
+    """
+    if obs.explanation is not None:
+        return obs.explanation if same_version(obs, obs.explanation.get("model_version")) else None
+    if not explainable(obs) or not same_version(obs, ml.active_version()):
+        return None
+    try:
+        explanation = ml.explain(obs.disease_key, obs.features)
+    except Exception as e:
+        logger.warning("could not explain observation %s: %s", obs.pk, e)
+        return None
+    # a promotion may land between the check above and explain()
+    if not same_version(obs, explanation["model_version"]):
+        return None
+    obs.explanation = explanation
+    # a conditional update: a concurrent first view must not overwrite anything but an empty cache
+    Observation.objects.filter(pk=obs.pk, explanation__isnull=True).update(explanation=obs.explanation)
+    return obs.explanation
+
+
+def explain_observations(observations, approximate=False):
+    """
+    Fill in the missing explanations of observations (any iterable), one batched
+    explain_many call and one bulk_update per disease. Returns the number explained.
+    """
+    version = ml.active_version()
+    by_disease = {}
+    for obs in observations:
+        if obs.explanation is None and explainable(obs) and same_version(obs, version):
+            by_disease.setdefault(obs.disease_key, []).append(obs)
+
+    done = 0
+    for disease, batch in by_disease.items():
+        try:
+            records = ml.explain_many(disease, [obs.features for obs in batch], approximate=approximate)
+        except Exception as e:
+            logger.warning("could not explain %d %s observations: %s", len(batch), disease, e)
+            continue
+        # a promotion may land between the version check and explain_many()
+        batch = [(obs, record) for obs, record in zip(batch, records) if same_version(obs, record["model_version"])]
+        for obs, record in batch:
+            obs.explanation = record
+        Observation.objects.bulk_update([obs for obs, _record in batch], ["explanation"])
+        done += len(batch)
+    return done
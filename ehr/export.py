@@ -0,0 +1,157 @@
+# ehr/export.py
+"""
+Streaming bulk export of deidentified observations (NDJSON, CSV or Parquet).
+
+Rows are read with values_list(...).iterator(chunk_size), a server-side cursor
+on PostgreSQL, and every chunk is encoded and handed to StreamingHttpResponse
+before the next one is fetched, so memory stays flat however many rows are
+exported. `features` is read as its stored JSON text and written as-is instead
+of being decoded and re-encoded per row. The columns are the fields of
+DeidentifiedObservationSerializer, formatted the way the paged API formats
+them; Parquet needs pyarrow.
+"""
+import csv
+import io
+import json
+import logging
+
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from rest_framework.fields import DateTimeField
+
+from .serializers import DeidentifiedObservationSerializer
+
+logger = logging.getLogger("ehr.audit")
+
+FIELDS = list(DeidentifiedObservationSerializer.Meta.fields)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+CHUNK_SIZE = 2000
+
+
+def export_chunks(queryset, chunk_size=CHUNK_SIZE, text_dates=True):
+    """
+    Lists of up to chunk_size rows in FIELDS order: features as JSON text, ids as str and
+    effective_date as the API's ISO 8601 string (a datetime with text_dates=False).
+    """
+    to_iso = DateTimeField().to_representation if text_dates else None
+    columns = [("features_json" if f == "features" else f) for f in FIELDS]
+    rows = (queryset.annotate(features_json=Cast("features", TextField()))
+            .values_list(*columns).iterator(chunk_size=chunk_size))
+    id_at, date_at = FIELDS.index("id"), FIELDS.index("effective_date")
+    chunk = []
+    for row in rows:
+        row = list(row)
+        row[id_at] = str(row[id_at])
+        if to_iso:
+            row[date_at] = to_iso(row[date_at])
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ndjson(chunks):
+    features_at = FIELDS.index("features")
+    rest = [f for f in FIELDS if f != "features"]
+    for chunk in chunks:
+        lines = []
+        for row in chunk:
+            features = row.pop(features_at)
+            # splice the stored JSON text in instead of re-encoding it
+            head = json.dumps(dict(zip(rest, row)), separators=(",", ":"))
+            lines.append(f'{head[:-1]},"features":{features or "null"}}}\n')
+        yield "".join(lines).encode("utf-8")
+
+
+def _csv(chunks):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(FIELDS)
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands over what was written since the last take()."""
+
+    def __init__(self):
+        self.parts, self.pos = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def take(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {"risk_score": pa.float64(), "alert": pa.bool_(), "effective_date": pa.timestamp("us", tz="UTC")}
+    return pa.schema([(f, types.get(f, pa.string())) for f in FIELDS])
+
+
+def _parquet(chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # one row group per chunk
+        for chunk in chunks:
+            columns = [pa.array(c, f.type) for c, f in zip(zip(*chunk), schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream(queryset, fmt, user, query="", chunk_size=CHUNK_SIZE):
+    """Encoded chunks of the export; logs the access to ehr.audit when the stream ends."""
+    encode = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}[fmt]
+    chunks = export_chunks(queryset, chunk_size, text_dates=fmt != "parquet")
+    counted = {"rows": 0}
+
+    def counting(chunks):
+        for chunk in chunks:
+            counted["rows"] += len(chunk)
+            yield chunk
+
+    complete = False
+    try:
+        yield from encode(counting(chunks))
+        complete = True
+    finally:
+        logger.info("RESEARCH_EXPORT user=%s fmt=%s rows=%d complete=%s query=%s",
+                    user, fmt, counted["rows"], complete, query)
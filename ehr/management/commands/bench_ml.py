@@ -0,0 +1,76 @@
+# ehr/management/commands/bench_ml.py
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ehr.ml_nhanes_module import predictor, store
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the served models on synthetic inputs generated from schema.json: cold load per artifact, "
+            "p50/p95/p99 latency at single-row and batch sizes, throughput under N threads/processes, peak RSS.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--disease", action="append", help="Disease key to benchmark (repeatable; default: all).")
+        parser.add_argument("--batch-size", type=int, action="append", dest="batch_sizes",
+                            help="Batch size for the latency runs (repeatable; default: 1 32 256 4096).")
+        parser.add_argument("--repeat", type=int, default=200, help="Timed calls per batch size.")
+        parser.add_argument("--concurrency", type=int, action="append",
+                            help="Threads/processes for the throughput runs (repeatable; default: 1 and the "
+                                 "core count).")
+        parser.add_argument("--mode", choices=["threads", "processes"], action="append", dest="modes",
+                            help="Throughput runs to do (default: both).")
+        parser.add_argument("--rows", type=int, default=20_000, help="Synthetic rows generated per disease.")
+        parser.add_argument("--throughput-rows", type=int, default=5_000, help="Rows scored per throughput run.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--profile", choices=sorted(store.PROFILES), default="full",
+                            help="Compiled exports to benchmark (compact falls back to full where there is none).")
+        parser.add_argument("--no-cold", action="store_true", help="Skip the cold-load measurement.")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **opts):
+        from ehr.ml_nhanes_module import bench
+
+        known = predictor.list_models()
+        if not known:
+            raise CommandError("No models are served (no version promoted)")
+        for d in opts["disease"] or []:
+            if d not in known:
+                raise CommandError(f"Unknown disease '{d}'")
+
+        predictor.configure_serving_profile(opts["profile"])
+        results = bench.run(
+            disease_keys=opts["disease"],
+            batch_sizes=opts["batch_sizes"] or (1, 32, 256, 4096),
+            repeat=opts["repeat"],
+            concurrency=opts["concurrency"] or sorted({1, os.cpu_count() or 1}),
+            modes=opts["modes"] or ("threads", "processes"),
+            n_rows=opts["rows"],
+            throughput_rows=opts["throughput_rows"],
+            cold=not opts["no_cold"],
+            seed=opts["seed"],
+        )
+
+        env = results["environment"]
+        self.stdout.write(f"version {env['model_version']} ({env['serving_profile']}), commit {env['commit'] or '-'}, "
+                          f"{env['cpu_count']} cores, python {env['python']}, xgboost {env['xgboost']}")
+        for disease_key, res in results["models"].items():
+            self.stdout.write(f"{disease_key} ({res['engine']})")
+            cold = res.get("cold_load")
+            if cold:
+                compiled = f"{cold['compiled_ms']:.1f} ms" if cold["compiled_ms"] is not None else "-"
+                self.stdout.write(f"  cold load: schema {cold['schema_ms']:.1f} ms, compiled {compiled}, "
+                                  f"joblib {cold['joblib_ms']:.1f} ms, first predict {cold['first_predict_ms']:.1f} ms, "
+                                  f"RSS {cold['peak_rss_mb']:.0f} MB")
+            for row in res["latency"]:
+                self.stdout.write(f"  batch {row['batch_size']:>5}: p50 {row['p50_ms']:.3f}  p95 {row['p95_ms']:.3f}  "
+                                  f"p99 {row['p99_ms']:.3f} ms  ({row['rows_per_s']:,.0f} rows/s)")
+            for row in res["throughput"]:
+                self.stdout.write(f"  {row['mode']:>9} x{row['concurrency']:<3}: {row['rows_per_s']:,.0f} rows/s, "
+                                  f"p99 {row['p99_ms']:.3f} ms")
+        self.stdout.write(f"peak RSS {results['peak_rss_mb']:.0f} MB")
+
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(results, fh, indent=2)
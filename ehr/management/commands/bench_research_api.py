@@ -0,0 +1,110 @@
+# ehr/management/commands/bench_research_api.py
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from ehr.models import Observation
+from ehr.serializers import DeidentifiedObservationSerializer, encode_deidentified_rows
+
+FIELDS = DeidentifiedObservationSerializer.Meta.fields
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _synthetic(n, seed_features):
+    now = timezone.now()
+    return [Observation(code="Diabetes" if i % 2 else "CVD", value=str(i % 7), unit="score",
+                        effective_date=now - timedelta(seconds=i), disease_key="Diabetes" if i % 2 else "CVD",
+                        risk_score=(i % 100) / 100, alert=i % 9 == 0, risk_band="low",
+                        deidentified_patient_hash=uuid.uuid4().hex, features=dict(seed_features, row=i))
+            for i in range(n)]
+
+
+class Command(BaseCommand):
+    help = ("Rows/sec of the research list's fast path (.values() + precompiled row encoder) against "
+            "DeidentifiedObservationSerializer, query to rendered JSON, one page at a time.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20_000,
+                            help="Synthetic observations to insert for the run (rolled back afterwards); "
+                                 "0 benchmarks the rows already in the table.")
+        parser.add_argument("--page-size", type=int, default=100, help="Rows per page, as in ?page_size=.")
+        parser.add_argument("--repeat", type=int, default=5, help="Passes over the rows; the fastest is reported.")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+
+    def _pages(self, project, page_size):
+        """Keyset pages over the table, newest first, as the list endpoint reads them."""
+        qs = project(Observation.objects.order_by("-effective_date", "-id"))
+        page = list(qs[:page_size])
+        while page:
+            yield page
+            last = page[-1]
+            date, pk = (last["effective_date"], last["id"]) if isinstance(last, dict) else (last.effective_date, last.pk)
+            page = list(qs.filter(effective_date__lte=date).exclude(effective_date=date, pk__gte=pk)[:page_size])
+
+    def _time(self, project, encode, page_size, repeat):
+        renderer = JSONRenderer()
+        best, n_bytes = None, 0
+        for _ in range(max(1, repeat)):
+            start, rows, n_bytes = time.perf_counter(), 0, 0
+            for page in self._pages(project, page_size):
+                n_bytes += len(renderer.render({"next": None, "previous": None, "results": encode(page)}))
+                rows += len(page)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return {"seconds": round(best, 4), "rows_per_sec": round(rows / best, 1) if best else None, "bytes": n_bytes}
+
+    def _run(self, opts):
+        n_rows = Observation.objects.count()
+        if not n_rows:
+            raise CommandError("No observations to benchmark (use --rows N to insert synthetic ones)")
+        sample = Observation.objects.order_by("-effective_date", "-id")[: opts["page_size"]]
+        reference = JSONRenderer().render(DeidentifiedObservationSerializer(sample, many=True).data)
+        fast = JSONRenderer().render(encode_deidentified_rows(sample.values(*FIELDS)))
+        if json.loads(reference) != json.loads(fast):
+            raise CommandError("The fast path does not match DeidentifiedObservationSerializer on the first page")
+
+        serializer = self._time(lambda qs: qs, lambda page: DeidentifiedObservationSerializer(page, many=True).data,
+                                opts["page_size"], opts["repeat"])
+        values = self._time(lambda qs: qs.values(*FIELDS), encode_deidentified_rows, opts["page_size"], opts["repeat"])
+        return {
+            "rows": n_rows,
+            "page_size": opts["page_size"],
+            "serializer": serializer,
+            "values_encoder": values,
+            "speedup": round(serializer["seconds"] / values["seconds"], 2) if values["seconds"] else None,
+        }
+
+    def handle(self, *args, **opts):
+        if opts["page_size"] < 1:
+            raise CommandError("--page-size must be >= 1")
+        results = None
+        try:
+            with transaction.atomic():
+                if opts["rows"]:
+                    Observation.objects.bulk_create(_synthetic(opts["rows"], {f"f{i}": i * 0.5 for i in range(12)}),
+                                                    batch_size=1000)
+                results = self._run(opts)
+                if opts["rows"]:
+                    raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{results['rows']} rows, pages of {results['page_size']}")
+        for name in ("serializer", "values_encoder"):
+            r = results[name]
+            self.stdout.write(f"  {name:<15} {r['rows_per_sec']:>12,.0f} rows/s  {r['seconds']:.3f} s")
+        self.stdout.write(f"  speedup         {results['speedup']}x")
+
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f"wrote {opts['json_path']}")
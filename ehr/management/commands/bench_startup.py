@@ -0,0 +1,81 @@
+# ehr/management/commands/bench_startup.py
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# what a worker imports at boot vs. what only the ML paths should pull in
+DEFAULT_TARGETS = [
+    "fhir_project.wsgi",
+    "fhir_project.urls",
+    "ehr.ml_nhanes_module.predictor",
+    "ehr.ml_nhanes_module.trainer",
+]
+HEAVY_MODULES = ["numpy", "pandas", "sklearn", "xgboost", "joblib", "scipy"]
+
+
+def _parse_importtime(stderr):
+    """
+    Parse `python -X importtime` output into {module: (self_us, cumulative_us)}.
+    Lines look like: "import time:       412 |       1305 |   ehr.views"
+    """
+    costs = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if len(parts) != 3 or not parts[0].isdigit():
+            continue
+        costs[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return costs
+
+
+class Command(BaseCommand):
+    help = "Measure the import cost of the modules a web worker loads, in a fresh interpreter per target."
+
+    def add_arguments(self, parser):
+        parser.add_argument("targets", nargs="*", help=f"Modules to import (default: {' '.join(DEFAULT_TARGETS)})")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per target; the fastest run is reported.")
+        parser.add_argument("--top", type=int, default=10, help="Costliest modules to list per target.")
+        parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file.")
+
+    def _run_once(self, target):
+        code = f"import django; django.setup(); import {target}"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "fhir_project.settings"))
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=settings.BASE_DIR, env=env,
+                              capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if proc.returncode != 0:
+            raise CommandError(f"importing {target} failed:\n{proc.stderr[-2000:]}")
+        return wall, _parse_importtime(proc.stderr)
+
+    def handle(self, *args, **opts):
+        results = []
+        for target in opts["targets"] or DEFAULT_TARGETS:
+            runs = [self._run_once(target) for _ in range(max(1, opts["repeat"]))]
+            wall, costs = min(runs, key=lambda r: r[0])
+            top = sorted(costs.items(), key=lambda kv: kv[1][1], reverse=True)[: opts["top"]]
+            result = {
+                "target": target,
+                "wall_ms": round(wall * 1000, 1),
+                "target_cumulative_ms": round(costs.get(target, (0, 0))[1] / 1000, 1),
+                "modules_imported": len(costs),
+                "heavy_modules": [m for m in HEAVY_MODULES if m in costs],
+                "top": [{"module": m, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+                        for m, (s, c) in top],
+            }
+            results.append(result)
+
+            self.stdout.write(f"{target}: {result['wall_ms']} ms wall, {result['target_cumulative_ms']} ms in target, "
+                              f"{result['modules_imported']} modules, heavy: {', '.join(result['heavy_modules']) or 'none'}")
+            for row in result["top"]:
+                self.stdout.write(f"    {row['cumulative_ms']:>8.1f} ms  {row['module']}")
+
+        if opts["json_path"]:
+            with open(opts["json_path"], "w", encoding="utf-8") as fh:
+                json.dump({"python": sys.version.split()[0], "results": results}, fh, indent=2)
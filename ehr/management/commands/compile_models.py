@@ -0,0 +1,102 @@
+# ehr/management/commands/compile_models.py
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ehr.ml_nhanes_module import predictor, store
+from ehr.ml_nhanes_module.compiled import export_compiled
+
+
+class Command(BaseCommand):
+    help = ("Convert the joblib preproc/model artifacts of a store version (default: the current one) into "
+            "<model>.compiled/: native XGBoost JSON boosters plus uncompressed, mmap-able NumPy arrays used by "
+            "the serving path. --profile compact writes <model>.compact/ instead: trees pruned on the held-out "
+            "split of --csv, narrower arrays, and a report.json of the accuracy/size/latency trade-off.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--disease", action="append", help="Only compile this disease key (repeatable).")
+        parser.add_argument("--model-version", help="Store version to compile (default: the one in CURRENT).")
+        parser.add_argument("--profile", choices=sorted(store.PROFILES), default="full")
+        parser.add_argument("--check-rows", type=int, default=2000, help="Synthetic rows used for the parity check.")
+        parser.add_argument("--tolerance", type=float, default=1e-6, help="Max allowed abs difference vs predict_risk.")
+        parser.add_argument("--csv", default="ehr/merged_nhanes_readable.csv",
+                            help="Training CSV the version was trained on (compact profile: validation rows).")
+        parser.add_argument("--prune-tolerance", type=float, default=1e-3,
+                            help="Compact profile: drop the trailing trees that improve validation log loss by "
+                                 "less than this.")
+
+    def handle(self, *args, **opts):
+        if opts["model_version"]:
+            root = store.version_dir(opts["model_version"])
+            if not (root / "manifest.json").exists():
+                raise CommandError(f"No published version '{opts['model_version']}' in {store.STORE_DIR}")
+        else:
+            root = predictor.active_root()
+            if root is None:
+                raise CommandError(f"No version promoted ({store.CURRENT_PATH} is missing)")
+        schema = predictor._load_schema(root)
+        diseases = opts["disease"] or store.model_keys(schema)
+        if not diseases:
+            raise CommandError(f"No models listed in {root / 'schema.json'}")
+        df = self._validation_frame(root, opts["csv"]) if opts["profile"] == "compact" else None
+
+        failed = []
+        for disease_key in diseases:
+            expected = schema.get(disease_key)
+            if expected is None:
+                raise CommandError(f"Unknown disease '{disease_key}'")
+            preproc_path, model_path = store.artifact_paths(root, disease_key)
+            out_path = store.compiled_path(root, disease_key, opts["profile"])
+            try:
+                if df is None:
+                    err = export_compiled(preproc_path, model_path, out_path, expected,
+                                          multilabel=(disease_key == predictor.CVD_KEY),
+                                          n_check=opts["check_rows"], tol=opts["tolerance"])
+                else:
+                    report = self._export_compact(root, disease_key, expected, df, out_path, opts["prune_tolerance"])
+            except (NotImplementedError, ValueError) as e:
+                self.stderr.write(f"{disease_key}: not compiled ({e})")
+                failed.append(disease_key)
+                continue
+            if df is None:
+                self.stdout.write(f"{disease_key}: wrote {out_path.relative_to(store.MODEL_DIR)} "
+                                  f"(max parity error {err:.2e})")
+            else:
+                self._write_report(disease_key, out_path, report)
+
+        if failed:
+            raise CommandError(f"Could not compile: {', '.join(failed)}")
+
+    def _validation_frame(self, root, csv_path):
+        from ehr.ml_nhanes_module import dataset, trainer
+
+        trained_on = store.read_manifest(root.name).get("dataset", {}).get("sha256")
+        if trained_on is None:
+            self.stderr.write(f"Version {root.name} does not record its training data; make sure {csv_path} is "
+                              "the CSV it was trained on, or the held-out rows are not held out")
+        elif trained_on != dataset.source_hash(csv_path):
+            raise CommandError(f"{csv_path} is not the CSV version {root.name} was trained on")
+        return dataset.load_columns(csv_path, trainer.training_columns())
+
+    def _export_compact(self, root, disease_key, expected, df, out_path, tol):
+        from ehr.ml_nhanes_module import trainer
+        from ehr.ml_nhanes_module.compact import export_compact
+
+        X_test, y_test = trainer.holdout_split(df, disease_key)
+        X = predictor.get_validator(disease_key, root).coerce_many(X_test)
+        preproc_path, model_path = store.artifact_paths(root, disease_key)
+        return export_compact(preproc_path, model_path, out_path, expected, disease_key == predictor.CVD_KEY,
+                              X, np.asarray(y_test), tol=tol)
+
+    def _write_report(self, disease_key, out_path, report):
+        trees, nodes, size = report["trees"], report["nodes"], report["disk_bytes"]
+        latency = report["latency_ms"]
+        self.stdout.write(f"{disease_key}: wrote {out_path.relative_to(store.MODEL_DIR)}: "
+                          f"trees {trees['full']} -> {trees['compact']}, nodes {nodes['full']} -> {nodes['compact']}, "
+                          f"disk {size['full'] / 1024:.0f} -> {size['compact'] / 1024:.0f} KiB, "
+                          f"row latency {latency['full']['row']:.3f} -> {latency['compact']['row']:.3f} ms")
+        for k, out in enumerate(report["outputs"]):
+            auc = out["roc_auc_delta"]
+            self.stdout.write(f"  output {k}: AUC {'-' if auc is None else f'{auc:+.4f}'}, "
+                              f"log loss {out['log_loss_delta']:+.4f}")
+        self.stdout.write(f"  max probability change {report['max_abs_prob_diff']:.4f} "
+                          f"on {report['n_rows']} held-out rows (report.json)")
@@ -0,0 +1,32 @@
+# ehr/management/commands/explain_observations.py
+from django.core.management.base import BaseCommand
+
+from ehr import explanations
+from ehr.models import Observation
+
+
+class Command(BaseCommand):
+    help = ("Compute and store the per-feature explanations of scored Observations that have none yet, "
+            "one batched call per disease and batch (normally they are computed on first view).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--disease", action="append", help="Disease key to explain (repeatable; default: all).")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Observations per batch.")
+        parser.add_argument("--approximate", action="store_true",
+                            help="Use approximate (per-path) contributions; much faster for large backfills.")
+
+    def handle(self, *args, **opts):
+        qs = Observation.objects.filter(explanation__isnull=True, scoring_status=Observation.SCORING_DONE,
+                                        features__isnull=False, disease_key__isnull=False).exclude(disease_key="")
+        if opts["disease"]:
+            qs = qs.filter(disease_key__in=opts["disease"])
+
+        total, batch = 0, []
+        for obs in qs.order_by("id").iterator(chunk_size=opts["batch_size"]):
+            batch.append(obs)
+            if len(batch) >= opts["batch_size"]:
+                total += explanations.explain_observations(batch, approximate=opts["approximate"])
+                batch = []
+        if batch:
+            total += explanations.explain_observations(batch, approximate=opts["approximate"])
+        self.stdout.write(self.style.SUCCESS(f"Explained {total} observations"))
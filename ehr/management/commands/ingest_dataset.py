@@ -0,0 +1,24 @@
+# ehr/management/commands/ingest_dataset.py
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ehr.ml_nhanes_module import dataset
+
+
+class Command(BaseCommand):
+    help = ("Convert the NHANES training CSV into the columnar cache (one typed .npy per column, keyed by the "
+            "file's sha256) that training and evaluation read columns from.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv", nargs="?", default="ehr/merged_nhanes_readable.csv")
+        parser.add_argument("--encoding", default=dataset.CSV_ENCODING)
+        parser.add_argument("--force", action="store_true", help="Rebuild even if a cache for this content exists.")
+
+    def handle(self, *args, **opts):
+        path = Path(opts["csv"])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist")
+        out = dataset.ingest(path, encoding=opts["encoding"], force=opts["force"])
+        meta = dataset.read_meta(path)
+        self.stdout.write(f"{path.name}: {meta['n_rows']} rows x {len(meta['columns'])} columns cached in {out}")
@@ -0,0 +1,64 @@
+# ehr/management/commands/model_store.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ehr.ml_nhanes_module import store
+
+
+class Command(BaseCommand):
+    help = ("Inspect and manage the versioned model artifact store (model_files/store/): list versions, show a "
+            "manifest, check its files against the manifest, promote a version to serving, import the old flat "
+            "layout, remove old versions.")
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+        sub.add_parser("list", help="Published versions, oldest first; * marks the current one.")
+        show = sub.add_parser("show", help="Print a version's manifest (default: the current one).")
+        show.add_argument("version", nargs="?")
+        verify = sub.add_parser("verify", help="Check a version's files against its manifest (default: current).")
+        verify.add_argument("version", nargs="?")
+        promote = sub.add_parser("promote", help="Point CURRENT at a version (also used to roll back).")
+        promote.add_argument("version")
+        sub.add_parser("import-legacy", help="Publish and promote artifacts from the old flat model_files layout.")
+        gc = sub.add_parser("gc", help="Delete old versions; the current one is always kept.")
+        gc.add_argument("--keep", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        action = opts["action"]
+        if action == "list":
+            current = store.current_version()
+            for version in store.list_versions():
+                m = store.read_manifest(version)
+                auc = ", ".join(f"{d} {e['metrics']['roc_auc']:.3f}" for d, e in m["models"].items()
+                                if e.get("metrics"))
+                self.stdout.write(f"{'*' if version == current else ' '} {version}  {m['created_at']}  "
+                                  f"{m['source']:<14} parent={m['parent'] or '-'}  {auc}")
+        elif action == "show":
+            version = opts["version"] or store.current_version()
+            if version is None or not (store.version_dir(version) / "manifest.json").exists():
+                raise CommandError(f"No published version '{version}'")
+            self.stdout.write(json.dumps(store.read_manifest(version), indent=2))
+        elif action == "verify":
+            version = opts["version"] or store.current_version()
+            if version is None or not (store.version_dir(version) / "manifest.json").exists():
+                raise CommandError(f"No published version '{version}'")
+            bad = store.verify(version)
+            if bad:
+                raise CommandError(f"Version {version} does not match its manifest: {', '.join(bad)}")
+            self.stdout.write(f"{version}: all files match the manifest")
+        elif action == "promote":
+            try:
+                store.promote_version(opts["version"])
+            except (FileNotFoundError, ValueError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"CURRENT -> {opts['version']}")
+        elif action == "import-legacy":
+            try:
+                version = store.import_legacy()
+            except FileNotFoundError as e:
+                raise CommandError(f"No legacy artifacts to import: {e}")
+            self.stdout.write(f"Imported legacy artifacts as {version} (promoted)")
+        elif action == "gc":
+            removed = store.gc(keep=opts["keep"])
+            self.stdout.write(f"Removed {len(removed)} version(s): {', '.join(removed) or '-'}")
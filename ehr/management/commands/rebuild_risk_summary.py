@@ -0,0 +1,50 @@
+# ehr/management/commands/rebuild_risk_summary.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ehr.models import Observation, PatientRiskSummary
+
+
+class Command(BaseCommand):
+    help = ("Recompute PatientRiskSummary from the Observation table: the latest scored ML Observation per "
+            "(deidentified subject, disease). For the backfill after migrating, or after deleting Observations.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--disease", action="append", help="Only rebuild these disease keys (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Summary rows written per INSERT.")
+
+    def handle(self, *args, **opts):
+        if opts["batch_size"] < 1:
+            raise CommandError("--batch-size must be >= 1")
+        observations = Observation.objects.filter(
+            disease_key__isnull=False, deidentified_patient_hash__isnull=False, risk_score__isnull=False,
+            scoring_status=Observation.SCORING_DONE,
+        ).exclude(disease_key="").exclude(deidentified_patient_hash="")
+        summaries = PatientRiskSummary.objects.all()
+        if opts["disease"]:
+            observations = observations.filter(disease_key__in=opts["disease"])
+            summaries = summaries.filter(disease_key__in=opts["disease"])
+
+        # one pass in subject order; the first row of each (subject, disease) run is its latest
+        rows = (observations.order_by("deidentified_patient_hash", "disease_key", "-effective_date", "-id")
+                .only("id", "deidentified_patient_hash", "disease_key", "patient_id", "risk_score", "alert",
+                      "risk_band", "effective_date", "scoring_status")
+                .iterator(chunk_size=opts["batch_size"]))
+        written = 0
+        with transaction.atomic():
+            summaries.delete()
+            batch, previous = [], None
+            for obs in rows:
+                key = (obs.deidentified_patient_hash, obs.disease_key)
+                if key == previous:
+                    continue
+                previous = key
+                batch.append(PatientRiskSummary.from_observation(obs))
+                if len(batch) >= opts["batch_size"]:
+                    PatientRiskSummary.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                PatientRiskSummary.objects.bulk_create(batch)
+                written += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} risk summary rows"))
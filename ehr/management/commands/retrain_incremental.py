@@ -0,0 +1,91 @@
+# ehr/management/commands/retrain_incremental.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from ehr.ml_nhanes_module import incremental, predictor, store
+from ehr.models import Observation
+
+
+def labelled_batches(disease_key, expected, since=None, batch_size=5000):
+    """
+    Stream (feature dicts, labels) batches of clinician-labelled Observations for
+    disease_key, oldest label first, without loading the whole table.
+    The last yielded row's outcome_recorded_at is kept in watermark["value"].
+    """
+    qs = Observation.objects.filter(disease_key=disease_key, confirmed_outcome__isnull=False,
+                                    features__isnull=False)
+    if since is not None:
+        qs = qs.filter(outcome_recorded_at__gt=since)
+    qs = qs.order_by("outcome_recorded_at", "id").values_list("features", "confirmed_outcome", "outcome_recorded_at")
+
+    watermark = {"value": since, "skipped": 0}
+
+    def gen():
+        rows, labels = [], []
+        for features, outcome, recorded_at in qs.iterator(chunk_size=batch_size):
+            watermark["value"] = recorded_at
+            if not isinstance(features, dict) or not any(f in features for f in expected):
+                watermark["skipped"] += 1
+                continue
+            rows.append(features)
+            labels.append(1 if outcome else 0)
+            if len(rows) >= batch_size:
+                yield rows, labels
+                rows, labels = [], []
+        if rows:
+            yield rows, labels
+
+    return gen(), watermark
+
+
+class Command(BaseCommand):
+    help = ("Continue training the XGBoost models on newly labelled Observations (confirmed_outcome) by adding "
+            "trees to the existing boosters of the current store version. Publishes one derived version for all "
+            "updated diseases; --promote makes it the served one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--disease", action="append", help="Disease key to update (repeatable; default: all "
+                                                                "single-label models).")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per streamed batch.")
+        parser.add_argument("--rounds-per-batch", type=int, default=10, help="Trees added per batch.")
+        parser.add_argument("--all-labels", action="store_true",
+                            help="Use every labelled row, ignoring the label watermarks of the current version.")
+        parser.add_argument("--promote", action="store_true", help="Point CURRENT at the new version.")
+
+    def handle(self, *args, **opts):
+        parent = store.current_version()
+        if parent is None:
+            raise CommandError(f"No version promoted ({store.CURRENT_PATH} is missing); train first")
+        schema = store.read_manifest(parent)["schema"]
+        marks = {} if opts["all_labels"] else incremental.label_watermarks(parent)
+
+        diseases = opts["disease"] or [d for d in store.model_keys(schema) if d != predictor.CVD_KEY]
+        updates, new_marks = {}, {}
+        for disease_key in diseases:
+            expected = schema.get(disease_key)
+            if expected is None:
+                raise CommandError(f"Unknown disease '{disease_key}'")
+            if disease_key == predictor.CVD_KEY:
+                raise CommandError("CVD is multi-label and cannot be updated incrementally")
+
+            since = parse_datetime(marks[disease_key]) if marks.get(disease_key) else None
+            batches, watermark = labelled_batches(disease_key, expected, since, opts["batch_size"])
+            model, stats, risk = incremental.continue_training(disease_key, batches, opts["rounds_per_batch"], parent)
+            if watermark["skipped"]:
+                self.stderr.write(f"{disease_key}: skipped {watermark['skipped']} rows without usable features")
+            if watermark["value"] is not None and watermark["value"] != since:
+                new_marks[disease_key] = watermark["value"].isoformat()
+            if model is None:
+                self.stdout.write(f"{disease_key}: no new labelled rows since {since or 'the start'}")
+                continue
+
+            updates[disease_key] = (model, stats, risk)
+            self.stdout.write(f"{disease_key}: {stats['rows']} rows, {stats['positives']} positive, "
+                              f"{stats['rounds_before']} -> {stats['rounds_after']} trees; risk table "
+                              f"{'refitted' if risk else 'inherited'} ({stats['holdout_rows']} held-out rows)")
+
+        if not updates:
+            return
+        version = incremental.build_version(parent, updates, new_marks, promote=opts["promote"])
+        self.stdout.write(f"Published version {version} from {parent}"
+                          f"{'; promoted to serving' if opts['promote'] else ''}")
@@ -0,0 +1,40 @@
+# ehr/management/commands/run_scoring_worker.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ehr import scoring
+
+
+class Command(BaseCommand):
+    help = "Score pending ML self-check Observations (ML_SCORING_MODE='queue'). Uses only the database as the queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit.")
+        parser.add_argument("--requeue-stale", action="store_true",
+                            help="Reset rows left 'running' by a crashed worker before starting.")
+        parser.add_argument("--stale-after", type=float, default=scoring.STALE_AFTER,
+                            help="Seconds after which a 'running' claim counts as stale (default: %(default)s).")
+
+    def handle(self, *args, **opts):
+        if opts["requeue_stale"]:
+            self.stdout.write(f"Requeued {scoring.requeue_stale(opts['stale_after'])} stale observations")
+
+        # load the models up front so the first job does not pay for it
+        from ehr.ml_nhanes_module import preload_models
+        preload_models()
+
+        total = 0
+        while True:
+            close_old_connections()
+            done = scoring.process_pending(opts["batch_size"])
+            total += done
+            if done:
+                self.stdout.write(f"Scored {done} observations ({total} total)")
+                continue
+            if opts["once"]:
+                break
+            time.sleep(opts["poll_interval"])
@@ -0,0 +1,175 @@
+# ehr/management/commands/score_cohort.py
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ehr import scoring
+from ehr.ml_nhanes_module import predictor
+from ehr.ml_nhanes_module.cohort import CSV_ENCODING, input_columns, score_file
+from ehr.models import Observation, PatientRiskSummary
+from ehr.utils import compute_deid_hash, json_safe_features
+
+
+def _column_prefix(disease_key):
+    return disease_key.replace("/", "_").replace(" ", "_")
+
+
+class _CsvWriter:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.path, mode="w" if self.header else "a", header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise CommandError("Writing Parquet needs pyarrow (pip install pyarrow)") from e
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Command(BaseCommand):
+    help = ("Score a CSV or Parquet cohort file against the ML models. The file is streamed in chunks that are "
+            "scored in a process pool; probabilities and alert flags go to --output and/or Observation rows.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="CSV (Windows-1252 by default) or .parquet file.")
+        parser.add_argument("--output", help="Write scores to this .csv or .parquet file.")
+        parser.add_argument("--to-observations", action="store_true",
+                            help="Save one Observation per row and disease (batched inserts).")
+        parser.add_argument("--disease", action="append", help="Only score this disease key (repeatable).")
+        parser.add_argument("--id-column", action="append", default=[],
+                            help="Input column copied to the output (repeatable); the first one also identifies "
+                                 "the subject in Observations.")
+        parser.add_argument("--chunksize", type=int, default=50_000)
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: CPU count, 0 scores in this process).")
+        parser.add_argument("--insert-batch-size", type=int, default=1000)
+        parser.add_argument("--encoding", default=CSV_ENCODING)
+
+    def handle(self, *args, **opts):
+        path = Path(opts["input"])
+        if not path.exists():
+            raise CommandError(f"{path} does not exist")
+        if not opts["output"] and not opts["to_observations"]:
+            raise CommandError("Nothing to do: pass --output and/or --to-observations")
+
+        diseases = opts["disease"] or predictor.list_models()
+        for d in diseases:
+            if predictor.get_expected_features(d) is None:
+                raise CommandError(f"Unknown disease '{d}'")
+
+        columns = set(input_columns(path, opts["encoding"]))
+        id_columns = opts["id_column"]
+        missing_ids = [c for c in id_columns if c not in columns]
+        if missing_ids:
+            raise CommandError(f"Id column(s) not in {path.name}: {missing_ids}")
+        absent = [f for f in predictor.get_all_expected_features(diseases) if f not in columns]
+        if absent:
+            self.stderr.write(f"Scoring with {len(absent)} feature(s) absent from the input treated as missing: {absent}")
+
+        writer = None
+        if opts["output"]:
+            out = Path(opts["output"])
+            writer = _ParquetWriter(out) if out.suffix.lower() in (".parquet", ".pq") else _CsvWriter(out)
+
+        started = time.perf_counter()
+        rows = 0
+        # every chunk is scored, calibrated and tagged with the version served now
+        root = predictor.active_root()
+        version = root.name if root is not None else None
+        profile, cache = scoring.predictor_settings()
+        try:
+            for chunk, probs in score_file(path, diseases, opts["chunksize"], opts["workers"],
+                                           passthrough=id_columns, encoding=opts["encoding"],
+                                           serving_profile=profile, cache=cache, root=root):
+                # calibrated probabilities, alerts and bands (see scoring.assess_many)
+                scores = {d: scoring.assess_many(d, probs[d], root) for d in diseases}
+                if writer is not None:
+                    frame = chunk.loc[:, id_columns].copy()
+                    for d in diseases:
+                        prefix = _column_prefix(d)
+                        risk, _threshold, alerts, bands = scores[d]
+                        frame[f"{prefix}_risk"] = risk
+                        frame[f"{prefix}_alert"] = alerts
+                        if bands is not None:
+                            frame[f"{prefix}_band"] = bands
+                    writer.write(frame)
+                if opts["to_observations"]:
+                    self._save_observations(chunk, scores, id_columns, opts["insert_batch_size"], version)
+
+                rows += len(chunk)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{rows} rows scored ({rows / elapsed:,.0f} rows/sec)")
+        finally:
+            if writer is not None:
+                writer.close()
+
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {rows} rows x {len(diseases)} model(s) in {elapsed:.1f}s ({rate:,.0f} rows/sec)"))
+
+    def _save_observations(self, chunk, scores, id_columns, batch_size, model_version=None):
+        import pandas as pd
+
+        now = timezone.now()
+        features_by_disease = {d: predictor.get_expected_features(d) for d in scores}
+        ids = chunk[id_columns[0]].tolist() if id_columns else [None] * len(chunk)
+        records = chunk.to_dict("records")   # native Python values, JSON-serializable
+
+        batch = []
+        for i, row in enumerate(records):
+            # a blank id (None or NaN) identifies no one; hashing it would merge all such rows into one subject
+            deid = None if pd.isna(ids[i]) else compute_deid_hash(str(ids[i]))
+            for d, feats in features_by_disease.items():
+                risk, _threshold, alerts, bands = scores[d]
+                prob = float(risk[i])
+                batch.append(Observation(
+                    patient=None,
+                    code=d,
+                    value=str(round(prob, 6)),
+                    unit="probability",
+                    effective_date=now,
+                    remarks="ML cohort scoring",
+                    disease_key=d,
+                    risk_score=prob,
+                    features=json_safe_features({f: row[f] for f in feats}),
+                    deidentified_patient_hash=deid,
+                    alert=bool(alerts[i]),
+                    risk_band=bands[i] if bands is not None else None,
+                    model_version=model_version,
+                ))
+            if len(batch) >= batch_size:
+                self._insert(batch)
+                batch = []
+        if batch:
+            self._insert(batch)
+
+    def _insert(self, batch):
+        # bulk_create bypasses Observation.save(), which keeps the risk summary current
+        Observation.objects.bulk_create(batch)
+        PatientRiskSummary.record(batch)
@@ -0,0 +1,45 @@
+# ehr/management/commands/tune_models.py
+from django.core.management.base import BaseCommand, CommandError
+
+from ehr.ml_nhanes_module import dataset, trainer
+
+
+class Command(BaseCommand):
+    help = ("Successive-halving hyperparameter search per disease (parallel CV trials, early stopping on the "
+            "held-out split). Writes model_files/tuning/<Disease>.params.json, which training then uses.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", default="ehr/merged_nhanes_readable.csv")
+        parser.add_argument("--disease", action="append", help="Disease key to tune (repeatable; default: all).")
+        parser.add_argument("--candidates", type=int, default=60, help="Configurations sampled in the first round.")
+        parser.add_argument("--min-trees", type=int, default=20)
+        parser.add_argument("--max-trees", type=int, default=600)
+        parser.add_argument("--factor", type=int, default=3, help="Keep 1/factor of the candidates per round.")
+        parser.add_argument("--cv", type=int, default=3)
+        parser.add_argument("--jobs", type=int, default=-1, help="Parallel trials (default: all cores).")
+        parser.add_argument("--dry-run", action="store_true", help="Report only; do not write params.json.")
+
+    def handle(self, *args, **opts):
+        from ehr.ml_nhanes_module.tuning import tune_disease
+
+        known = [trainer.DIABETES_KEY, trainer.LIVER_KEY, trainer.KIDNEY_KEY, trainer.CVD_KEY]
+        diseases = opts["disease"] or known
+        for d in diseases:
+            if d not in known:
+                raise CommandError(f"Unknown disease '{d}'")
+
+        df = dataset.load_columns(opts["csv"], trainer.training_columns())
+        for disease_key in diseases:
+            report = tune_disease(df, disease_key, n_candidates=opts["candidates"], max_trees=opts["max_trees"],
+                                  min_trees=opts["min_trees"], factor=opts["factor"], cv=opts["cv"],
+                                  n_jobs=opts["jobs"], save=not opts["dry_run"])
+            holdout = report["holdout"]
+            self.stdout.write(
+                f"{disease_key}: cv {report['scoring']} {report['best_cv_score']:.4f}, "
+                f"held-out AUC {holdout['roc_auc']:.4f}, {report['best_params']['n_estimators']} trees, "
+                f"depth {report['best_params']['max_depth']}, {holdout['single_row_latency_ms']:.3f} ms/row "
+                f"({len(report['candidates'])} trials in {report['search']['time_s']:.1f}s)"
+            )
+            self.stdout.write(f"  params: {report['best_params']}")
+        if not opts["dry_run"]:
+            self.stdout.write("Retrain (train_and_save_all_models) to build artifacts with the tuned params.")
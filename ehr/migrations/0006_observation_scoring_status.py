@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0005_observation_alert_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="scoring_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="done",
+                max_length=16,
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0006_observation_scoring_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="confirmed_outcome",
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="observation",
+            name="outcome_recorded_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0007_observation_confirmed_outcome"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="explanation",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0008_observation_explanation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="risk_band",
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+    ]
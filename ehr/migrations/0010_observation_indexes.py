@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0009_observation_risk_band"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["patient", "-effective_date"], name="obs_patient_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["-effective_date"], name="obs_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["code", "-effective_date"], name="obs_code_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["disease_key", "-effective_date"], name="obs_disease_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["deidentified_patient_hash", "-effective_date"], name="obs_deid_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(condition=models.Q(("alert", True)), fields=["-effective_date"],
+                               name="obs_alert_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(condition=models.Q(("scoring_status", "pending")), fields=["effective_date"],
+                               name="obs_pending_idx"),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0010_observation_indexes"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="observation",
+            name="obs_date_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="observation",
+            name="obs_code_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["-effective_date", "-id"], name="obs_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="observation",
+            index=models.Index(fields=["code", "-effective_date", "-id"], name="obs_code_date_id_idx"),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0011_observation_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PatientRiskSummary",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("deidentified_patient_hash", models.CharField(max_length=128)),
+                ("disease_key", models.CharField(max_length=128)),
+                ("risk_score", models.FloatField()),
+                ("alert", models.BooleanField(default=False)),
+                ("risk_band", models.CharField(blank=True, max_length=16, null=True)),
+                ("effective_date", models.DateTimeField()),
+                (
+                    "observation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="+", to="ehr.observation"
+                    ),
+                ),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="risk_summaries",
+                        to="ehr.patient",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-risk_score"], name="risk_summary_score_idx"),
+                    models.Index(fields=["disease_key", "-risk_score"], name="risk_summary_disease_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("deidentified_patient_hash", "disease_key"), name="risk_summary_subject_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
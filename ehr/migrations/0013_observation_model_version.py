@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0012_patientrisksummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="model_version",
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ehr", "0013_observation_model_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="observation",
+            name="claimed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
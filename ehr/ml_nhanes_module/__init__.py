@@ -1,4 +1,46 @@
-from .trainer import train_and_save_all_models
-from .predictor import predict_risk, get_expected_features, list_models
+# Nothing heavy is imported here: the predictor (numpy only) loads on first use
+# and the trainer (pandas, sklearn, xgboost) only when training is requested, so
+# importing this package from views costs nothing for non-ML requests.
+import importlib
 
-__all__ = ["train_and_save_all_models", "predict_risk", "get_expected_features", "list_models"]
+_EXPORTS = {
+    "train_and_save_all_models": ".trainer",
+    "predict_risk": ".predictor",
+    "predict_risk_many": ".predictor",
+    "predict_row": ".predictor",
+    "assess_risk": ".predictor",
+    "assess_row": ".predictor",
+    "get_risk_table": ".predictor",
+    "active_root": ".predictor",
+    "active_version": ".predictor",
+    "version_root": ".predictor",
+    "get_validator": ".predictor",
+    "get_union_validator": ".predictor",
+    "explain": ".predictor",
+    "explain_many": ".predictor",
+    "FeatureValidationError": ".validation",
+    "get_expected_features": ".predictor",
+    "get_all_expected_features": ".predictor",
+    "predict_risk_all": ".predictor",
+    "list_models": ".predictor",
+    "get_registry": ".predictor",
+    "preload_models": ".predictor",
+    "configure_serving_profile": ".predictor",
+    "configure_prediction_cache": ".predictor",
+    "prediction_cache_stats": ".predictor",
+    "cached_risk": ".predictor",
+    "cache_risk": ".predictor",
+    "MicroBatcher": ".batcher",
+    "score_file": ".cohort",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,176 @@
+# batcher.py
+"""
+Micro-batching for concurrent single-row predictions.
+
+Callers in different threads submit one feature dict each. A background thread
+per disease collects them for up to `max_batch` rows or `max_wait_ms` after the
+first row arrived, scores the whole batch with one predict_risk_many call and
+hands each caller its own probability. Rows pinned to a store version (root=)
+are batched per version, so each is scored by the version its caller resolved. Batches do not go through the prediction
+cache (cache.py); callers that want it check it per row before submitting (see
+predictor.cached_risk and ehr/scoring.py).
+Only useful when requests are served concurrently (threaded workers or the
+thread scoring pool); a single-threaded caller just pays the wait.
+"""
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class _Item:
+    __slots__ = ("features", "future", "enqueued")
+
+    def __init__(self, features):
+        self.features = features
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(self, max_batch=32, max_wait_ms=5.0, score_many=None):
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._score_many = score_many
+        self._queues = {}
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._metrics = {
+            "requests": 0,
+            "batches": 0,
+            "errors": 0,
+            "queue_wait_total_s": 0.0,
+            "queue_wait_max_s": 0.0,
+            "batch_sizes": {},   # size -> count
+        }
+
+    def _scorer(self):
+        if self._score_many is None:
+            from .predictor import predict_risk_many
+            self._score_many = predict_risk_many
+        return self._score_many
+
+    def _queue_for(self, disease_key, root=None):
+        key = (disease_key, root)
+        q = self._queues.get(key)
+        if q is not None:
+            return q
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            q = self._queues.get(key)
+            if q is None:
+                q = queue.Queue()
+                t = threading.Thread(target=self._worker, args=(disease_key, q, root),
+                                     name=f"microbatch-{disease_key}", daemon=True)
+                self._queues[key] = q
+                self._threads[key] = t
+                t.start()
+        return q
+
+    def submit(self, disease_key, features, root=None):
+        """
+        Queue one feature dict (or coerced row); returns a Future resolving to its probability.
+        root: store version directory to score it with (default: the one served when the batch runs).
+        """
+        item = _Item(features)
+        self._queue_for(disease_key, root).put(item)
+        return item.future
+
+    def predict(self, disease_key, features, timeout=None, root=None):
+        """Blocking single-row prediction through the batcher; same result as predict_risk."""
+        return self.submit(disease_key, features, root).result(timeout)
+
+    def _worker(self, disease_key, q, root=None):
+        stop = False
+        while not stop:
+            first = q.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = first.enqueued + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    nxt = q.get(timeout=remaining) if remaining > 0 else q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._run(disease_key, batch, root)
+
+    def _run(self, disease_key, batch, root=None):
+        started = time.perf_counter()
+        try:
+            score_many = self._scorer()
+        except Exception as e:
+            # e.g. the predictor cannot be imported: fail this batch, but keep the thread serving
+            for it in batch:
+                it.future.set_exception(e)
+            errors = len(batch)
+        else:
+            if root is not None:
+                score_many = functools.partial(score_many, root=root)
+            errors = self._score(disease_key, batch, score_many)
+
+        waits = [started - it.enqueued for it in batch]
+        with self._lock:
+            m = self._metrics
+            m["requests"] += len(batch)
+            m["batches"] += 1
+            m["errors"] += errors
+            m["queue_wait_total_s"] += sum(waits)
+            m["queue_wait_max_s"] = max(m["queue_wait_max_s"], max(waits))
+            m["batch_sizes"][len(batch)] = m["batch_sizes"].get(len(batch), 0) + 1
+
+    def _score(self, disease_key, batch, score_many):
+        """Resolve the futures of batch; returns how many failed."""
+        try:
+            probs = score_many(disease_key, [it.features for it in batch])
+        except Exception:
+            # one bad row must not fail everyone else in the batch: retry one by one
+            probs = None
+
+        errors = 0
+        for i, it in enumerate(batch):
+            if probs is not None:
+                it.future.set_result(float(probs[i]))
+                continue
+            try:
+                it.future.set_result(float(score_many(disease_key, [it.features])[0]))
+            except Exception as e:
+                errors += 1
+                it.future.set_exception(e)
+        return errors
+
+    def stats(self):
+        """Batch fill and queue wait metrics since the batcher was created."""
+        with self._lock:
+            m = dict(self._metrics, batch_sizes=dict(self._metrics["batch_sizes"]))
+        batches, requests = m["batches"], m["requests"]
+        m["avg_batch_size"] = requests / batches if batches else 0.0
+        m["avg_batch_fill"] = m["avg_batch_size"] / self.max_batch
+        m["avg_queue_wait_ms"] = 1000.0 * m["queue_wait_total_s"] / requests if requests else 0.0
+        m["max_queue_wait_ms"] = 1000.0 * m.pop("queue_wait_max_s")
+        m.pop("queue_wait_total_s")
+        m["max_batch"] = self.max_batch
+        m["max_wait_ms"] = self.max_wait * 1000.0
+        return m
+
+    def close(self, timeout=None):
+        """Stop the worker threads after they finish what is already queued."""
+        with self._lock:
+            self._closed = True
+            queues, threads = list(self._queues.values()), list(self._threads.values())
+        for q in queues:
+            q.put(_STOP)
+        for t in threads:
+            t.join(timeout)
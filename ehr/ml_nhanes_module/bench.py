@@ -0,0 +1,257 @@
+# bench.py
+"""
+Reproducible latency/throughput benchmark for the predictor.
+
+Inputs are synthetic and need no dataset: the feature names come from the
+served schema.json and the value ranges from each model's fitted preprocessing
+(imputation medians for numeric features, one-hot categories for categorical
+ones), with a fixed seed so every run scores the same rows. The prediction
+cache is disabled while measuring, otherwise repeated rows would be measured
+as cache hits.
+
+run() returns one JSON-serialisable dict (environment, served version, and per
+disease: cold load, single-row and batch latency percentiles, throughput under
+N threads/processes, peak RSS) so results of two commits can be diffed.
+"""
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from . import predictor, store
+
+MISSING_RATE = 0.05
+
+
+def _feature_profile(disease_key, root):
+    """{feature: ("num", median) | ("cat", categories)} from the fitted ColumnTransformer."""
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import OneHotEncoder
+
+    preproc, _model = predictor._load_artifacts_for(disease_key, root)
+    profile = {}
+    for _name, trans, cols in preproc.transformers_:
+        if isinstance(trans, SimpleImputer):
+            for c, median in zip(cols, trans.statistics_):
+                profile[c] = ("num", float(median))
+        elif isinstance(trans, OneHotEncoder):
+            for c, cats in zip(cols, trans.categories_):
+                profile[c] = ("cat", list(cats))
+    return profile
+
+
+def synthetic_rows(disease_key, n_rows, seed=0, root=None):
+    """
+    n_rows feature dicts for disease_key: numeric values scattered around the training
+    median (log-normal), categories drawn from the known ones, MISSING_RATE of values None.
+    """
+    root = root or predictor.active_root()
+    expected = predictor._expected_for(disease_key, predictor._load_schema(root))
+    profile = _feature_profile(disease_key, root)
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for f in expected:
+        kind, spec = profile.get(f, ("num", 1.0))
+        if kind == "cat":
+            values = [spec[i] for i in rng.integers(0, len(spec), n_rows)]
+            columns[f] = [v.item() if hasattr(v, "item") else v for v in values]
+        else:
+            columns[f] = (abs(spec) or 1.0) * rng.lognormal(0.0, 0.5, n_rows)
+            columns[f] = [round(float(v), 3) for v in columns[f]]
+        for i in np.flatnonzero(rng.random(n_rows) < MISSING_RATE):
+            columns[f][i] = None
+    return [{f: columns[f][i] for f in expected} for i in range(n_rows)]
+
+
+def _summary_ms(samples):
+    """Percentiles of per-call durations (seconds) in milliseconds."""
+    ms = 1000.0 * np.asarray(samples, dtype=np.float64)
+    return {
+        "n": int(len(ms)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def latency(disease_key, rows, batch_size=1, repeat=200, warmup=10):
+    """
+    Latency of scoring batch_size rows: predict_risk for single rows, predict_risk_many
+    for batches. Each call gets different rows (cycling through `rows`).
+    """
+    if batch_size == 1:
+        call = lambda batch: predictor.predict_risk(disease_key, batch[0])
+    else:
+        call = lambda batch: predictor.predict_risk_many(disease_key, batch)
+    n_batches = max(1, min(repeat, len(rows) // batch_size))
+    batches = [rows[i * batch_size:(i + 1) * batch_size] for i in range(n_batches)]
+    for i in range(warmup):
+        call(batches[i % len(batches)])
+
+    samples = []
+    for i in range(repeat):
+        batch = batches[i % len(batches)]
+        t = time.perf_counter()
+        call(batch)
+        samples.append(time.perf_counter() - t)
+    out = _summary_ms(samples)
+    out["batch_size"] = batch_size
+    out["rows_per_s"] = batch_size * len(samples) / float(np.sum(samples))
+    return out
+
+
+def _cold_load_child(disease_key):
+    """Runs in a fresh interpreter: time each load step of one model from nothing."""
+    p = predictor
+    root = p.active_root()
+    t = time.perf_counter()
+    p._load_schema(root)
+    t_schema = time.perf_counter() - t
+
+    t = time.perf_counter()
+    compiled = p._load_compiled_for(disease_key, root)
+    t_compiled = time.perf_counter() - t
+    rss_compiled = _peak_rss_mb()
+
+    t = time.perf_counter()
+    p._load_artifacts_for(disease_key, root)
+    t_joblib = time.perf_counter() - t
+
+    row = {f: None for f in p._expected_for(disease_key, p._load_schema(root))}
+    t = time.perf_counter()
+    p._predict_many(disease_key, [row], root)
+    t_first = time.perf_counter() - t
+    return {
+        "schema_ms": 1000.0 * t_schema,
+        "compiled_ms": 1000.0 * t_compiled if compiled is not None else None,
+        "joblib_ms": 1000.0 * t_joblib,
+        "first_predict_ms": 1000.0 * t_first,
+        "engine": "compiled" if compiled is not None else "sklearn",
+        "rss_after_compiled_mb": rss_compiled,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def cold_load(disease_key):
+    """
+    Load timings of disease_key measured in a new (spawned) process, so no model is
+    cached and sklearn/xgboost are not imported yet (see bench_startup for import costs).
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_cold_load_child, disease_key).result()
+
+
+def _score_requests(disease_key, rows, batch_size):
+    """One worker's share of a throughput run; returns per-request durations."""
+    samples = []
+    for i in range(0, len(rows), batch_size):
+        t = time.perf_counter()
+        if batch_size == 1:
+            predictor.predict_risk(disease_key, rows[i])
+        else:
+            predictor.predict_risk_many(disease_key, rows[i:i + batch_size])
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def _init_process_worker():
+    from .cohort import _init_worker
+    _init_worker()
+    predictor.configure_prediction_cache(maxsize=0)
+
+
+def throughput(disease_key, rows, concurrency, mode="threads", batch_size=1):
+    """
+    Score all rows with `concurrency` threads or processes sharing the work evenly.
+    Process start-up and model loading are excluded: the pool is warmed before timing.
+    """
+    shares = [rows[i::concurrency] for i in range(concurrency)]
+    if mode == "threads":
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+    else:
+        pool = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process_worker)
+    with pool:
+        warm = [pool.submit(_score_requests, disease_key, share[:batch_size], batch_size) for share in shares]
+        for f in warm:
+            f.result()
+        started = time.perf_counter()
+        futures = [pool.submit(_score_requests, disease_key, share, batch_size) for share in shares]
+        samples = [s for f in futures for s in f.result()]
+        wall = time.perf_counter() - started
+
+    out = _summary_ms(samples)
+    out.update({"mode": mode, "concurrency": concurrency, "batch_size": batch_size,
+                "rows": len(rows), "wall_s": wall, "rows_per_s": len(rows) / wall})
+    if mode == "processes":
+        out["peak_rss_mb_children"] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    return out
+
+
+def environment():
+    """What the numbers depend on: interpreter, library versions, cores, code and artifact versions."""
+    import xgboost
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__),
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "xgboost": xgboost.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": commit,
+        "model_version": store.current_version(),
+        "serving_profile": predictor.serving_profile(),
+    }
+
+
+def run(disease_keys=None, batch_sizes=(1, 32, 256, 4096), repeat=200, concurrency=(1, 4),
+        modes=("threads", "processes"), n_rows=20_000, throughput_rows=5_000, cold=True, seed=0, log=None):
+    """Full benchmark; returns the results dict. log(str) receives progress lines."""
+    log = log or (lambda msg: None)
+    disease_keys = list(disease_keys or predictor.list_models())
+    previous_cache = predictor.prediction_cache_stats()
+    predictor.configure_prediction_cache(maxsize=0)
+    results = {"environment": environment(), "settings": {
+        "batch_sizes": list(batch_sizes), "repeat": repeat, "concurrency": list(concurrency),
+        "modes": list(modes), "n_rows": n_rows, "throughput_rows": throughput_rows, "seed": seed,
+        "prediction_cache": "disabled"}, "models": {}}
+    try:
+        for disease_key in disease_keys:
+            res = {}
+            if cold:
+                res["cold_load"] = cold_load(disease_key)
+                log(f"{disease_key}: cold load {res['cold_load']}")
+            rows = synthetic_rows(disease_key, n_rows, seed)
+            compiled = predictor._load_compiled_for(disease_key, predictor.active_root())
+            res["engine"] = "compiled" if compiled is not None else "sklearn"
+            res["latency"] = []
+            for batch_size in batch_sizes:
+                res["latency"].append(latency(disease_key, rows, batch_size, repeat))
+                log(f"{disease_key}: batch {batch_size} {res['latency'][-1]}")
+            res["throughput"] = []
+            for mode in modes:
+                for n in concurrency:
+                    res["throughput"].append(throughput(disease_key, rows[:throughput_rows], n, mode))
+                    log(f"{disease_key}: {mode} x{n} {res['throughput'][-1]}")
+            results["models"][disease_key] = res
+    finally:
+        predictor.configure_prediction_cache(previous_cache["maxsize"], previous_cache["ttl"])
+    results["peak_rss_mb"] = _peak_rss_mb()
+    return results
@@ -0,0 +1,79 @@
+# cache.py
+"""
+LRU + TTL memo of single-row predictions.
+
+Keys are (disease_key, artifact version, bytes of the coerced float row; see
+validation.py, which turns every missing value into the same NaN). The artifact
+version is the registry signature of the files the model was loaded from, so a
+retrain or re-export changes every key and stale scores are never returned.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# configure() default for "leave as is": None is a meaningful ttl (no expiry)
+UNSET = object()
+
+
+class PredictionCache:
+    def __init__(self, maxsize=1024, ttl=3600.0):
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self.configure(maxsize, ttl)
+
+    def configure(self, maxsize=None, ttl=UNSET):
+        """maxsize=0 disables caching; ttl=None keeps entries until evicted. Omitted settings are kept."""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = int(maxsize)
+            if ttl is not UNSET:
+                self.ttl = ttl
+            self._shrink()
+
+    def _shrink(self):
+        while len(self._data) > max(self.maxsize, 0):
+            self._data.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def get(self, key):
+        """Return the cached value or None."""
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._counters["hits"] += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._shrink()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._counters)
+            out["size"] = len(self._data)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = out["hits"] / lookups if lookups else 0.0
+        out["maxsize"] = self.maxsize
+        out["ttl"] = self.ttl
+        return out
@@ -0,0 +1,128 @@
+# calibration.py
+"""
+Calibrated probabilities, alert thresholds and risk bands per model version.
+
+The trainer fits them on the held-out split it already creates, from the
+probability the predictor serves (for CVD the highest component probability,
+against "any CVD component"), and stores them in the version's manifest under
+models[<disease>]["risk"] as small lookup arrays:
+  calibration  isotonic step points ("x" -> "y", linear in between) when the
+               split has enough positives, otherwise Platt scaling ("a", "b"
+               on the log-odds)
+  thresholds   calibrated-probability cutoffs with the sensitivity, specificity
+               and PPV each would have had on the split
+  bands        edges between "low", "elevated" and "high" risk: the cutoffs that
+               keep ALERT_SENSITIVITY / HIGH_SENSITIVITY of the positive cases
+               at or above them; the alert fires from "elevated" up
+RiskTable turns a served probability into (calibrated probability, band, alert,
+threshold) with a couple of array lookups.
+"""
+import numpy as np
+
+ALERT_SENSITIVITY = 0.80
+HIGH_SENSITIVITY = 0.50
+BANDS = ["low", "elevated", "high"]
+MIN_ISOTONIC_POSITIVES = 100
+TABLE_CUTOFFS = np.round(np.arange(0.05, 1.0, 0.05), 2)
+_EPS = 1e-7
+
+
+def _logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), _EPS, 1.0 - _EPS)
+    return np.log(p / (1.0 - p))
+
+
+def fit_calibration(proba, y):
+    """Calibration map from served probabilities to observed frequencies, as a JSON-ready dict."""
+    proba, y = np.asarray(proba, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    if y.sum() >= MIN_ISOTONIC_POSITIVES:
+        from sklearn.isotonic import IsotonicRegression
+
+        iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip").fit(proba, y)
+        return {"method": "isotonic", "x": np.round(iso.X_thresholds_, 6).tolist(),
+                "y": np.round(iso.y_thresholds_, 6).tolist()}
+
+    from sklearn.linear_model import LogisticRegression
+
+    lr = LogisticRegression(C=1e6).fit(_logit(proba)[:, None], y)
+    return {"method": "platt", "a": float(lr.coef_[0, 0]), "b": float(lr.intercept_[0])}
+
+
+def apply_calibration(calibration, proba):
+    proba = np.asarray(proba, dtype=np.float64)
+    if calibration["method"] == "isotonic":
+        return np.interp(proba, calibration["x"], calibration["y"])
+    return 1.0 / (1.0 + np.exp(-(calibration["a"] * _logit(proba) + calibration["b"])))
+
+
+def _cutoff_for_sensitivity(calibrated, y, sensitivity):
+    """Highest cutoff that flags at least `sensitivity` of the positive rows."""
+    positives = np.sort(calibrated[y == 1])
+    return float(positives[int(np.floor((1.0 - sensitivity) * len(positives)))])
+
+
+def threshold_table(calibrated, y, cutoffs=TABLE_CUTOFFS):
+    """Operating characteristics of flagging calibrated >= cutoff, for each cutoff."""
+    flagged = calibrated[:, None] >= np.asarray(cutoffs)[None, :]
+    positive = (y == 1)[:, None]
+    tp = (flagged & positive).sum(axis=0)
+    n_flagged = flagged.sum(axis=0)
+    return {
+        "cutoffs": np.asarray(cutoffs, dtype=np.float64).tolist(),
+        "sensitivity": np.round(tp / max(int(positive.sum()), 1), 4).tolist(),
+        "specificity": np.round(((~flagged) & ~positive).sum(axis=0) / max(int((~positive).sum()), 1), 4).tolist(),
+        "ppv": np.round(np.where(n_flagged > 0, tp / np.maximum(n_flagged, 1), np.nan), 4).tolist(),
+        "flagged": np.round(n_flagged / len(y), 4).tolist(),
+    }
+
+
+def fit_risk_table(proba, y):
+    """
+    Everything the manifest stores for one model, from served probabilities and 0/1 labels
+    of the held-out split. Returns None when the split has no positive or no negative rows.
+    """
+    proba, y = np.asarray(proba, dtype=np.float64), np.asarray(y).astype(int)
+    if y.min() == y.max():
+        return None
+    calibration = fit_calibration(proba, y)
+    calibrated = apply_calibration(calibration, proba)
+    alert = _cutoff_for_sensitivity(calibrated, y, ALERT_SENSITIVITY)
+    high = max(alert, _cutoff_for_sensitivity(calibrated, y, HIGH_SENSITIVITY))
+    table = threshold_table(calibrated, y)
+    # NaN (no row flagged) is not valid JSON
+    table["ppv"] = [None if np.isnan(v) else v for v in table["ppv"]]
+    return {
+        "calibration": calibration,
+        "thresholds": table,
+        "bands": {"labels": BANDS, "edges": [alert, high],
+                  "sensitivity": [ALERT_SENSITIVITY, HIGH_SENSITIVITY]},
+        "alert_threshold": alert,
+        "n_rows": int(len(y)),
+        "n_positive": int(y.sum()),
+    }
+
+
+class RiskTable:
+    """A model version's calibration and bands (the "risk" entry of its manifest)."""
+
+    def __init__(self, entry):
+        self.calibration = entry["calibration"]
+        if self.calibration["method"] == "isotonic":
+            self.calibration = dict(self.calibration, x=np.asarray(self.calibration["x"]),
+                                    y=np.asarray(self.calibration["y"]))
+        self.labels = entry["bands"]["labels"]
+        self.edges = np.asarray(entry["bands"]["edges"], dtype=np.float64)
+        self.threshold = float(entry["alert_threshold"])
+
+    def calibrate(self, proba):
+        return apply_calibration(self.calibration, proba)
+
+    def bands(self, calibrated):
+        """Band label of each calibrated probability (array in, object array out)."""
+        return np.asarray(self.labels, dtype=object)[np.searchsorted(self.edges, calibrated, side="right")]
+
+    def assess(self, proba):
+        """(calibrated probability, band, alert, threshold) for one served probability."""
+        calibrated = float(self.calibrate(proba))
+        band = self.labels[int(np.searchsorted(self.edges, calibrated, side="right"))]
+        return calibrated, band, calibrated >= self.threshold, self.threshold
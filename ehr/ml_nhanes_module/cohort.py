@@ -0,0 +1,122 @@
+# cohort.py
+"""
+Streaming, parallel scoring of large cohort files.
+
+The input is read in fixed-size chunks (CSV via pandas, Parquet via pyarrow when
+installed) and only the columns the models need are parsed. Chunks are scored
+with predict_risk_many in a pool of worker processes; at most `2 * workers`
+chunks are in flight at once, so memory stays bounded by the chunk size no
+matter how large the file is. Results come back in input order. The serving
+profile and prediction cache settings of the caller are applied in every worker,
+and every chunk is scored by the store version that was served when the run started.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+CSV_ENCODING = "Windows-1252"   # same as the NHANES export the trainer reads
+
+_thread_limits = None
+
+
+def _is_parquet(path):
+    return Path(path).suffix.lower() in (".parquet", ".pq")
+
+
+def input_columns(path, encoding=CSV_ENCODING):
+    """Column names of a CSV or Parquet file, without reading the data."""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    import pandas as pd
+    return list(pd.read_csv(path, encoding=encoding, nrows=0).columns)
+
+
+def iter_chunks(path, columns, chunksize=50_000, encoding=CSV_ENCODING):
+    """
+    Yield DataFrames of at most chunksize rows holding the requested columns.
+    Columns absent from the file are added as NaN, which the imputer treats as missing.
+    """
+    import pandas as pd
+
+    wanted = list(dict.fromkeys(columns))
+    present = set(input_columns(path, encoding))
+    read = [c for c in wanted if c in present]
+
+    if _is_parquet(path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Reading Parquet needs pyarrow (pip install pyarrow)") from e
+        batches = (b.to_pandas() for b in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=read))
+    else:
+        batches = pd.read_csv(path, encoding=encoding, usecols=read, chunksize=chunksize, low_memory=False)
+
+    for chunk in batches:
+        yield chunk.reindex(columns=wanted)
+
+
+def score_chunk(disease_keys, chunk, root=None):
+    """
+    {disease_key: probabilities} for one DataFrame chunk, scored by the store version in root
+    (default: the served one). Runs inside the worker processes.
+    """
+    from .predictor import _load_schema, active_root, predict_risk_many
+    root = root or active_root()
+    schema = _load_schema(root)
+    return {d: predict_risk_many(d, chunk.loc[:, schema[d]], root) for d in disease_keys}
+
+
+def _configure(serving_profile=None, cache=None):
+    from .predictor import configure_prediction_cache, configure_serving_profile
+    if serving_profile is not None:
+        configure_serving_profile(serving_profile)
+    if cache is not None:
+        configure_prediction_cache(**cache)
+
+
+def _init_worker(serving_profile=None, cache=None):
+    # one process per core: keep OpenMP/BLAS from starting a thread per core in each of them
+    from threadpoolctl import threadpool_limits
+    global _thread_limits
+    _thread_limits = threadpool_limits(limits=1)
+    _configure(serving_profile, cache)
+    from .predictor import preload_models
+    preload_models()
+
+
+def score_file(path, disease_keys, chunksize=50_000, workers=None, passthrough=(), encoding=CSV_ENCODING,
+               serving_profile=None, cache=None, root=None):
+    """
+    Stream path through the models in disease_keys.
+    Yields (chunk, {disease_key: probabilities}) in input order; chunk also holds the
+    passthrough columns (e.g. an id column) so callers can write them next to the scores.
+    workers=0 scores in this process. serving_profile and cache (configure_prediction_cache
+    keyword arguments) configure the predictor of every process that scores.
+    root: store version directory to score with (default: the one served when the call starts).
+    """
+    from .predictor import active_root, get_all_expected_features
+
+    root = root or active_root()
+    columns = list(passthrough) + get_all_expected_features(disease_keys)
+    chunks = iter_chunks(path, columns, chunksize, encoding)
+
+    if workers == 0:
+        _configure(serving_profile, cache)
+        for chunk in chunks:
+            yield chunk, score_chunk(disease_keys, chunk, root)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(serving_profile, cache)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(score_chunk, disease_keys, chunk, root)))
+            if len(pending) >= 2 * workers:
+                done_chunk, fut = pending.popleft()
+                yield done_chunk, fut.result()
+        while pending:
+            done_chunk, fut = pending.popleft()
+            yield done_chunk, fut.result()
@@ -0,0 +1,211 @@
+# compact.py
+"""
+Compact serving profile: <Disease_Key>.compact/ next to the full compiled export.
+
+It starts from the same flattened arrays as compiled.py (thresholds and leaf
+values are already float32 there, and the four CVD component boosters already
+share one node table) and makes them smaller:
+  - each output's boosting sequence is cut after the last tree whose marginal
+    gain on validation log loss is above `tol`; later trees barely move the
+    score and cost a tree walk per row
+  - node indices, split features and tree outputs are stored in the narrowest
+    integer type that holds them (int16/int8 instead of int32)
+  - the native booster JSON files are not kept (explanations use the full export)
+
+The trainer's held-out split is halved with a fixed seed: one half picks the
+cut-off points, the other measures the result against the full export. The
+comparison (AUC and log loss per output, largest probability difference,
+array/disk bytes and latency of both) is written to report.json.
+Served with predictor.configure_serving_profile("compact") (ML_SERVING_PROFILE).
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .compiled import (FORMAT_VERSION, CompiledModel, _compile_preproc, _compile_trees, _read_booster_json,
+                       _replace_dir, booster_estimators, source_digest)
+
+TREE_ARRAYS = ("left", "right", "feature", "threshold", "default_left", "value", "roots", "tree_output")
+
+
+def _log_loss(y, margin):
+    """Mean binary log loss of margins (log-odds) for each column of margin, (n_rows,) or (n_rows, k)."""
+    y = y.reshape(-1, *([1] * (margin.ndim - 1)))
+    # log(1 + e^m) - y * m, computed without overflow
+    return np.mean(np.logaddexp(0.0, margin) - y * margin, axis=0)
+
+
+def tree_cutoffs(compiled, T, y, tol):
+    """
+    Number of leading trees to keep per output: the shortest prefix whose validation
+    log loss is within tol of the log loss of all trees (at least one tree).
+    y: (n_rows, n_outputs) 0/1 labels.
+    """
+    leaves = compiled.leaves(T)
+    keep = []
+    for k in range(compiled.n_outputs):
+        trees = np.flatnonzero(compiled.tree_output == k)
+        # margin after each prefix of the sequence, (n_rows, n_trees_k)
+        prefix = compiled.base_margin[k] + np.cumsum(leaves[:, trees], axis=1)
+        loss = _log_loss(y[:, k].astype(np.float64), prefix)
+        keep.append(int(np.argmax(loss <= loss[-1] + tol)) + 1)
+    return keep
+
+
+def select_trees(arrays, keep):
+    """Tree arrays holding only the first keep[k] trees of each output, nodes renumbered."""
+    ends = np.append(arrays["roots"][1:], len(arrays["left"]))
+    seen = np.zeros(len(arrays["base_margin"]), dtype=np.int64)
+    ranges, roots, tree_output = [], [], []
+    n_nodes = 0
+    for start, end, out in zip(arrays["roots"], ends, arrays["tree_output"]):
+        seen[out] += 1
+        if seen[out] > keep[out]:
+            continue
+        ranges.append((start, end, n_nodes - start))
+        roots.append(n_nodes)
+        tree_output.append(out)
+        n_nodes += end - start
+
+    out = dict(arrays)
+    for name in ("left", "right"):
+        out[name] = np.concatenate([np.where(arrays[name][a:b] == -1, -1, arrays[name][a:b] + shift)
+                                    for a, b, shift in ranges])
+    for name in ("feature", "threshold", "default_left", "value"):
+        out[name] = np.concatenate([arrays[name][a:b] for a, b, _shift in ranges])
+    out["roots"] = np.asarray(roots, dtype=np.int64)
+    out["tree_output"] = np.asarray(tree_output, dtype=np.int64)
+    return out
+
+
+def _narrow_int(arr):
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if len(arr) == 0 or (arr.min() >= info.min and arr.max() <= info.max):
+            return arr.astype(dtype)
+    return arr.astype(np.int64)
+
+
+def narrow(arrays):
+    """Integer tree arrays in the narrowest type that holds their values."""
+    out = dict(arrays)
+    for name in ("left", "right", "feature", "roots", "tree_output"):
+        out[name] = _narrow_int(np.asarray(arrays[name]))
+    return out
+
+
+def _array_bytes(model):
+    return int(sum(getattr(model, name).nbytes for name in TREE_ARRAYS))
+
+
+def _p50_ms(fn, repeat=200):
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    return 1000.0 * float(np.median(samples))
+
+
+def compare(full, compact, X, y, batch_size=256):
+    """Accuracy, size and latency of the compact model against the full one on X (raw rows), y (n_rows, n_outputs)."""
+    from sklearn.metrics import roc_auc_score
+
+    def metrics(model):
+        margins = model.margins(model.transform(X))
+        out = []
+        for k in range(model.n_outputs):
+            labels = y[:, k]
+            auc = float(roc_auc_score(labels, margins[:, k])) if 0 < labels.sum() < len(labels) else None
+            out.append({"roc_auc": auc, "log_loss": float(_log_loss(labels.astype(np.float64), margins[:, k]))})
+        return out
+
+    full_metrics, compact_metrics = metrics(full), metrics(compact)
+    batch = X[:batch_size]
+    return {
+        "n_rows": int(len(X)),
+        "outputs": [{"full": f, "compact": c,
+                     "roc_auc_delta": None if f["roc_auc"] is None else c["roc_auc"] - f["roc_auc"],
+                     "log_loss_delta": c["log_loss"] - f["log_loss"]}
+                    for f, c in zip(full_metrics, compact_metrics)],
+        "max_abs_prob_diff": float(np.max(np.abs(compact.predict_positive(X) - full.predict_positive(X)))),
+        "trees": {"full": int(len(full.roots)), "compact": int(len(compact.roots))},
+        "nodes": {"full": int(len(full.left)), "compact": int(len(compact.left))},
+        "tree_array_bytes": {"full": _array_bytes(full), "compact": _array_bytes(compact)},
+        "latency_ms": {
+            "full": {"row": _p50_ms(lambda: full.predict_positive(X[:1])),
+                     f"batch_{len(batch)}": _p50_ms(lambda: full.predict_positive(batch), 50)},
+            "compact": {"row": _p50_ms(lambda: compact.predict_positive(X[:1])),
+                        f"batch_{len(batch)}": _p50_ms(lambda: compact.predict_positive(batch), 50)},
+        },
+    }
+
+
+def _dir_bytes(path):
+    return int(sum(p.stat().st_size for p in path.iterdir() if p.is_file()))
+
+
+def export_compact(preproc_path, model_path, out_dir, expected, multilabel, X_val, y_val, tol=1e-3, seed=0):
+    """
+    Write the compact export of the joblib pair to out_dir and return its report.
+    X_val: held-out raw rows (float matrix, schema order); y_val: labels, (n_rows,) or (n_rows, n_outputs).
+    """
+    import joblib
+
+    if tol < 0:
+        raise ValueError("The pruning tolerance must be >= 0")
+    preproc, model = joblib.load(preproc_path), joblib.load(model_path)
+    estimators = booster_estimators(model)
+    y_val = np.asarray(y_val).reshape(len(X_val), -1)
+    if y_val.shape[1] != len(estimators):
+        raise ValueError(f"Expected {len(estimators)} label columns, got {y_val.shape[1]}")
+
+    order = np.random.default_rng(seed).permutation(len(X_val))
+    select, held = order[: len(order) // 2], order[len(order) // 2:]
+
+    tmp = out_dir.with_name(f"{out_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        booster_bytes = 0
+        boosters = []
+        for i, est in enumerate(estimators):
+            path = tmp / f"booster_{i}.json"
+            est.get_booster().save_model(str(path))
+            boosters.append(_read_booster_json(path))
+            booster_bytes += path.stat().st_size
+            path.unlink()
+        arrays = _compile_preproc(preproc, expected)
+        arrays.update(_compile_trees(boosters))
+        full = CompiledModel(arrays, {"features": expected, "source_sha256": None})
+
+        keep = tree_cutoffs(full, full.transform(X_val[select]), y_val[select], tol)
+        compact_arrays = narrow(select_trees(arrays, keep))
+        for name, arr in compact_arrays.items():
+            np.save(tmp / f"{name}.npy", arr, allow_pickle=False)
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "profile": "compact",
+            "source_sha256": source_digest([preproc_path, model_path]),
+            "features": list(expected),
+            "multilabel": bool(multilabel),
+            "boosters": [],
+            "arrays": sorted(compact_arrays),
+            "trees_kept": keep,
+            "tolerance": tol,
+        }
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+        compact = CompiledModel.load(tmp)
+        report = compare(full, compact, X_val[held], y_val[held])
+        report.update({"tolerance": tol, "trees_kept": keep, "n_select_rows": int(len(select)),
+                       "disk_bytes": {"full": booster_bytes + sum(128 + a.nbytes for a in arrays.values()),
+                                      "compact": _dir_bytes(tmp)}})
+        (tmp / "report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        _replace_dir(tmp, out_dir)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return report
@@ -0,0 +1,361 @@
+# compiled.py
+"""
+NumPy-only scoring engine for the fitted preprocessing + XGBoost pipelines.
+
+export_compiled() flattens what trainer.py saves (a ColumnTransformer with a
+median SimpleImputer and a OneHotEncoder, followed by an XGBClassifier or a
+OneVsRestClassifier of them) into plain arrays:
+  - imputation medians and the raw column each one applies to
+  - one-hot category tables
+  - one node table for all trees (feature, threshold, children, default direction, leaf value)
+
+The boosters are also kept in XGBoost's native JSON format and the arrays are
+stored as uncompressed .npy files, so CompiledModel can memory-map them: a
+worker pays no unpickling or decompression and all workers share the pages.
+CompiledModel scores single rows and batches with those arrays only, so the
+serving path needs neither sklearn, xgboost nor pandas.
+Exporting is the only step that imports sklearn/xgboost.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+FORMAT_VERSION = 2
+
+
+def source_digest(paths):
+    """sha256 over the bytes of the artifacts a compiled model was built from."""
+    h = hashlib.sha256()
+    for p in paths:
+        h.update(p.read_bytes())
+    return h.hexdigest()
+
+
+def _compile_preproc(preproc, expected):
+    """
+    Describe the ColumnTransformer as index/value arrays over the raw feature
+    columns (in schema order). Only the transformers trainer.py uses are supported.
+    """
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import OneHotEncoder
+
+    col_index = {c: i for i, c in enumerate(expected)}
+    num_idx, medians = [], []
+    cat_idx, cat_values, cat_offsets = [], [], [0]
+
+    for name, trans, cols in preproc.transformers_:
+        if name == "remainder":
+            if trans != "drop":
+                raise NotImplementedError("Only remainder='drop' can be compiled")
+            continue
+        cols = list(cols)
+        if isinstance(trans, SimpleImputer):
+            if trans.strategy not in ("median", "mean") or trans.add_indicator:
+                raise NotImplementedError(f"Unsupported imputer settings in '{name}'")
+            stats = np.asarray(trans.statistics_, dtype=np.float64)
+            if np.isnan(stats).any() or len(stats) != len(cols):
+                raise NotImplementedError(f"Imputer '{name}' dropped empty features")
+            num_idx.extend(col_index[c] for c in cols)
+            medians.extend(stats.tolist())
+        elif isinstance(trans, OneHotEncoder):
+            if trans.drop_idx_ is not None or getattr(trans, "_infrequent_enabled", False):
+                raise NotImplementedError(f"Unsupported one-hot settings in '{name}'")
+            if trans.handle_unknown != "ignore":
+                raise NotImplementedError("Only handle_unknown='ignore' can be compiled")
+            for c, cats in zip(cols, trans.categories_):
+                try:
+                    values = np.asarray(cats, dtype=np.float64)
+                except (TypeError, ValueError):
+                    raise NotImplementedError(f"Non-numeric categories for '{c}' cannot be compiled")
+                cat_idx.append(col_index[c])
+                cat_values.extend(values.tolist())
+                cat_offsets.append(len(cat_values))
+        else:
+            raise NotImplementedError(f"Unsupported transformer '{name}': {type(trans).__name__}")
+
+    return {
+        "num_idx": np.asarray(num_idx, dtype=np.int32),
+        "medians": np.asarray(medians, dtype=np.float64),
+        "cat_idx": np.asarray(cat_idx, dtype=np.int32),
+        "cat_values": np.asarray(cat_values, dtype=np.float64),
+        "cat_offsets": np.asarray(cat_offsets, dtype=np.int32),
+    }
+
+
+def _read_booster_json(path):
+    """Parse a booster saved with XGBoost's native JSON format."""
+    model = json.loads(path.read_text(encoding="utf-8"))
+    best = model["learner"].get("attributes", {}).get("best_iteration")
+    return model, (int(best) if best is not None else None)
+
+
+def _compile_trees(boosters):
+    """
+    Concatenate the trees of one or more binary:logistic boosters into one node
+    table. Each tree remembers which output (booster) it contributes to.
+    Leaf values live in `value`; internal nodes have left != -1.
+    """
+    left, right, feature, threshold, default_left, value = [], [], [], [], [], []
+    roots, tree_output, base_margin = [], [], []
+
+    for out_idx, (model, best_iteration) in enumerate(boosters):
+        learner = model["learner"]
+        if learner["objective"]["name"] != "binary:logistic":
+            raise NotImplementedError(f"Unsupported objective {learner['objective']['name']}")
+        gb = learner["gradient_booster"]
+        if gb["name"] != "gbtree":
+            raise NotImplementedError(f"Unsupported booster {gb['name']}")
+        trees = gb["model"]["trees"]
+        if best_iteration is not None:
+            per_round = int(gb["model"]["gbtree_model_param"]["num_parallel_tree"])
+            trees = trees[: (best_iteration + 1) * per_round]
+
+        base_score = float(learner["learner_model_param"]["base_score"])
+        base_margin.append(np.log(base_score / (1.0 - base_score)))
+
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise NotImplementedError("Categorical splits cannot be compiled")
+            offset = len(left)
+            lc = np.asarray(tree["left_children"], dtype=np.int64)
+            rc = np.asarray(tree["right_children"], dtype=np.int64)
+            is_leaf = lc == -1
+            left.extend(np.where(is_leaf, -1, lc + offset).tolist())
+            right.extend(np.where(is_leaf, -1, rc + offset).tolist())
+            feature.extend(np.where(is_leaf, 0, tree["split_indices"]).tolist())
+            cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+            # for leaves split_conditions holds the leaf weight
+            threshold.extend(np.where(is_leaf, 0.0, cond).tolist())
+            value.extend(np.where(is_leaf, cond, 0.0).tolist())
+            default_left.extend(tree["default_left"])
+            roots.append(offset)
+            tree_output.append(out_idx)
+
+    return {
+        "left": np.asarray(left, dtype=np.int32),
+        "right": np.asarray(right, dtype=np.int32),
+        "feature": np.asarray(feature, dtype=np.int32),
+        "threshold": np.asarray(threshold, dtype=np.float32),
+        "default_left": np.asarray(default_left, dtype=bool),
+        "value": np.asarray(value, dtype=np.float32),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "tree_output": np.asarray(tree_output, dtype=np.int32),
+        "base_margin": np.asarray(base_margin, dtype=np.float64),
+    }
+
+
+def booster_estimators(model):
+    """
+    The XGBoost estimators inside a fitted model, one per output.
+    Raises NotImplementedError for anything the engine cannot reproduce.
+    """
+    from sklearn.multiclass import OneVsRestClassifier
+
+    if isinstance(model, OneVsRestClassifier):
+        if not getattr(model, "multilabel_", False):
+            raise NotImplementedError("Only multilabel OneVsRestClassifier models can be compiled")
+        estimators = list(model.estimators_)
+    else:
+        estimators = [model]
+    for est in estimators:
+        if not hasattr(est, "get_booster"):
+            raise NotImplementedError(f"Unsupported estimator {type(est).__name__}")
+    return estimators
+
+
+def _replace_dir(src, dst):
+    """
+    Move src into place as dst. The previous export is renamed away rather than
+    overwritten, so processes that still have its arrays mapped keep valid pages.
+    """
+    old = None
+    if dst.exists():
+        old = dst.with_name(f"{dst.name}.old-{os.getpid()}")
+        os.replace(dst, old)
+    os.replace(src, dst)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def parity_sample(compiled, n_rows=2000, seed=0):
+    """
+    Synthetic raw inputs that exercise the compiled model: values exactly on and
+    around the split thresholds, values scattered around the medians, missing
+    values, and known/unknown categories.
+    """
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, compiled.n_features), dtype=np.float64)
+    internal = compiled.left != -1
+    for k, raw in enumerate(compiled.num_idx):
+        thr = compiled.threshold[internal & (compiled.feature == k)].astype(np.float64)
+        scattered = compiled.medians[k] * rng.lognormal(0.0, 0.5, n_rows)
+        if len(thr):
+            on_split = rng.choice(thr, n_rows) + rng.choice([0.0, -1e-3, 1e-3], n_rows)
+            X[:, raw] = np.where(rng.random(n_rows) < 0.5, on_split, scattered)
+        else:
+            X[:, raw] = scattered
+        X[rng.random(n_rows) < 0.1, raw] = np.nan
+    for j, raw in enumerate(compiled.cat_idx):
+        cats = compiled.cat_values[compiled.cat_offsets[j]: compiled.cat_offsets[j + 1]]
+        choices = np.concatenate([cats, [np.nan, cats.max() + 1.0]])
+        X[:, raw] = rng.choice(choices, n_rows)
+    return X
+
+
+def parity_error(compiled, preproc, model, expected, multilabel, X):
+    """Largest absolute difference between the compiled and the sklearn/xgboost scores on X."""
+    import pandas as pd
+    from .predictor import _positive_proba
+
+    reference = _positive_proba(model, preproc.transform(pd.DataFrame(X, columns=expected)), multilabel)
+    return float(np.max(np.abs(compiled.predict_positive(X) - reference)))
+
+
+def export_compiled(preproc_path, model_path, out_dir, expected, multilabel, n_check=2000, tol=1e-6):
+    """
+    Convert the joblib pair at preproc_path/model_path into an export directory:
+      booster_<i>.json   native XGBoost model, one per output
+      <array>.npy        uncompressed arrays (preprocessing + flattened trees), mmap-able
+      meta.json          format version, source hash, feature order
+    The trees are compiled from the native JSON files written alongside them.
+    The directory only replaces out_dir if it reproduces the original scores within tol
+    on a synthetic sample. Returns the measured parity error.
+    """
+    import joblib
+
+    preproc, model = joblib.load(preproc_path), joblib.load(model_path)
+    estimators = booster_estimators(model)
+
+    tmp = out_dir.with_name(f"{out_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        booster_files = []
+        for i, est in enumerate(estimators):
+            name = f"booster_{i}.json"
+            est.get_booster().save_model(str(tmp / name))
+            booster_files.append(name)
+
+        arrays = _compile_preproc(preproc, expected)
+        arrays.update(_compile_trees([_read_booster_json(tmp / name) for name in booster_files]))
+        for name, arr in arrays.items():
+            np.save(tmp / f"{name}.npy", arr, allow_pickle=False)
+
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "source_sha256": source_digest([preproc_path, model_path]),
+            "features": list(expected),
+            "multilabel": bool(multilabel),
+            "boosters": booster_files,
+            "arrays": sorted(arrays),
+        }
+        (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+        compiled = CompiledModel.load(tmp)
+        err = parity_error(compiled, preproc, model, expected, multilabel, parity_sample(compiled, n_check))
+        if err > tol:
+            raise ValueError(f"Compiled model for {out_dir.name} differs by {err:.3g} (tolerance {tol:g})")
+        _replace_dir(tmp, out_dir)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return err
+
+
+class CompiledModel:
+    """Array-backed scorer; predict_positive() mirrors predictor._positive_proba."""
+
+    def __init__(self, arrays, meta):
+        self.n_features = len(meta["features"])
+        self.num_idx = arrays["num_idx"]
+        self.medians = arrays["medians"]
+        self.cat_idx = arrays["cat_idx"]
+        self.cat_values = arrays["cat_values"]
+        self.cat_offsets = arrays["cat_offsets"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.default_left = arrays["default_left"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.tree_output = arrays["tree_output"]
+        self.base_margin = arrays["base_margin"]
+        self.n_outputs = len(self.base_margin)
+        self.source_sha256 = meta["source_sha256"]
+        self.path = None
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Open an export directory. With mmap_mode="r" the arrays are read-only file
+        mappings, so every worker that loads the same export shares the pages.
+        """
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format in {path}")
+        # plain ndarray views of the mappings: same shared pages, but indexing them does not
+        # go through np.memmap's subclass hooks on every tree step
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mmap_mode, allow_pickle=False).view(np.ndarray)
+                  for name in meta["arrays"]}
+        model = cls(arrays, meta)
+        model.path = path
+        return model
+
+    def transform(self, X):
+        """Imputation + one-hot encoding, same column layout as the ColumnTransformer."""
+        n = X.shape[0]
+        num = X[:, self.num_idx]
+        num = np.where(np.isnan(num), self.medians, num)
+        n_cat_out = len(self.cat_values)
+        out = np.empty((n, len(self.num_idx) + n_cat_out), dtype=np.float32)
+        out[:, : len(self.num_idx)] = num
+        col = len(self.num_idx)
+        for j, raw in enumerate(self.cat_idx):
+            cats = self.cat_values[self.cat_offsets[j]: self.cat_offsets[j + 1]]
+            x = X[:, raw][:, None]
+            # unknown values (handle_unknown="ignore") encode as all zeros
+            hot = (x == cats) | (np.isnan(x) & np.isnan(cats))
+            out[:, col: col + len(cats)] = hot
+            col += len(cats)
+        return out
+
+    def leaves(self, T):
+        """Value of the leaf each row reaches in every tree, (n_rows, n_trees)."""
+        n = T.shape[0]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        rows = np.arange(n)[:, None]
+        while True:
+            left = self.left[node]
+            active = left != -1
+            if not active.any():
+                break
+            x = T[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(active, np.where(go_left, left, self.right[node]), node)
+        return self.value[node].astype(np.float64)
+
+    def margins(self, T):
+        """Raw boosted margins, one column per output."""
+        n = T.shape[0]
+        leaf = self.leaves(T)
+        out = np.empty((n, self.n_outputs), dtype=np.float64)
+        for k in range(self.n_outputs):
+            out[:, k] = self.base_margin[k] + leaf[:, self.tree_output == k].sum(axis=1)
+        return out
+
+    def predict_positive(self, X):
+        """
+        Probability of the positive class for each row of X (n_rows, n_features),
+        aggregated with max over outputs for multilabel models.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected array with {self.n_features} columns, got shape {X.shape}")
+        if X.shape[0] == 0:
+            return np.empty(0, dtype=float)
+        probs = 1.0 / (1.0 + np.exp(-self.margins(self.transform(X))))
+        return np.clip(np.max(probs, axis=1), 0.0, 1.0)
+
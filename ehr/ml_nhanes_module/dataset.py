@@ -0,0 +1,156 @@
+# dataset.py
+"""
+Columnar cache of the NHANES training CSV.
+
+`ingest(csv_path)` parses the Windows-1252 CSV once and stores every column as
+its own typed .npy file under CACHE_DIR/<stem>-<sha256 prefix>/, with a
+meta.json describing names and dtypes. Text columns are stored as integer codes
+plus their categories. `load_columns(csv_path, columns)` memory-maps only the
+requested columns, so training a model that uses eight features no longer
+parses (or holds) the few hundred others.
+
+The cache is keyed by the sha256 of the CSV bytes: editing the file gives it a
+new directory and stale data is never read. Hashes are remembered per (path,
+size, mtime) in CACHE_DIR/sources.json so an unchanged file is not re-hashed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DIR = Path(__file__).parent / "dataset_cache"
+CSV_ENCODING = "Windows-1252"
+FORMAT_VERSION = 1
+
+_sources_lock = threading.Lock()
+
+
+def _file_sha256(path, block=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_hash(csv_path, cache_dir=None):
+    """sha256 of the CSV, reusing the remembered value while its size and mtime are unchanged."""
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    path = Path(csv_path).resolve()
+    st = path.stat()
+    stamp = [st.st_size, st.st_mtime_ns]
+    index_path = cache_dir / "sources.json"
+
+    with _sources_lock:
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            index = {}
+        known = index.get(str(path))
+        if known and known[:2] == stamp:
+            return known[2]
+
+        digest = _file_sha256(path)
+        index[str(path)] = stamp + [digest]
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = index_path.with_name(f"sources.json.tmp-{os.getpid()}")
+        tmp.write_text(json.dumps(index, indent=2), encoding="utf-8")
+        os.replace(tmp, index_path)
+        return digest
+
+
+def cache_path(csv_path, cache_dir=None):
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    return cache_dir / f"{Path(csv_path).stem}-{source_hash(csv_path, cache_dir)[:16]}"
+
+
+def ingest(csv_path, cache_dir=None, encoding=CSV_ENCODING, force=False):
+    """
+    Convert csv_path into the columnar cache (once per distinct file content).
+    Returns the cache directory.
+    """
+    import pandas as pd
+
+    out = cache_path(csv_path, cache_dir)
+    if (out / "meta.json").exists() and not force:
+        return out
+
+    df = pd.read_csv(csv_path, encoding=encoding, low_memory=False)
+
+    tmp = out.with_name(f"{out.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        entry = {"name": name, "file": f"col_{i:05d}.npy"}
+        if col.dtype.kind in "biuf":
+            np.save(tmp / entry["file"], col.to_numpy())
+            entry["kind"] = "numeric"
+        else:
+            # text: integer codes (-1 = missing) plus the category values
+            cat = col.astype("category")
+            np.save(tmp / entry["file"], cat.cat.codes.to_numpy())
+            entry["kind"] = "categorical"
+            entry["categories"] = [str(c) for c in cat.cat.categories]
+        columns.append(entry)
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "source": Path(csv_path).name,
+        "source_sha256": source_hash(csv_path, cache_dir),
+        "n_rows": len(df),
+        "columns": columns,
+    }
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    if out.exists():
+        shutil.rmtree(out)
+    try:
+        os.replace(tmp, out)
+    except OSError:
+        # another process finished the same ingest first; its copy is identical
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+def read_meta(csv_path, cache_dir=None):
+    """meta.json of the cache for csv_path, ingesting the file first if needed."""
+    out = ingest(csv_path, cache_dir)
+    return json.loads((out / "meta.json").read_text(encoding="utf-8"))
+
+
+def columns(csv_path, cache_dir=None):
+    """All column names of csv_path, in file order."""
+    return [c["name"] for c in read_meta(csv_path, cache_dir)["columns"]]
+
+
+def load_columns(csv_path, names, cache_dir=None):
+    """
+    DataFrame holding only the requested columns of csv_path (those that exist,
+    in the requested order) with the dtypes pandas would have parsed.
+    """
+    import pandas as pd
+
+    out = ingest(csv_path, cache_dir)
+    meta = json.loads((out / "meta.json").read_text(encoding="utf-8"))
+    by_name = {c["name"]: c for c in meta["columns"]}
+
+    data = {}
+    for name in dict.fromkeys(names):
+        entry = by_name.get(name)
+        if entry is None:
+            continue
+        arr = np.load(out / entry["file"], mmap_mode="r")
+        if entry["kind"] == "numeric":
+            data[name] = np.array(arr)
+        else:
+            cats = np.array(entry["categories"], dtype=object)
+            codes = np.asarray(arr)
+            values = np.where(codes >= 0, cats[np.clip(codes, 0, None)] if len(cats) else None, np.nan)
+            data[name] = values.astype(object)
+    return pd.DataFrame(data, index=pd.RangeIndex(meta["n_rows"]))
@@ -0,0 +1,162 @@
+# incremental.py
+"""
+Warm-start retraining from newly labelled rows.
+
+continue_training() loads a disease's preproc/model pair from a store version,
+keeps the preprocessing frozen (same medians and one-hot categories, so the
+feature layout does not move) and appends trees to the existing XGBoost booster
+with xgb.train(..., xgb_model=booster), one call per incoming batch. Cost is
+proportional to the new rows, not to the size of the original dataset.
+A random HOLDOUT share of every batch is not trained on; the updated model's
+calibration, thresholds and bands (calibration.py) are refitted on those rows.
+
+build_version() turns the updated models into a new store version (see
+store.py) derived from the parent: untouched diseases are copied as they are,
+updated ones get their model and compiled export replaced. Their manifest entry
+keeps the parent's (metrics and, when the held-out rows were too few to refit
+it, the risk table, marked as inherited) next to the update's statistics. The
+manifest keeps per-disease label watermarks so the next run only reads rows
+labelled after them. Serving only changes when the version is promoted.
+Only the single-label models are supported: the CVD model needs one label per component.
+"""
+import shutil
+
+import numpy as np
+
+from . import store
+from .calibration import fit_risk_table
+from .predictor import CVD_KEY
+
+HOLDOUT = 0.2
+# fewest held-out rows (and of each class) a risk table is refitted from
+MIN_RISK_ROWS = 50
+MIN_RISK_CLASS_ROWS = 5
+
+
+def features_frame(expected, rows):
+    """DataFrame in schema order from stored feature dicts; None/absent values become NaN."""
+    import pandas as pd
+    data = [[np.nan if r.get(f) is None else r.get(f) for f in expected] for r in rows]
+    return pd.DataFrame(data, columns=expected).infer_objects()
+
+
+def label_watermarks(version):
+    """Per-disease watermark of the newest label a version was trained on ({} for a full retrain)."""
+    return store.read_manifest(version).get("label_watermarks", {})
+
+
+def continue_training(disease_key, batches, rounds_per_batch=10, version=None, holdout=HOLDOUT, seed=0):
+    """
+    Add trees to the model of disease_key in `version` (default: the current one) for each
+    (rows, labels) batch; batches is an iterable of (list of feature dicts, sequence of 0/1 labels).
+    A `holdout` share of each batch is kept out of training to refit the risk table on.
+    Returns (model, stats, risk): risk is the refitted risk table, or None when the held-out
+    rows are too few. (None, None, None) when batches held no rows. Nothing is written.
+    """
+    import joblib
+    import xgboost as xgb
+
+    if disease_key == CVD_KEY:
+        raise NotImplementedError("Incremental training needs a single label; CVD has one per component")
+    if not 0 <= holdout < 1:
+        raise ValueError("holdout must be in [0, 1)")
+    version = version or store.read_current()
+    root = store.version_dir(version)
+    expected = store.read_manifest(version)["schema"].get(disease_key)
+    if expected is None:
+        raise KeyError(f"Unknown disease '{disease_key}'")
+
+    preproc_path, model_path = store.artifact_paths(root, disease_key)
+    preproc = joblib.load(preproc_path)
+    model = joblib.load(model_path)
+    booster = model.get_booster()
+    params = {k: v for k, v in model.get_xgb_params().items() if v is not None}
+    rounds_before = booster.num_boosted_rounds()
+
+    rng = np.random.default_rng(seed)
+    held_X, held_y = [], []
+    n_rows = n_pos = n_batches = 0
+    for rows, labels in batches:
+        y = np.asarray(labels, dtype=np.float32)
+        if not len(y):
+            continue
+        X_t = preproc.transform(features_frame(expected, rows))
+        held = np.zeros(len(y), dtype=bool)
+        held[rng.choice(len(y), int(len(y) * holdout), replace=False)] = True
+        held_X.append(X_t[held])
+        held_y.append(y[held])
+        X_t, y = X_t[~held], y[~held]
+        booster = xgb.train(params, xgb.DMatrix(X_t, label=y), num_boost_round=rounds_per_batch, xgb_model=booster)
+        n_rows += len(y)
+        n_pos += int(y.sum())
+        n_batches += 1
+
+    if not n_rows:
+        return None, None, None
+
+    # early-stopping markers of the parent would hide the new trees from predict_proba
+    booster.set_attr(best_iteration=None, best_score=None, best_ntree_limit=None)
+    model._Booster = booster
+    model.set_params(n_estimators=booster.num_boosted_rounds())
+
+    held_X, held_y = np.concatenate(held_X), np.concatenate(held_y).astype(int)
+    n_held_pos = int(held_y.sum())
+    risk = None
+    if len(held_y) >= MIN_RISK_ROWS and min(n_held_pos, len(held_y) - n_held_pos) >= MIN_RISK_CLASS_ROWS:
+        risk = fit_risk_table(model.predict_proba(held_X)[:, 1], held_y)
+
+    stats = {
+        "rows": n_rows,
+        "positives": n_pos,
+        "batches": n_batches,
+        "rounds_per_batch": rounds_per_batch,
+        "rounds_before": rounds_before,
+        "rounds_after": booster.num_boosted_rounds(),
+        "holdout_rows": int(len(held_y)),
+        "holdout_positives": n_held_pos,
+    }
+    return model, stats, risk
+
+
+def build_version(parent, updates, watermarks=None, promote=False):
+    """
+    Publish a store version derived from `parent` with updated models.
+    - updates: {disease_key: (model, stats, risk)} from continue_training
+    - watermarks: {disease_key: newest label consumed}, merged over the parent's
+    Returns the version id.
+    """
+    import joblib
+    from .compiled import export_compiled
+
+    manifest = store.read_manifest(parent)
+    staging = store.copy_version(parent)
+    try:
+        # every model keeps its parent's manifest entry (metrics of the run that trained it)
+        models = {disease_key: {k: v for k, v in entry.items() if k not in ("features", "preproc", "model", "sha256")}
+                  for disease_key, entry in manifest["models"].items()}
+        for disease_key, (model, stats, risk) in updates.items():
+            preproc_path, model_path = store.artifact_paths(staging, disease_key)
+            joblib.dump(model, model_path)
+            out_path = store.compiled_path(staging, disease_key)
+            try:
+                export_compiled(preproc_path, model_path, out_path, manifest["schema"][disease_key], multilabel=False)
+            except (NotImplementedError, ValueError):
+                # no compiled copy for this model: the predictor serves the joblib pair
+                shutil.rmtree(out_path, ignore_errors=True)
+            entry = models.setdefault(disease_key, {})
+            entry["incremental"] = stats
+            # the metrics describe the parent's model, not this one
+            if "metrics" in entry:
+                entry["metrics_source"] = f"inherited from {parent}"
+            if risk is not None:
+                entry["risk"], entry["risk_source"] = risk, "incremental holdout"
+            elif entry.get("risk"):
+                # too few held-out labels to refit: keep serving the parent's calibration and bands
+                entry["risk_source"] = f"inherited from {parent}"
+        marks = dict(manifest.get("label_watermarks", {}))
+        marks.update(watermarks or {})
+        return store.publish(staging, source="incremental", parent=parent, models=models,
+                             extra={"label_watermarks": marks}, promote=promote)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
@@ -1,98 +1,471 @@
-# replace the existing predict_risk(...) in ml_nhanes_module/predictor.py with this
+# predictor.py
 
-import joblib
 import numpy as np
-import pandas as pd
-from pathlib import Path
 import json
+from functools import lru_cache
 
-MODEL_DIR = Path(__file__).parent / "model_files"
-SCHEMA_PATH = MODEL_DIR / "schema.json"
+from . import store
+from .cache import UNSET, PredictionCache
+from .compiled import CompiledModel, source_digest
+from .registry import ModelRegistry
+from .validation import InputValidator
+
+MODEL_DIR = store.MODEL_DIR
 
 DIABETES_KEY = "Diabetes"
 LIVER_KEY = "Liver Condition"
 KIDNEY_KEY = "Weak/Failing Kidney"
 CVD_KEY = "CVD"
 
-def _load_schema():
-    if not SCHEMA_PATH.exists():
+# one registry per process: artifacts stay resident and are reloaded only when
+# the files they were loaded from change (or CURRENT points at another version)
+_REGISTRY = ModelRegistry()
+
+# memo of single-row predictions, keyed by artifact version
+_CACHE = PredictionCache(maxsize=1024, ttl=3600.0)
+
+# which compiled export predictions use: "full" (<model>.compiled/) or "compact"
+# (<model>.compact/, see compact.py; the full export is used where there is none)
+_PROFILE = "full"
+
+def get_registry():
+    return _REGISTRY
+
+# Path objects are built once per version and reused: every prediction stats its
+# files, and constructing/stringifying fresh Paths costs more than the stat itself
+@lru_cache(maxsize=64)
+def _version_root(store_dir, version):
+    return store_dir / version
+
+@lru_cache(maxsize=64)
+def _schema_path(root):
+    return root / "schema.json"
+
+@lru_cache(maxsize=64)
+def _manifest_path(root):
+    return root / "manifest.json"
+
+@lru_cache(maxsize=256)
+def _model_files(root, disease_key, profile="full"):
+    """(preproc, model, compiled dir, compiled meta.json) of disease_key in root."""
+    preproc_path, model_path = store.artifact_paths(root, disease_key)
+    compiled_path = store.compiled_path(root, disease_key, profile)
+    return preproc_path, model_path, compiled_path, compiled_path / "meta.json"
+
+def active_root():
+    """
+    Directory of the promoted artifact set (store/<CURRENT>), or None if nothing was promoted.
+    Resolve it once per prediction and load every file from it, so a promotion that
+    lands mid-request cannot pair one version's preproc with another's model.
+    """
+    if not store.CURRENT_PATH.exists():
+        return None
+    return _version_root(store.STORE_DIR, _REGISTRY.get("current", [store.CURRENT_PATH], store.read_current))
+
+def active_version():
+    """Name of the promoted store version (what scores are tagged with), or None."""
+    root = active_root()
+    return root.name if root is not None else None
+
+def version_root(version):
+    """Directory of a published store version (served or not), or None if it is not in the store."""
+    root = _version_root(store.STORE_DIR, version)
+    return root if _manifest_path(root).exists() else None
+
+def _load_schema(root=None):
+    root = root or active_root()
+    if root is None:
         return {}
-    return json.loads(SCHEMA_PATH.read_text(encoding="utf-8"))
+    schema_path = _schema_path(root)
+
+    def _read():
+        return json.loads(schema_path.read_text(encoding="utf-8"))
+
+    return _REGISTRY.get("schema", [schema_path], _read)
 
 def list_models():
     schema = _load_schema()
-    return [k for k in schema.keys() if k != "cvd_components"]
+    return store.model_keys(schema)
 
 def get_expected_features(disease_key):
     schema = _load_schema()
     return schema.get(disease_key)
 
-def _load_artifacts_for(disease_key):
-    base = MODEL_DIR / disease_key.replace(" ", "_")
-    preproc_path = base.with_suffix(".preproc.joblib")
-    model_path = base.with_suffix(".model.joblib")
+def _artifact_paths(disease_key, root=None):
+    return _model_files(root or active_root() or MODEL_DIR, disease_key)[:2]
+
+def _compiled_path(disease_key, root=None):
+    return _model_files(root or active_root() or MODEL_DIR, disease_key)[2]
+
+def _artifacts_entry(disease_key, root=None):
+    preproc_path, model_path = _artifact_paths(disease_key, root)
     if not preproc_path.exists() or not model_path.exists():
-        raise FileNotFoundError(f"Artifacts for '{disease_key}' not found in {MODEL_DIR}")
-    preproc = joblib.load(preproc_path)
-    model = joblib.load(model_path)
-    return preproc, model
+        raise FileNotFoundError(f"Artifacts for '{disease_key}' not found in {preproc_path.parent}")
+
+    def _load():
+        import joblib
+        return joblib.load(preproc_path), joblib.load(model_path)
+
+    return _REGISTRY.get_entry(f"artifacts:{disease_key}", [preproc_path, model_path], _load)
+
+def _load_artifacts_for(disease_key, root=None):
+    return _artifacts_entry(disease_key, root)[1]
+
+def _compiled_entry(disease_key, root=None, profile=None):
+    """
+    (signature, CompiledModel) for disease_key; the model is None when there is no
+    compiled export or it was built from other preproc/model files than the ones on disk.
+    profile defaults to the serving profile; a missing or stale compact export falls back to the full one.
+    """
+    root = root or active_root()
+    profile = profile or _PROFILE
+    preproc_path, model_path, compiled_path, meta_path = _model_files(root or MODEL_DIR, disease_key, profile)
+    if not meta_path.exists():
+        return (None, None) if profile == "full" else _compiled_entry(disease_key, root, "full")
+
+    def _load():
+        compiled = CompiledModel.load(compiled_path)
+        if compiled.source_sha256 != source_digest([preproc_path, model_path]):
+            return None
+        return compiled
+
+    # meta.json is written last and the export directory is swapped in whole,
+    # so its signature changes whenever a new export lands
+    sig, compiled = _REGISTRY.get_entry(f"compiled:{profile}:{disease_key}", [meta_path, preproc_path, model_path],
+                                        _load)
+    if compiled is None and profile != "full":
+        return _compiled_entry(disease_key, root, "full")
+    return sig, compiled
+
+def _load_compiled_for(disease_key, root=None, profile=None):
+    return _compiled_entry(disease_key, root, profile)[1]
+
+def _artifact_version(disease_key, root=None):
+    """Signature of the files the next prediction for disease_key will be served from."""
+    sig, compiled = _compiled_entry(disease_key, root)
+    if compiled is not None:
+        return sig
+    return _artifacts_entry(disease_key, root)[0]
+
+def _categorical_features(disease_key, expected, root):
+    """Features the model one-hot encodes, from the compiled export when there is one (no sklearn import)."""
+    compiled = _load_compiled_for(disease_key, root)
+    if compiled is not None:
+        return [expected[j] for j in compiled.cat_idx]
+    preproc, _model = _load_artifacts_for(disease_key, root)
+    return [c for _name, trans, cols in preproc.transformers_ if hasattr(trans, "categories_") for c in cols]
+
+def get_validator(disease_key, root=None):
+    """InputValidator for disease_key, built once per artifact version (see validation.py)."""
+    root = root or active_root()
+
+    def _build():
+        expected = _expected_for(disease_key, _load_schema(root))
+        return InputValidator(disease_key, expected, _categorical_features(disease_key, expected, root))
+
+    # a published version never changes, so its schema.json (path + stat) identifies the artifacts too
+    return _REGISTRY.get(f"validator:{disease_key}", [_schema_path(root)], _build)
+
+def get_union_validator(disease_keys=None, root=None):
+    """
+    One validator over the union of the features of disease_keys (default: every model);
+    a feature is categorical if any of the models one-hot encodes it. Slice each model's
+    row out of its output with validator.columns(get_expected_features(d)).
+    """
+    root = root or active_root()
+    disease_keys = list(disease_keys or store.model_keys(_load_schema(root)))
+
+    def _build():
+        validators = [get_validator(d, root) for d in disease_keys]
+        features = list(dict.fromkeys(f for v in validators for f in v.features))
+        categorical = {v.features[j] for v in validators for j in np.flatnonzero(v.categorical)}
+        return InputValidator(", ".join(disease_keys), features, categorical)
+
+    # its own prefix: a one-model union is built differently from that model's validator
+    return _REGISTRY.get("union-validator:" + "|".join(disease_keys), [_schema_path(root)], _build)
+
+def preload_models():
+    """
+    Load the schema and every model listed in it into the registry.
+    Useful right after a worker starts so the first request does not pay for it.
+    """
+    root = active_root()
+    for disease_key in store.model_keys(_load_schema(root)):
+        if _load_compiled_for(disease_key, root) is None:
+            _load_artifacts_for(disease_key, root)
+        get_validator(disease_key, root)
+        get_risk_table(disease_key, root)
+    return _REGISTRY.stats()
+
+def _expected_for(disease_key, schema):
+    expected = schema.get(disease_key)
+    if disease_key == CVD_KEY:
+        if expected is None or not schema.get("cvd_components", []):
+            raise RuntimeError("CVD schema or components missing")
+    elif expected is None:
+        raise KeyError(f"No schema for disease '{disease_key}'")
+    return expected
+
+def _rows_to_frame(disease_key, expected, rows):
+    """
+    Build a DataFrame with exactly the fit-time columns from a DataFrame, a list of
+    feature dicts or a 2-D array whose columns follow the schema order.
+    Missing features are reported once for the whole batch.
+    """
+    import pandas as pd
+
+    if isinstance(rows, pd.DataFrame):
+        missing = [f for f in expected if f not in rows.columns]
+        if missing:
+            raise KeyError(f"Missing features for {disease_key}: {missing}")
+        return rows.loc[:, expected]
+
+    if isinstance(rows, (list, tuple)) and rows and isinstance(rows[0], dict):
+        missing = [f for f in expected if any(f not in r for r in rows)]
+        if missing:
+            raise KeyError(f"Missing features for {disease_key}: {missing}")
+        return pd.DataFrame.from_records(rows, columns=expected)
+
+    arr = rows if isinstance(rows, np.ndarray) else np.asarray(rows, dtype=object)
+    if arr.size == 0:
+        return pd.DataFrame(columns=expected)
+    if arr.ndim != 2 or arr.shape[1] != len(expected):
+        raise ValueError(f"Expected a 2-D array with {len(expected)} columns for {disease_key}, got shape {arr.shape}")
+    # object arrays (lists of lists) get per-column dtypes back so the imputer sees numbers
+    return pd.DataFrame(arr, columns=expected).infer_objects()
+
+def _positive_proba(model, X_t, multilabel):
+    """
+    Vectorized probability of the positive class for every row of X_t.
+    For the CVD multilabel model the components are aggregated with max (conservative).
+    """
+    if hasattr(model, "predict_proba"):
+        probs = model.predict_proba(X_t)
+        if multilabel:
+            out = np.max(probs, axis=1)
+        elif probs.shape[1] >= 2:
+            out = probs[:, 1]
+        else:
+            out = probs[:, 0]
+        return np.clip(out.astype(float), 0.0, 1.0)
+    if not multilabel and hasattr(model, "decision_function"):
+        df_val = np.asarray(model.decision_function(X_t), dtype=float)
+        return np.clip(1.0 / (1.0 + np.exp(-df_val)), 0.0, 1.0)
+    preds = np.asarray(model.predict(X_t), dtype=float)
+    return np.max(preds, axis=1) if multilabel else preds
+
+def _predict_sklearn(disease_key, expected, rows, root=None):
+    X_df = _rows_to_frame(disease_key, expected, rows)
+    if len(X_df) == 0:
+        return np.empty(0, dtype=float)
+    preproc, model = _load_artifacts_for(disease_key, root)
+    X_t = preproc.transform(X_df)
+    return _positive_proba(model, X_t, multilabel=(disease_key == CVD_KEY))
+
+def predict_risk_many(disease_key, rows, root=None):
+    """
+    Batched predict_risk.
+    - rows: DataFrame, list of feature dicts, or 2-D array with columns in schema order.
+    - root: store version directory to score with (default: the served one).
+    - Returns a float ndarray of shape (n_rows,) with the same values predict_risk
+      would return row by row (max over components for CVD).
+    Uses the NumPy engine from compiled.py when an up-to-date export exists,
+    otherwise the joblib preproc/model pair.
+    """
+    return _predict_many(disease_key, rows, root or active_root())
+
+def _predict_many(disease_key, rows, root):
+    expected = _expected_for(disease_key, _load_schema(root))
+    compiled = _load_compiled_for(disease_key, root)
+    if compiled is not None:
+        # rows coerced by a validator (predict_row, the API paths) are scored as they are
+        if not (isinstance(rows, np.ndarray) and rows.dtype == np.float64):
+            rows = get_validator(disease_key, root).coerce_many(rows)
+        return compiled.predict_positive(rows)
+    return _predict_sklearn(disease_key, expected, rows, root)
 
 def predict_risk(disease_key, features_dict):
     """
     Predict probability for disease_key.
     - features_dict: {feature_name: value, ...} . All expected features must be present.
     - Returns float in [0,1].
+    The dict is coerced once into a float row (see validation.py); bad values raise
+    FeatureValidationError listing every offending field.
+    Repeated inputs are answered from the prediction cache (see cache.py) until another
+    artifact version is promoted.
     """
-    schema = _load_schema()
-    if disease_key != CVD_KEY:
-        preproc, model = _load_artifacts_for(disease_key)
-        expected = schema.get(disease_key)
-        if expected is None:
-            raise KeyError(f"No schema for disease '{disease_key}'")
-
-        # Check all required features present
-        missing = [f for f in expected if f not in features_dict]
-        if missing:
-            raise KeyError(f"Missing features for {disease_key}: {missing}")
+    root = active_root()
+    row = get_validator(disease_key, root).coerce_row(features_dict, require_all=True)
+    return predict_row(disease_key, row, root)
 
-        # Build a single-row DataFrame with the exact column names used during fit
-        X_df = pd.DataFrame([{k: features_dict[k] for k in expected}], columns=expected)
-
-        # Transform and predict
-        X_t = preproc.transform(X_df)
-        if hasattr(model, "predict_proba"):
-            probs = model.predict_proba(X_t)
-            if probs.shape[1] >= 2:
-                return float(np.clip(probs[0, 1], 0.0, 1.0))
-            else:
-                return float(np.clip(probs[0, 0], 0.0, 1.0))
-        elif hasattr(model, "decision_function"):
-            df_val = model.decision_function(X_t)
-            p = 1.0 / (1.0 + np.exp(-df_val[0]))
-            return float(np.clip(p, 0.0, 1.0))
-        else:
-            pred = model.predict(X_t)[0]
-            return float(pred)
-
-    else:
-        # CVD multilabel case
-        preproc, model = _load_artifacts_for(CVD_KEY)
-        expected = schema.get(CVD_KEY)
-        components = schema.get("cvd_components", [])
-        if expected is None or not components:
-            raise RuntimeError("CVD schema or components missing")
+def predict_row(disease_key, row, root=None):
+    """predict_risk for a row already coerced by get_validator(disease_key) (1-D, schema order)."""
+    root = root or active_root()
+    key, prob = cached_risk(disease_key, row, root)
+    if prob is not None:
+        return prob
+    prob = float(_predict_many(disease_key, row[None, :], root)[0])
+    cache_risk(key, prob)
+    return prob
 
-        missing = [f for f in expected if f not in features_dict]
-        if missing:
-            raise KeyError(f"Missing features for CVD: {missing}")
+def cached_risk(disease_key, row, root=None):
+    """
+    (key, probability) of a coerced row in the prediction cache. probability is None on a
+    miss and key is None when the cache is off; hand the key to cache_risk() once scored.
+    """
+    if _CACHE.maxsize <= 0:
+        return None, None
+    key = (disease_key, _artifact_version(disease_key, root or active_root()), row.tobytes())
+    return key, _CACHE.get(key)
 
-        X_df = pd.DataFrame([{k: features_dict[k] for k in expected}], columns=expected)
-        X_t = preproc.transform(X_df)
+def cache_risk(key, prob):
+    if key is not None:
+        _CACHE.put(key, prob)
 
-        if hasattr(model, "predict_proba"):
-            probs = model.predict_proba(X_t)[0]  # shape (n_components,)
-            # Aggregation: use max probability among components (conservative).
-            return float(np.clip(float(np.max(probs)), 0.0, 1.0))
-        else:
-            preds = model.predict(X_t)[0]
-            return float(np.max(preds))
+def get_risk_table(disease_key, root=None):
+    """
+    RiskTable (calibration, alert threshold, risk bands; see calibration.py) the trainer stored
+    for disease_key in the served version's manifest, or None when it has none (legacy imports).
+    """
+    root = root or active_root()
+    if root is None:
+        return None
+    manifest_path = _manifest_path(root)
+    if not manifest_path.exists():
+        return None
+
+    def _build():
+        from .calibration import RiskTable
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        entry = manifest["models"].get(disease_key, {}).get("risk")
+        return RiskTable(entry) if entry else None
+
+    return _REGISTRY.get(f"risk:{disease_key}", [manifest_path], _build)
+
+def assess_row(disease_key, row, root=None):
+    """
+    predict_row with the version's calibration applied: {"probability" (calibrated),
+    "raw_probability", "band", "alert", "threshold"}. Without a risk table the probability
+    is the raw one and band/alert/threshold are None (the caller picks a threshold).
+    """
+    root = root or active_root()
+    prob = predict_row(disease_key, row, root)
+    table = get_risk_table(disease_key, root)
+    if table is None:
+        return {"probability": prob, "raw_probability": prob, "band": None, "alert": None, "threshold": None}
+    calibrated, band, alert, threshold = table.assess(prob)
+    return {"probability": calibrated, "raw_probability": prob, "band": band, "alert": alert, "threshold": threshold}
+
+def assess_risk(disease_key, features_dict):
+    """predict_risk returning calibrated probability, risk band and alert in one call (see assess_row)."""
+    root = active_root()
+    row = get_validator(disease_key, root).coerce_row(features_dict, require_all=True)
+    return assess_row(disease_key, row, root)
+
+def get_explainer(disease_key, root=None):
+    """
+    Explainer for disease_key (see explain.py), built once per artifact version. Uses the
+    compiled export's preprocessing and native boosters when there is one, so explaining
+    does not need sklearn; otherwise the joblib pair.
+    """
+    root = root or active_root()
+
+    def _build():
+        import xgboost as xgb
+        from .compiled import booster_estimators
+        from .explain import Explainer, owner_from_compiled, owner_from_preproc
+
+        schema = _load_schema(root)
+        expected = _expected_for(disease_key, schema)
+        components = schema.get("cvd_components") if disease_key == CVD_KEY else None
+        # the compact export keeps no native boosters
+        compiled = _load_compiled_for(disease_key, root, "full")
+        if compiled is not None:
+            meta = json.loads((compiled.path / "meta.json").read_text(encoding="utf-8"))
+            boosters = [xgb.Booster(model_file=str(compiled.path / name)) for name in meta["boosters"]]
+            return Explainer(expected, boosters, owner_from_compiled(compiled), compiled.transform, components)
+
+        import pandas as pd
+        preproc, model = _load_artifacts_for(disease_key, root)
+        boosters = [est.get_booster() for est in booster_estimators(model)]
+        transform = lambda X: preproc.transform(pd.DataFrame(X, columns=expected))
+        return Explainer(expected, boosters, owner_from_preproc(preproc, expected), transform, components)
+
+    return _REGISTRY.get(f"explainer:{disease_key}", [_schema_path(root)], _build)
+
+def explain_many(disease_key, rows, approximate=False):
+    """
+    Feature contributions for a batch (same inputs as predict_risk_many).
+    Returns one JSON-ready dict per row: base value and per-feature contributions in
+    log-odds, strongest first, tagged with the artifact version that produced them.
+    The contributions explain the model's raw margin; each record also carries the raw
+    probability that margin gives and the calibrated one the scores show (see calibration.py).
+    approximate=True trades exact SHAP values for speed on large batches.
+    """
+    root = active_root()
+    X = get_validator(disease_key, root).coerce_many(rows)
+    explainer = get_explainer(disease_key, root)
+    contributions, base, outputs = explainer.explain(X, approximate)
+    version = root.name if root is not None else None
+    records = [explainer.record(X[i], contributions[i], base[i], outputs[i], version, approximate)
+               for i in range(len(X))]
+    raw = 1.0 / (1.0 + np.exp(-np.array([r["margin"] for r in records], dtype=np.float64)))
+    table = get_risk_table(disease_key, root)
+    calibrated = table.calibrate(raw) if table is not None else raw
+    for record, p, c in zip(records, raw, calibrated):
+        record["raw_probability"], record["probability"] = float(p), float(c)
+    return records
+
+def explain(disease_key, features_dict):
+    """explain_many for one feature dict."""
+    return explain_many(disease_key, [features_dict])[0]
+
+def get_all_expected_features(disease_keys=None):
+    """Union of the features of disease_keys (default: every model), in first-seen order."""
+    union = {}
+    for disease_key in disease_keys or list_models():
+        for f in get_expected_features(disease_key) or []:
+            union.setdefault(f, None)
+    return list(union)
+
+def predict_risk_all(features_dict, disease_keys=None, parallel=True, root=None):
+    """
+    Score one feature dict against several models (default: all of list_models()).
+    - features_dict must hold the union of the models' features (see get_all_expected_features).
+    - root: store version directory to score with (default: the served one).
+    - Returns {disease_key: probability}. The models run concurrently in threads when parallel=True.
+    The dict is coerced once for all models; each model scores its slice of that row.
+    """
+    root = root or active_root()
+    disease_keys = list(disease_keys or store.model_keys(_load_schema(root)))
+    union = get_union_validator(disease_keys, root)
+    row = union.coerce_row(features_dict, require_all=True)
+    schema = _load_schema(root)
+    rows = {d: row[union.columns(schema[d])] for d in disease_keys}
+    if not parallel or len(disease_keys) < 2:
+        return {d: predict_row(d, rows[d], root) for d in disease_keys}
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(disease_keys), thread_name_prefix="predict-all") as pool:
+        futures = {d: pool.submit(predict_row, d, rows[d], root) for d in disease_keys}
+        return {d: f.result() for d, f in futures.items()}
+
+def configure_serving_profile(profile):
+    """Serve predictions from the "full" or the "compact" compiled exports (see compact.py)."""
+    global _PROFILE
+    if profile not in store.PROFILES:
+        raise ValueError(f"Unknown serving profile '{profile}' (expected one of {sorted(store.PROFILES)})")
+    _PROFILE = profile
+
+def serving_profile():
+    return _PROFILE
+
+def configure_prediction_cache(maxsize=None, ttl=UNSET):
+    """
+    Resize the prediction cache (0 disables it) and set the entry TTL in seconds (None = no expiry).
+    Arguments that are not passed keep their current value.
+    """
+    _CACHE.configure(maxsize, ttl)
+
+def prediction_cache_stats():
+    return _CACHE.stats()
@@ -0,0 +1,72 @@
+# registry.py
+"""
+Process-wide cache for the artifacts the predictor serves from.
+
+Each entry is keyed by name and remembers the (mtime, size) signature of the
+files it was built from. Lookups stat those files and only run the loader
+again when the signature changed, so a worker unpickles each preproc/model
+pair and parses schema.json once instead of on every prediction.
+"""
+import threading
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries = {}                 # key -> (signature, value)
+        # re-entrant: a loader may load the entries it is derived from (validators read the model)
+        self._load_lock = threading.RLock()
+        self._stats_lock = threading.Lock()
+        self._counters = {"hits": 0, "loads": 0, "reloads": 0}
+
+    @staticmethod
+    def _signature(paths):
+        sig = []
+        for p in paths:
+            st = p.stat()  # FileNotFoundError propagates to the caller
+            sig.append((str(p), st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._counters[name] += 1
+
+    def get(self, key, paths, loader):
+        """
+        Return the cached value for key, (re)building it with loader() when any of
+        paths changed on disk since the last load.
+        The new value replaces the old one in a single assignment, so concurrent
+        readers see either the previous entry or the new one, never a partial load.
+        """
+        return self.get_entry(key, paths, loader)[1]
+
+    def get_entry(self, key, paths, loader):
+        """Like get() but returns (signature, value); the signature identifies the loaded files."""
+        sig = self._signature(paths)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == sig:
+            self._count("hits")
+            return entry
+
+        with self._load_lock:
+            # another thread may have loaded it while we waited
+            current = self._entries.get(key)
+            if current is not None and current[0] == sig:
+                self._count("hits")
+                return current
+            entry = (sig, loader())
+            self._entries[key] = entry
+            self._count("reloads" if current is not None else "loads")
+            return entry
+
+    def invalidate(self, key=None):
+        with self._load_lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._stats_lock:
+            out = dict(self._counters)
+        out["cached"] = sorted(self._entries.keys())
+        return out
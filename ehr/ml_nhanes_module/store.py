@@ -0,0 +1,231 @@
+# store.py
+"""
+Versioned, content-addressed artifact store.
+
+    model_files/
+      CURRENT                      version id of the artifact set being served
+      store/<version>/
+        manifest.json              schema, per-model files, hashes, metrics, lineage
+        schema.json
+        <Disease_Key>.preproc.joblib
+        <Disease_Key>.model.joblib
+        <Disease_Key>.compiled/    NumPy export (derived, rebuilt by compile_models)
+        <Disease_Key>.compact/     pruned, narrower export (optional, compile_models --profile compact)
+
+A version id is the sha256 of schema.json and every preproc/model file, so the
+same artifacts always land in the same directory and a version's sources never
+change after publish(). Promotion rewrites CURRENT with os.replace, which is
+atomic: a worker reads either the old or the new id, and every file of one
+prediction comes from the directory of that id (see predictor.py), so a
+preproc from one run is never paired with a model from another.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+MODEL_DIR = Path(__file__).parent / "model_files"
+STORE_DIR = MODEL_DIR / "store"
+CURRENT_PATH = MODEL_DIR / "CURRENT"
+FORMAT_VERSION = 1
+
+
+def slug(disease_key):
+    """File-name form of a disease key ("Weak/Failing Kidney" -> "Weak_Failing_Kidney")."""
+    return disease_key.replace("/", "_").replace(" ", "_")
+
+
+def artifact_paths(root, disease_key):
+    root = Path(root)
+    return root / f"{slug(disease_key)}.preproc.joblib", root / f"{slug(disease_key)}.model.joblib"
+
+
+# serving profile -> export directory suffix (see compiled.py and compact.py)
+PROFILES = {"full": ".compiled", "compact": ".compact"}
+
+
+def compiled_path(root, disease_key, profile="full"):
+    return Path(root) / f"{slug(disease_key)}{PROFILES[profile]}"
+
+
+def model_keys(schema):
+    return [k for k in schema if k != "cvd_components"]
+
+
+def version_dir(version):
+    return STORE_DIR / version
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_version(root):
+    """Version id of an artifact set: sha256 over schema.json and each model's files, in schema order."""
+    root = Path(root)
+    h = hashlib.sha256((root / "schema.json").read_bytes())
+    schema = json.loads((root / "schema.json").read_text(encoding="utf-8"))
+    for disease_key in model_keys(schema):
+        for path in artifact_paths(root, disease_key):
+            h.update(path.name.encode("utf-8"))
+            h.update(bytes.fromhex(_sha256(path)))
+    return h.hexdigest()[:16]
+
+
+def staging_dir():
+    """Fresh directory inside the store to assemble a new artifact set in (same filesystem, so publish can rename)."""
+    path = STORE_DIR / f".staging-{os.getpid()}-{time.time_ns()}"
+    path.mkdir(parents=True)
+    return path
+
+
+def publish(staging, source, parent=None, models=None, extra=None, promote=False):
+    """
+    Turn a staging directory (schema.json + preproc/model per disease) into a store version.
+    - models: per-disease manifest additions, e.g. {"Diabetes": {"metrics": {...}}}
+    - extra: top-level manifest additions (e.g. label_watermarks)
+    Returns the version id. Publishing identical artifacts again reuses the existing version.
+    """
+    staging = Path(staging)
+    schema = json.loads((staging / "schema.json").read_text(encoding="utf-8"))
+    version = content_version(staging)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": source,
+        "parent": parent,
+        "schema": schema,
+        "models": {},
+    }
+    for disease_key in model_keys(schema):
+        preproc_path, model_path = artifact_paths(staging, disease_key)
+        entry = {
+            "features": schema[disease_key],
+            "preproc": preproc_path.name,
+            "model": model_path.name,
+            "sha256": {preproc_path.name: _sha256(preproc_path), model_path.name: _sha256(model_path)},
+        }
+        entry.update((models or {}).get(disease_key, {}))
+        manifest["models"][disease_key] = entry
+    manifest.update(extra or {})
+    # the manifest is written last: a directory without one is an unfinished publish
+    (staging / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    dst = version_dir(version)
+    if dst.exists():
+        shutil.rmtree(staging, ignore_errors=True)
+    else:
+        os.replace(staging, dst)
+    if promote:
+        promote_version(version)
+    return version
+
+
+def verify(version):
+    """Names of the preproc/model files of version that are missing or differ from their manifest sha256."""
+    root = version_dir(version)
+    bad = []
+    for entry in read_manifest(version)["models"].values():
+        for name, digest in entry["sha256"].items():
+            if not (root / name).exists() or _sha256(root / name) != digest:
+                bad.append(name)
+    return bad
+
+
+def promote_version(version):
+    """
+    Point CURRENT at version. Serving processes switch on their next prediction.
+    A version whose files no longer match its manifest is refused (ValueError).
+    """
+    if not (version_dir(version) / "manifest.json").exists():
+        raise FileNotFoundError(f"No published artifact set '{version}' in {STORE_DIR}")
+    bad = verify(version)
+    if bad:
+        raise ValueError(f"Version {version} does not match its manifest: {', '.join(bad)}")
+    tmp = CURRENT_PATH.with_name(f"CURRENT.tmp-{os.getpid()}")
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, CURRENT_PATH)
+
+
+def read_current():
+    return CURRENT_PATH.read_text(encoding="utf-8").strip()
+
+
+def current_version():
+    """The promoted version id, or None when nothing was promoted yet."""
+    try:
+        return read_current()
+    except FileNotFoundError:
+        return None
+
+
+def read_manifest(version):
+    return json.loads((version_dir(version) / "manifest.json").read_text(encoding="utf-8"))
+
+
+def list_versions():
+    """Published versions, oldest first."""
+    if not STORE_DIR.exists():
+        return []
+    manifests = [read_manifest(p.name) for p in STORE_DIR.iterdir()
+                 if not p.name.startswith(".") and (p / "manifest.json").exists()]
+    return [m["version"] for m in sorted(manifests, key=lambda m: m["created_at"])]
+
+
+def copy_version(version):
+    """Staging copy of a version's sources (schema + preproc/model files) to build a derived version from."""
+    src = version_dir(version)
+    staging = staging_dir()
+    schema = read_manifest(version)["schema"]
+    shutil.copyfile(src / "schema.json", staging / "schema.json")
+    for disease_key in model_keys(schema):
+        for path in artifact_paths(src, disease_key):
+            shutil.copyfile(path, staging / path.name)
+        if compiled_path(src, disease_key).exists():
+            shutil.copytree(compiled_path(src, disease_key), compiled_path(staging, disease_key))
+    return staging
+
+
+def import_legacy(legacy_dir=MODEL_DIR, promote=True):
+    """
+    Publish artifacts from the old flat layout (<key with spaces as _>.preproc.joblib next to
+    schema.json, which put "Weak/Failing Kidney" under a Weak/ subdirectory) as a store version.
+    """
+    legacy_dir = Path(legacy_dir)
+    schema = json.loads((legacy_dir / "schema.json").read_text(encoding="utf-8"))
+    staging = staging_dir()
+    shutil.copyfile(legacy_dir / "schema.json", staging / "schema.json")
+    for disease_key in model_keys(schema):
+        old = legacy_dir / disease_key.replace(" ", "_")
+        new_preproc, new_model = artifact_paths(staging, disease_key)
+        shutil.copyfile(old.with_suffix(".preproc.joblib"), new_preproc)
+        shutil.copyfile(old.with_suffix(".model.joblib"), new_model)
+        if old.with_suffix(".compiled").exists():
+            # same preproc/model bytes, so the export's source hash still matches
+            shutil.copytree(old.with_suffix(".compiled"), compiled_path(staging, disease_key))
+    return publish(staging, source="import-legacy", promote=promote)
+
+
+def gc(keep=5):
+    """Delete all but the newest `keep` versions; the current one is always kept. Returns the removed ids."""
+    current = current_version()
+    versions = list_versions()
+    removed = []
+    for version in versions[:max(len(versions) - keep, 0)]:
+        if version != current:
+            shutil.rmtree(version_dir(version), ignore_errors=True)
+            removed.append(version)
+    for leftover in STORE_DIR.glob(".staging-*"):
+        # unfinished publishes of crashed runs
+        if time.time() - leftover.stat().st_mtime > 24 * 3600:
+            shutil.rmtree(leftover, ignore_errors=True)
+    return removed
@@ -1,7 +1,8 @@
 # trainer.py
 import os
 import json
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import shutil
 import joblib
 import pandas as pd
 import numpy as np
@@ -10,14 +11,20 @@ from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.model_selection import train_test_split
+from sklearn.metrics import log_loss, roc_auc_score
 
 import xgboost as xgb
 from sklearn.multiclass import OneVsRestClassifier
+from threadpoolctl import threadpool_limits
+
+from . import store
+from .calibration import fit_risk_table
+from .compiled import export_compiled
+from .dataset import load_columns, source_hash
 
 # Constants + target keys
-MODEL_DIR = Path(__file__).parent / "model_files"
-MODEL_DIR.mkdir(exist_ok=True)
-SCHEMA_PATH = MODEL_DIR / "schema.json"
+MODEL_DIR = store.MODEL_DIR
+TUNING_DIR = MODEL_DIR / "tuning"
 
 # Keys exactly matching your notebook mapping
 DIABETES_KEY = "Diabetes"
@@ -38,198 +45,353 @@ CVD_COMPONENTS = [
     "Ever told you had a stroke",
 ]
 
-def _save_schema(schema):
-    SCHEMA_PATH.write_text(json.dumps(schema, indent=2), encoding="utf-8")
+# predefined feature lists from your notebook (only keep those present in df)
+PREDEFINED_FEATURES = {
+    "Doctor told you have diabetes": ["Fasting Glucose (mg/dL)", "Glycohemoglobin (%)", "Triglyceride (mg/dL)",
+                                      "Direct HDL-Cholesterol (mg/dL)", "Waist Circumference (cm)",
+                                      "Body Mass Index (kg/m2)", "Systolic: Blood pressure (2nd reading) (mm Hg)"],
+    "Ever told you had any liver condition": ["Alanine aminotransferase (ALT) (U/L)", "Aspartate aminotransferase (AST) (U/L)",
+                                              "Alkaline phosphatase (U/L)", "Gamma-glutamyl transferase (GGT) (U/L)",
+                                              "Total bilirubin (mg/dL)", "Body Mass Index (kg/m2)", "Waist Circumference (cm)",
+                                              "Triglyceride (mg/dL)"],
+    "Ever told you had weak/failing kidneys": ["Creatinine, serum (mg/dL)", "Blood urea nitrogen (mg/dL)",
+                                               "Albumin, urine (µg/mL)", "Creatinine, urine (mg/dL)"]
+}
 
-def _fit_and_save_single(df, disease_key, feature_list, target_col, estimator=None):
-    """
-    Fit preprocessing & model for a single binary label and save artifacts.
-    """
-    df_local = df.copy()
-    # keep rows where target is 1 or 2 then map 1->1,2->0 (per notebook)
-    df_local = df_local[df_local[target_col].isin([1,2])].copy()
-    df_local[target_col] = df_local[target_col].map({1:1, 2:0})
+# predefined CVD features from your notebook
+CVD_FEATURES = ["Age at Screening (Adjudicated - Recode)", "Gender",
+                "Systolic: Blood pressure (2nd reading) (mm Hg)", "Diastolic: Blood pressure (2nd reading) (mm Hg)",
+                "Total Cholesterol (mg/dL)", "Direct HDL-Cholesterol (mg/dL)",
+                "LDL-cholesterol (mg/dL)", "Body Mass Index (kg/m2)"]
 
-    # drop columns with >50% missing (except the required features)
-    miss_frac = df_local.isna().mean()
-    drop_cols = [c for c in df_local.columns if (miss_frac[c] > 0.5 and c not in feature_list)]
-    if drop_cols:
-        df_local = df_local.drop(columns=drop_cols)
+# dataset shared with the training worker processes (set once per worker, never modified)
+_SHARED_DF = None
 
-    # ensure feature_list present
-    feature_list = [f for f in feature_list if f in df_local.columns]
-    if not feature_list:
-        raise RuntimeError(f"No features found for disease {disease_key} in dataframe columns")
+def _save_schema(out_dir, schema):
+    (out_dir / "schema.json").write_text(json.dumps(schema, indent=2), encoding="utf-8")
 
-    X = df_local[feature_list]
-    y = df_local[target_col].astype(int)
+def _xgb_classifier(n_jobs=None, params=None):
+    xgb_params = {"eval_metric": "logloss", "random_state": 42, "n_jobs": n_jobs}
+    # tuned hyperparameters (see tuning.py) override the defaults
+    xgb_params.update(params or {})
 
-    # split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    # remove deprecated params for newer versions
+    if "use_label_encoder" in xgb.XGBClassifier().get_params():
+        xgb_params["use_label_encoder"] = False
+
+    return xgb.XGBClassifier(**xgb_params)
+
+def _reset_n_jobs(estimator):
+    """Drop the training-time thread count so the saved model uses the serving default."""
+    for est in [estimator] + list(getattr(estimator, "estimators_", [])):
+        if "n_jobs" in est.get_params():
+            est.set_params(n_jobs=None)
 
+def tuned_params_path(disease_key):
+    return TUNING_DIR / f"{store.slug(disease_key)}.params.json"
+
+def load_tuned_params(disease_key):
+    """Best XGBoost params persisted by tuning.py for disease_key, or None."""
+    path = tuned_params_path(disease_key)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))["best_params"]
+
+def _fit_preproc(X_train):
     # identify categorical vs numeric for ColumnTransformer
     categorical_cols = [c for c in X_train.columns if X_train[c].dtype == "object" or X_train[c].nunique() <= 10]
     numeric_cols = [c for c in X_train.columns if c not in categorical_cols]
 
-    numeric_transformer = ("num", SimpleImputer(strategy="median"), numeric_cols)
-    cat_transformer = ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), categorical_cols)
-
     transformers = []
     if numeric_cols:
-        transformers.append(numeric_transformer)
+        transformers.append(("num", SimpleImputer(strategy="median"), numeric_cols))
     if categorical_cols:
-        transformers.append(cat_transformer)
+        transformers.append(("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), categorical_cols))
 
     preproc = ColumnTransformer(transformers=transformers, remainder="drop")
-
     # fit preprocessing on train
     preproc.fit(X_train)
+    return preproc, categorical_cols, numeric_cols
 
-    X_train_t = preproc.transform(X_train)
-    X_test_t = preproc.transform(X_test)
+def _split_single(df, disease_key, feature_list, target_col):
+    """
+    Features present in df and the train/test split of the rows labelled for target_col.
+    df is only read: the rows/columns needed are selected into a new frame.
+    """
+    # ensure feature_list present
+    feature_list = [f for f in feature_list if f in df.columns]
+    if not feature_list:
+        raise RuntimeError(f"No features found for disease {disease_key} in dataframe columns")
 
-    # choose estimator (XGBoost by default)
-    if estimator is None:
-        xgb_params = {"eval_metric": "logloss", "random_state": 42}
+    # keep rows where target is 1 or 2 then map 1->1,2->0 (per notebook).
+    # Only the features and the target are kept; the other columns never reach the model.
+    df_local = df.loc[df[target_col].isin([1,2]), feature_list + [target_col]]
+    df_local[target_col] = df_local[target_col].map({1:1, 2:0})
 
-        # remove deprecated params for newer versions
-        if "use_label_encoder" in xgb.XGBClassifier().get_params():
-            xgb_params["use_label_encoder"] = False
+    X = df_local[feature_list]
+    y = df_local[target_col].astype(int)
 
-        estimator = xgb.XGBClassifier(**xgb_params)
+    # split
+    return feature_list, train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
-    estimator.fit(X_train_t, y_train)
+def _prepare_single(df, disease_key, feature_list, target_col):
+    """Rows, split and fitted preprocessing for a single binary label."""
+    feature_list, (X_train, X_test, y_train, y_test) = _split_single(df, disease_key, feature_list, target_col)
+    preproc, categorical_cols, numeric_cols = _fit_preproc(X_train)
+    return {
+        "features": feature_list,
+        "preproc": preproc,
+        "categorical": categorical_cols,
+        "numeric": numeric_cols,
+        "X_train": preproc.transform(X_train),
+        "X_test": preproc.transform(X_test),
+        "y_train": y_train,
+        "y_test": y_test,
+    }
 
-    # Save artifacts
-    base = MODEL_DIR / disease_key.replace(" ", "_")
-    base.parent.mkdir(parents=True, exist_ok=True)
-    preproc_path = base.with_suffix(".preproc.joblib")
-    model_path = base.with_suffix(".model.joblib")
+def _split_cvd(df, predefined_features):
+    """Features present in df and the train/test split of the rows labelled for all four CVD components."""
+    # select features: we'll use predefined_features ∩ columns
+    feature_list = [f for f in predefined_features if f in df.columns]
+    if not feature_list:
+        raise RuntimeError("No predefined CVD features found in dataframe.")
 
-    joblib.dump(preproc, preproc_path)
-    joblib.dump(estimator, model_path)
+    # mask rows where all cvd targets are in [1,2] per notebook; keep only the columns used
+    mask = df[CVD_COMPONENTS].isin([1,2]).all(axis=1)
+    df_cvd = df.loc[mask, feature_list + CVD_COMPONENTS]
+    for t in CVD_COMPONENTS:
+        df_cvd[t] = df_cvd[t].map({1:1, 2:0})
+
+    X = df_cvd[feature_list]
+    y = df_cvd[CVD_COMPONENTS].astype(int)
+
+    return feature_list, train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
 
+def _prepare_cvd(df, predefined_features):
+    """Rows, split and fitted preprocessing for the four CVD labels."""
+    feature_list, (X_train, X_test, y_train, y_test) = _split_cvd(df, predefined_features)
+    preproc, categorical_cols, numeric_cols = _fit_preproc(X_train)
     return {
-        "preproc": str(preproc_path),
-        "model": str(model_path),
         "features": feature_list,
+        "preproc": preproc,
         "categorical": categorical_cols,
-        "numeric": numeric_cols
+        "numeric": numeric_cols,
+        "X_train": preproc.transform(X_train),
+        "X_test": preproc.transform(X_test),
+        "y_train": y_train,
+        "y_test": y_test,
     }
 
-def _fit_and_save_cvd_multilabel(df, predefined_features, top_n=7, estimator=None):
+def holdout_split(df, disease_key):
     """
-    Simplified multilabel training: combine the 4 CVD targets, impute/encode features and
-    train OneVsRestClassifier with XGBoost as base estimator (default).
-    Saves a single preproc + multilabel model artifact.
+    Raw held-out rows (DataFrame of the model's features) and labels of disease_key:
+    the split the trainer never fits on and reports its metrics for.
     """
-    df_local = df.copy()
-    # mask rows where all cvd targets are in [1,2] per notebook
-    mask = df_local[CVD_COMPONENTS].apply(lambda col: col.isin([1,2])).all(axis=1)
-    df_cvd = df_local.loc[mask].copy()
-    for t in CVD_COMPONENTS:
-        df_cvd[t] = df_cvd[t].map({1:1, 2:0})
+    if disease_key == CVD_KEY:
+        _features, (_X_train, X_test, _y_train, y_test) = _split_cvd(df, CVD_FEATURES)
+    else:
+        target_col = TARGET_COLS[disease_key]
+        _features, (_X_train, X_test, _y_train, y_test) = _split_single(df, disease_key,
+                                                                        PREDEFINED_FEATURES[target_col], target_col)
+    return X_test, y_test
+
+def _holdout_metrics(estimator, data, multilabel=False):
+    """Metrics on the held-out split, recorded in the store manifest."""
+    proba = estimator.predict_proba(data["X_test"])
+    if not multilabel:
+        proba = proba[:, 1]
+    return {
+        "roc_auc": float(roc_auc_score(data["y_test"], proba)),
+        "log_loss": float(log_loss(data["y_test"], proba)) if not multilabel else None,
+        "n_train": int(len(data["y_train"])),
+        "n_test": int(len(data["y_test"])),
+    }
 
-    # drop high missing columns (except predefined_features)
-    miss_frac = df_cvd.isna().mean()
-    drop_cols = [c for c in df_cvd.columns if (miss_frac[c] > 0.5 and c not in predefined_features)]
-    if drop_cols:
-        df_cvd = df_cvd.drop(columns=drop_cols)
+def _risk_table(estimator, data, multilabel=False):
+    """Calibration, threshold table and risk bands of the served probability on the held-out split."""
+    proba = estimator.predict_proba(data["X_test"])
+    y = np.asarray(data["y_test"])
+    if multilabel:
+        # the predictor serves the highest component probability; it is right when any component is positive
+        proba, y = proba.max(axis=1), y.max(axis=1)
+    else:
+        proba = proba[:, 1]
+    return fit_risk_table(proba, y)
 
-    # select features: we'll use predefined_features ∩ columns
-    feature_list = [f for f in predefined_features if f in df_cvd.columns]
-    if not feature_list:
-        raise RuntimeError("No predefined CVD features found in dataframe.")
+def _save_artifacts(out_dir, disease_key, preproc, estimator):
+    preproc_path, model_path = store.artifact_paths(out_dir, disease_key)
 
-    X = df_cvd[feature_list]
-    y = df_cvd[CVD_COMPONENTS].astype(int)
+    joblib.dump(preproc, preproc_path)
+    joblib.dump(estimator, model_path)
+    return preproc_path, model_path
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+def _fit_and_save_single(df, out_dir, disease_key, feature_list, target_col, estimator=None, n_jobs=None):
+    """
+    Fit preprocessing & model for a single binary label and save artifacts into out_dir.
+    Uses the tuned params from tuning/<Disease>.params.json when present.
+    """
+    data = _prepare_single(df, disease_key, feature_list, target_col)
 
-    categorical_cols = [c for c in X_train.columns if X_train[c].dtype == "object" or X_train[c].nunique() <= 10]
-    numeric_cols = [c for c in X_train.columns if c not in categorical_cols]
+    # choose estimator (XGBoost by default)
+    if estimator is None:
+        estimator = _xgb_classifier(n_jobs, load_tuned_params(disease_key))
 
-    transformers = []
-    if numeric_cols:
-        transformers.append(("num", SimpleImputer(strategy="median"), numeric_cols))
-    if categorical_cols:
-        transformers.append(("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), categorical_cols))
+    estimator.fit(data["X_train"], data["y_train"])
+    _reset_n_jobs(estimator)
 
-    preproc = ColumnTransformer(transformers=transformers, remainder="drop")
-    preproc.fit(X_train)
+    # Save artifacts
+    preproc_path, model_path = _save_artifacts(out_dir, disease_key, data["preproc"], estimator)
+
+    return {
+        "preproc": str(preproc_path),
+        "model": str(model_path),
+        "features": data["features"],
+        "categorical": data["categorical"],
+        "numeric": data["numeric"],
+        "metrics": _holdout_metrics(estimator, data),
+        "risk": _risk_table(estimator, data),
+    }
 
-    X_train_t = preproc.transform(X_train)
+def _fit_and_save_cvd_multilabel(df, out_dir, predefined_features, top_n=7, estimator=None, n_jobs=None):
+    """
+    Simplified multilabel training: combine the 4 CVD targets, impute/encode features and
+    train OneVsRestClassifier with XGBoost as base estimator (default).
+    The per-component fits run in parallel threads, n_jobs threads in total.
+    Saves a single preproc + multilabel model artifact.
+    """
+    data = _prepare_cvd(df, predefined_features)
 
+    n_jobs = n_jobs or os.cpu_count() or 1
     if estimator is None:
-        xgb_params = {"eval_metric": "logloss", "random_state": 42}
-        if "use_label_encoder" in xgb.XGBClassifier().get_params():
-            xgb_params["use_label_encoder"] = False
-        base = xgb.XGBClassifier(**xgb_params)
-        estimator = OneVsRestClassifier(base)
+        # one thread-pool slot per component; XGBoost releases the GIL while it trains,
+        # so threads parallelize without copying X to subprocesses
+        components = min(len(CVD_COMPONENTS), n_jobs)
+        base = _xgb_classifier(max(1, n_jobs // components), load_tuned_params(CVD_KEY))
+        estimator = OneVsRestClassifier(base, n_jobs=components)
 
-    estimator.fit(X_train_t, y_train)
+    with joblib.parallel_backend("threading"):
+        estimator.fit(data["X_train"], data["y_train"])
+    _reset_n_jobs(estimator)
 
-    base_name = MODEL_DIR / CVD_KEY.replace(" ", "_")
-    preproc_path = base_name.with_suffix(".preproc.joblib")
-    model_path = base_name.with_suffix(".model.joblib")
-    joblib.dump(preproc, preproc_path)
-    joblib.dump(estimator, model_path)
+    preproc_path, model_path = _save_artifacts(out_dir, CVD_KEY, data["preproc"], estimator)
 
     return {
         "preproc": str(preproc_path),
         "model": str(model_path),
-        "features": feature_list,
-        "categorical": categorical_cols,
-        "numeric": numeric_cols,
+        "features": data["features"],
+        "categorical": data["categorical"],
+        "numeric": data["numeric"],
+        "metrics": _holdout_metrics(estimator, data, multilabel=True),
+        "risk": _risk_table(estimator, data, multilabel=True),
         "cvd_components": CVD_COMPONENTS
     }
 
-def train_and_save_all_models(csv_path="merged_nhanes_readable.csv"):
+def _share_dataset(df):
+    global _SHARED_DF
+    _SHARED_DF = df
+
+def _train_job(kind, args, n_threads, out_dir):
+    """Run one fit in a worker process against the shared dataset, with at most n_threads threads."""
+    with threadpool_limits(limits=n_threads):
+        if kind == CVD_KEY:
+            return _fit_and_save_cvd_multilabel(_SHARED_DF, out_dir, *args, n_jobs=n_threads)
+        return _fit_and_save_single(_SHARED_DF, out_dir, *args, n_jobs=n_threads)
+
+def _run_jobs(df, jobs, parallel, workers, out_dir):
+    """
+    jobs: [(kind, args)], saved into out_dir. Returns the info dicts in job order.
+    In parallel mode the fits run in a process pool and the cores are split between them,
+    so XGBoost/OpenMP threads of concurrent jobs never add up to more than the core count.
+    The DataFrame reaches the workers once via the pool initializer: under fork it is
+    inherited copy-on-write rather than pickled.
+    """
+    cores = os.cpu_count() or 1
+    if not parallel:
+        _share_dataset(df)
+        try:
+            return [_train_job(kind, args, cores, out_dir) for kind, args in jobs]
+        finally:
+            _share_dataset(None)
+
+    workers = min(workers or cores, len(jobs))
+    n_threads = max(1, cores // workers)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_share_dataset, initargs=(df,)) as pool:
+        futures = [pool.submit(_train_job, kind, args, n_threads, out_dir) for kind, args in jobs]
+        return [f.result() for f in futures]
+
+def training_columns():
+    """Every CSV column the four models read: features and targets."""
+    cols = [f for feats in PREDEFINED_FEATURES.values() for f in feats] + CVD_FEATURES
+    cols += list(TARGET_COLS.values()) + CVD_COMPONENTS
+    return list(dict.fromkeys(cols))
+
+def train_and_save_all_models(csv_path="merged_nhanes_readable.csv", parallel=False, workers=None, use_cache=True,
+                              promote=True):
     """
     Main entrypoint:
-     - loads CSV (Windows-1252 encoding as in your notebook)
+     - loads CSV (Windows-1252 encoding as in your notebook), by default through the columnar cache
      - trains the three single-label models with the predefined features from your notebook
      - trains the multilabel CVD model with predefined features
-     - saves artifacts to ml_nhanes_module/model_files/
-     - writes schema.json describing expected features for runtime
+     - publishes the artifacts, schema.json and a manifest (held-out metrics, params, calibration and
+       risk bands from calibration.py) as a new
+       version of the artifact store (see store.py) and, with promote=True, makes it the served one
+    parallel=True runs the four fits concurrently in up to `workers` processes (default: core count).
+    use_cache=True reads only the needed columns from the cache (see dataset.py), ingesting the CSV on first use.
+    Returns the schema dict ({disease_key: features, "cvd_components": [...]}), as before the store existed.
+    The published version id is printed; once promoted it is store.current_version() / active_version().
     """
-    df = pd.read_csv(csv_path, encoding="Windows-1252")
+    if use_cache:
+        df = load_columns(csv_path, training_columns())
+    else:
+        df = pd.read_csv(csv_path, encoding="Windows-1252")
     schema = {}
+    models = {}
 
-    # predefined feature lists from your notebook (only keep those present in df)
-    predefined_feature_map = {
-        "Doctor told you have diabetes": ["Fasting Glucose (mg/dL)", "Glycohemoglobin (%)", "Triglyceride (mg/dL)",
-                                          "Direct HDL-Cholesterol (mg/dL)", "Waist Circumference (cm)",
-                                          "Body Mass Index (kg/m2)", "Systolic: Blood pressure (2nd reading) (mm Hg)"],
-        "Ever told you had any liver condition": ["Alanine aminotransferase (ALT) (U/L)", "Aspartate aminotransferase (AST) (U/L)",
-                                                  "Alkaline phosphatase (U/L)", "Gamma-glutamyl transferase (GGT) (U/L)",
-                                                  "Total bilirubin (mg/dL)", "Body Mass Index (kg/m2)", "Waist Circumference (cm)",
-                                                  "Triglyceride (mg/dL)"],
-        "Ever told you had weak/failing kidneys": ["Creatinine, serum (mg/dL)", "Blood urea nitrogen (mg/dL)",
-                                                   "Albumin, urine (µg/mL)", "Creatinine, urine (mg/dL)"]
-    }
-
-    # Train single-label models
+    # Single-label models
+    jobs = []
     for target_col, disease_key in [(TARGET_COLS[DIABETES_KEY], DIABETES_KEY),
                                     (TARGET_COLS[LIVER_KEY], LIVER_KEY),
                                     (TARGET_COLS[KIDNEY_KEY], KIDNEY_KEY)]:
         # filter features present in df
-        predefined = [f for f in predefined_feature_map[target_col] if f in df.columns]
+        predefined = [f for f in PREDEFINED_FEATURES[target_col] if f in df.columns]
         print(f"Training {disease_key} using features: {predefined}")
-        info = _fit_and_save_single(df, disease_key, predefined, target_col)
-        schema[disease_key] = info["features"]
-
-    # Train multilabel CVD
-    cvd_predefined = ["Age at Screening (Adjudicated - Recode)", "Gender",
-                      "Systolic: Blood pressure (2nd reading) (mm Hg)", "Diastolic: Blood pressure (2nd reading) (mm Hg)",
-                      "Total Cholesterol (mg/dL)", "Direct HDL-Cholesterol (mg/dL)",
-                      "LDL-cholesterol (mg/dL)", "Body Mass Index (kg/m2)"]
-    print(f"Training multi-label CVD using features: {cvd_predefined}")
-    info = _fit_and_save_cvd_multilabel(df, cvd_predefined)
-    schema[CVD_KEY] = info["features"]
-    # Also store the component mapping
-    schema["cvd_components"] = info.get("cvd_components", [])
-
-    _save_schema(schema)
-    print("Training complete. Artifacts and schema saved to:", MODEL_DIR)
+        jobs.append((disease_key, (disease_key, predefined, target_col)))
+
+    # Multilabel CVD
+    print(f"Training multi-label CVD using features: {CVD_FEATURES}")
+    jobs.append((CVD_KEY, (CVD_FEATURES,)))
+
+    # everything is written to a staging directory first; serving never sees a partial set
+    staging = store.staging_dir()
+    try:
+        for (disease_key, _args), info in zip(jobs, _run_jobs(df, jobs, parallel, workers, staging)):
+            schema[disease_key] = info["features"]
+            models[disease_key] = {"metrics": info["metrics"], "params": load_tuned_params(disease_key),
+                                   "risk": info["risk"]}
+        # Also store the component mapping
+        schema["cvd_components"] = info.get("cvd_components", [])
+
+        _save_schema(staging, schema)
+
+        # NumPy-only copies for serving (see compiled.py); the predictor falls back to
+        # the joblib pair for anything the compiled engine cannot reproduce
+        for disease_key in [DIABETES_KEY, LIVER_KEY, KIDNEY_KEY, CVD_KEY]:
+            preproc_path, model_path = store.artifact_paths(staging, disease_key)
+            try:
+                export_compiled(preproc_path, model_path, store.compiled_path(staging, disease_key),
+                                schema[disease_key], multilabel=(disease_key == CVD_KEY))
+            except (NotImplementedError, ValueError) as e:
+                print(f"Skipping compiled export for {disease_key}: {e}")
+
+        dataset = {"csv": os.path.basename(str(csv_path))}
+        if use_cache:
+            dataset["sha256"] = source_hash(csv_path)
+        version = store.publish(staging, source="train", parent=store.current_version(), models=models,
+                                extra={"dataset": dataset}, promote=promote)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    print(f"Training complete. Artifacts published as version {version}"
+          f"{' (promoted)' if promote else ''} in {store.STORE_DIR}")
     return schema
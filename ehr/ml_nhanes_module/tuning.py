@@ -0,0 +1,171 @@
+# tuning.py
+"""
+Hyperparameter search for the NHANES models.
+
+tune_disease() runs a successive-halving random search (HalvingRandomSearchCV)
+over XGBoost parameters, with the number of trees as the halving resource: every
+candidate starts with a few trees, and only the best third of each round gets
+three times as many. Trials run in parallel processes (one XGBoost thread each,
+so `n_jobs` trials never oversubscribe the cores).
+
+The winning configuration is refitted with early stopping on a validation fold
+split off the training rows, which fixes the final tree count. The held-out
+split the trainer creates is never seen by the search or by early stopping, so
+the report's held-out metrics (and the metrics and risk table the trainer
+records with these params) stay out-of-sample. The report (best params,
+held-out metrics, and fit time / scoring latency of every candidate) is written to model_files/tuning/<Disease>.params.json;
+trainer.py uses those params on the next training run and records them in the
+manifest of the version it publishes.
+"""
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.metrics import log_loss, roc_auc_score
+from sklearn.model_selection import HalvingRandomSearchCV, KFold, StratifiedKFold, train_test_split
+from sklearn.multiclass import OneVsRestClassifier
+from scipy.stats import loguniform, randint, uniform
+
+from . import trainer
+
+# search space; n_estimators is the halving resource and is not sampled
+PARAM_DISTRIBUTIONS = {
+    "max_depth": randint(2, 8),
+    "learning_rate": loguniform(0.01, 0.3),
+    "subsample": uniform(0.6, 0.4),
+    "colsample_bytree": uniform(0.6, 0.4),
+    "min_child_weight": loguniform(0.5, 20),
+    "reg_lambda": loguniform(0.1, 10),
+}
+
+EARLY_STOPPING_ROUNDS = 30
+# share of the training rows early stopping watches
+VALIDATION_SIZE = 0.2
+
+
+def _latency_ms(model, X, repeat=200):
+    """Median single-row predict_proba latency in milliseconds."""
+    row = X[:1]
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        model.predict_proba(row)
+        samples.append(time.perf_counter() - t)
+    return 1000.0 * float(np.median(samples))
+
+
+def _candidates(search, rows_per_fold):
+    res = search.cv_results_
+    out = []
+    for i, params in enumerate(res["params"]):
+        out.append({
+            "params": {k.split("__")[-1]: (v.item() if hasattr(v, "item") else v) for k, v in params.items()},
+            "iteration": int(res["iter"][i]),
+            "n_estimators": int(res["n_resources"][i]),
+            "mean_test_score": float(res["mean_test_score"][i]),
+            "std_test_score": float(res["std_test_score"][i]),
+            "mean_fit_time_s": float(res["mean_fit_time"][i]),
+            "mean_score_time_s": float(res["mean_score_time"][i]),
+            "score_time_per_1k_rows_ms": 1e6 * float(res["mean_score_time"][i]) / rows_per_fold,
+        })
+    return out
+
+
+def tune_disease(df, disease_key, n_candidates=60, max_trees=600, min_trees=20, factor=3, cv=3,
+                 n_jobs=-1, scoring="roc_auc", random_state=42, save=True):
+    """
+    Search hyperparameters for disease_key on df (the training DataFrame).
+    Returns the report dict; with save=True it is also written to tuning/<Disease>.params.json.
+    """
+    multilabel = disease_key == trainer.CVD_KEY
+    if multilabel:
+        data = trainer._prepare_cvd(df, trainer.CVD_FEATURES)
+        base = OneVsRestClassifier(trainer._xgb_classifier(n_jobs=1))
+        prefix, folds = "estimator__", KFold(cv, shuffle=True, random_state=random_state)
+    else:
+        target_col = trainer.TARGET_COLS[disease_key]
+        data = trainer._prepare_single(df, disease_key, trainer.PREDEFINED_FEATURES[target_col], target_col)
+        base = trainer._xgb_classifier(n_jobs=1)
+        prefix, folds = "", StratifiedKFold(cv, shuffle=True, random_state=random_state)
+
+    search = HalvingRandomSearchCV(
+        base,
+        {prefix + k: v for k, v in PARAM_DISTRIBUTIONS.items()},
+        n_candidates=n_candidates,
+        resource=prefix + "n_estimators",
+        min_resources=min_trees,
+        max_resources=max_trees,
+        factor=factor,
+        cv=folds,
+        scoring=scoring,
+        n_jobs=n_jobs,
+        random_state=random_state,
+        refit=False,
+    )
+    started = time.perf_counter()
+    search.fit(data["X_train"], data["y_train"])
+    search_time = time.perf_counter() - started
+
+    best = {k.split("__")[-1]: (v.item() if hasattr(v, "item") else v) for k, v in search.best_params_.items()}
+    best_trees = int(search.cv_results_["n_resources"][search.best_index_])
+
+    # refit the winner; single-label models stop early on a validation fold of the training rows
+    X_train, X_test = data["X_train"], data["X_test"]
+    y_train, y_test = data["y_train"], data["y_test"]
+    t = time.perf_counter()
+    if multilabel:
+        # OneVsRestClassifier cannot route an eval_set to each component: keep the searched tree count
+        model = OneVsRestClassifier(trainer._xgb_classifier(params=dict(best, n_estimators=best_trees)))
+        model.fit(X_train, y_train)
+        best["n_estimators"] = best_trees
+        best_iteration = None
+        validation_rows = 0
+    else:
+        X_fit, X_val, y_fit, y_val = train_test_split(X_train, y_train, test_size=VALIDATION_SIZE,
+                                                      random_state=random_state, stratify=y_train)
+        model = trainer._xgb_classifier(params=dict(best, n_estimators=max_trees,
+                                                    early_stopping_rounds=EARLY_STOPPING_ROUNDS))
+        model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+        validation_rows = len(y_val)
+        best_iteration = int(model.best_iteration)
+        # persist the tree count early stopping found, so a plain refit reproduces it
+        best["n_estimators"] = best_iteration + 1
+    fit_time = time.perf_counter() - t
+
+    proba = model.predict_proba(X_test)
+    if not multilabel:
+        proba = proba[:, 1]
+    report = {
+        "disease_key": disease_key,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "best_params": best,
+        "best_cv_score": float(search.best_score_),
+        "scoring": scoring,
+        "best_iteration": best_iteration,
+        "early_stopping_rows": validation_rows,
+        "holdout": {
+            "roc_auc": float(roc_auc_score(y_test, proba)),
+            "log_loss": float(log_loss(y_test, proba)) if not multilabel else None,
+            "n_test": int(len(y_test)),
+            "fit_time_s": fit_time,
+            "single_row_latency_ms": _latency_ms(model, X_test),
+        },
+        "search": {
+            "n_candidates": n_candidates,
+            "min_trees": min_trees,
+            "max_trees": max_trees,
+            "factor": factor,
+            "cv": cv,
+            "n_iterations": int(search.n_iterations_),
+            "time_s": search_time,
+        },
+        "candidates": _candidates(search, len(y_train) / cv),
+    }
+    if save:
+        path = trainer.tuned_params_path(disease_key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return report
@@ -0,0 +1,147 @@
+# validation.py
+"""
+Per-model input validation and coercion.
+
+An InputValidator is built once per model from its schema (feature order) and
+its fitted preprocessing (which columns are one-hot encoded), and turns raw
+input - a feature dict from a form or JSON body, a list of dicts, a DataFrame
+or a 2-D array - straight into the float64 matrix the compiled engine scores,
+columns in schema order:
+- None, "" and whitespace-only strings are missing (NaN), which the imputer fills
+- numbers and numeric strings become floats
+- a non-numeric value in a categorical column becomes NaN, i.e. is read as a
+  blank: both engines encode it as the NaN category when the fitted
+  OneHotEncoder has one (the training column had blanks), and as all zeros
+  (an unseen category) only when it has not; in a numeric column it is an error
+- inf is an error
+Whole columns are converted with one astype(); only columns that fail it are
+walked element by element, to collect every bad field in one
+FeatureValidationError instead of stopping at the first.
+"""
+import math
+
+import numpy as np
+
+_NUMBER_TYPES = (int, float, np.integer, np.floating)
+
+
+class FeatureValidationError(ValueError):
+    """
+    Invalid input values. errors maps each bad field to a message; for batches the
+    key is (row index, field).
+    """
+
+    def __init__(self, name, errors):
+        self.errors = errors
+        detail = "; ".join(f"{k}: {v}" for k, v in list(errors.items())[:10])
+        more = f" (+{len(errors) - 10} more)" if len(errors) > 10 else ""
+        super().__init__(f"Invalid features for {name}: {detail}{more}")
+
+
+class InputValidator:
+    def __init__(self, name, features, categorical):
+        self.name = name
+        self.features = list(features)
+        self.index = {f: j for j, f in enumerate(self.features)}
+        self.categorical = np.zeros(len(self.features), dtype=bool)
+        self.categorical[[self.index[f] for f in categorical if f in self.index]] = True
+        self._columns = {}
+
+    def _coerce_value(self, value, j, errors, key):
+        if value is None:
+            return np.nan
+        if isinstance(value, _NUMBER_TYPES):
+            x = float(value)
+        else:
+            s = str(value).strip()
+            if not s:
+                return np.nan
+            try:
+                x = float(s)
+            except ValueError:
+                if self.categorical[j]:
+                    return np.nan
+                errors[key] = f"expected a number, got {value!r}"
+                return np.nan
+        if math.isinf(x):
+            errors[key] = "must be a finite number"
+        return x
+
+    def coerce_row(self, raw, require_all=False):
+        """
+        1-D float64 array in schema order from a feature dict. Absent keys are missing
+        values, unless require_all=True (then they raise KeyError, like the batch APIs).
+        Non-numeric categorical values are missing values too (see the module docstring).
+        """
+        if require_all:
+            missing = [f for f in self.features if f not in raw]
+            if missing:
+                raise KeyError(f"Missing features for {self.name}: {missing}")
+        errors = {}
+        row = np.empty(len(self.features), dtype=np.float64)
+        for j, f in enumerate(self.features):
+            row[j] = self._coerce_value(raw.get(f), j, errors, f)
+        if errors:
+            raise FeatureValidationError(self.name, errors)
+        return row
+
+    def _coerce_column(self, col, j, errors):
+        try:
+            out = col.astype(np.float64)
+        except (TypeError, ValueError):
+            # blanks, non-numeric strings or odd objects somewhere in the column
+            f = self.features[j]
+            return np.array([self._coerce_value(v, j, errors, (i, f)) for i, v in enumerate(col)], dtype=np.float64)
+        bad = np.flatnonzero(np.isinf(out))
+        for i in bad:
+            errors[(int(i), self.features[j])] = "must be a finite number"
+        return out
+
+    def coerce_many(self, rows):
+        """
+        (n_rows, n_features) float64 matrix from a DataFrame, a list of feature dicts or a
+        2-D array with columns in schema order. Every feature must be present.
+        Numeric arrays pass through without a copy.
+        """
+        if hasattr(rows, "columns") and hasattr(rows, "reindex"):
+            missing = [f for f in self.features if f not in rows.columns]
+            if missing:
+                raise KeyError(f"Missing features for {self.name}: {missing}")
+            rows = rows[self.features].to_numpy()
+        elif isinstance(rows, (list, tuple)) and rows and isinstance(rows[0], dict):
+            missing = [f for f in self.features if any(f not in r for r in rows)]
+            if missing:
+                raise KeyError(f"Missing features for {self.name}: {missing}")
+            rows = np.array([[r[f] for f in self.features] for r in rows], dtype=object)
+
+        arr = np.asarray(rows)
+        if arr.size == 0:
+            return np.empty((0, len(self.features)), dtype=np.float64)
+        if arr.ndim != 2 or arr.shape[1] != len(self.features):
+            raise ValueError(f"Expected a 2-D array with {len(self.features)} columns for {self.name}, "
+                             f"got shape {arr.shape}")
+        errors = {}
+        if arr.dtype.kind in "fiub":
+            out = arr.astype(np.float64, copy=False)
+            if np.isinf(out).any():
+                for i, j in zip(*np.nonzero(np.isinf(out))):
+                    errors[(int(i), self.features[j])] = "must be a finite number"
+        else:
+            out = np.empty(arr.shape, dtype=np.float64)
+            for j in range(arr.shape[1]):
+                out[:, j] = self._coerce_column(arr[:, j], j, errors)
+        if errors:
+            raise FeatureValidationError(self.name, errors)
+        return out
+
+    def columns(self, features):
+        """Positions of `features` in this validator's order, to slice a model's columns out of a union row."""
+        key = tuple(features)
+        cols = self._columns.get(key)
+        if cols is None:
+            cols = self._columns[key] = np.array([self.index[f] for f in features], dtype=np.intp)
+        return cols
+
+    def as_features(self, row):
+        """JSON-safe feature dict of a coerced row (missing values as None), for storing with an Observation."""
+        return {f: (None if math.isnan(v) else float(v)) for f, v in zip(self.features, row.tolist())}
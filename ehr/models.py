@@ -5,6 +5,9 @@ from django.db import models
 import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 
 from .utils import deidentify_patient
 
@@ -37,8 +40,44 @@ class Practitioner(models.Model):
         return self.name or (self.user.get_full_name() if self.user else "Practitioner")
 
 
+_DEFERRED = object()
+
+
+class ObservationQuerySet(models.QuerySet):
+    """
+    Keeps outcome_recorded_at (the retraining watermark, see retrain_incremental) moving
+    with every write of confirmed_outcome, including the ones that bypass save().
+    """
+
+    def update(self, **kwargs):
+        if "confirmed_outcome" in kwargs and "outcome_recorded_at" not in kwargs:
+            kwargs["outcome_recorded_at"] = timezone.now() if kwargs["confirmed_outcome"] is not None else None
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        fields = list(fields)
+        if "confirmed_outcome" in fields and "outcome_recorded_at" not in fields:
+            objs = list(objs)
+            now = timezone.now()
+            for obj in objs:
+                obj.outcome_recorded_at = now if obj.confirmed_outcome is not None else None
+            fields.append("outcome_recorded_at")
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+
 # ehr/models.py — replace the existing Observation model with this (or add fields to it)
 class Observation(models.Model):
+    SCORING_PENDING = "pending"
+    SCORING_RUNNING = "running"
+    SCORING_DONE = "done"
+    SCORING_FAILED = "failed"
+    SCORING_STATUS_CHOICES = [
+        (SCORING_PENDING, "Pending"),
+        (SCORING_RUNNING, "Running"),
+        (SCORING_DONE, "Done"),
+        (SCORING_FAILED, "Failed"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     patient = models.ForeignKey(Patient, related_name="observations", on_delete=models.CASCADE, null=True, blank=True)
     deidentified_patient_hash = models.CharField(max_length=128, null=True, blank=True)
@@ -55,14 +94,43 @@ class Observation(models.Model):
     features = models.JSONField(null=True, blank=True)  # stores the submitted features
     deidentified_patient_hash = models.CharField(max_length=128, null=True, blank=True)
     alert = models.BooleanField(default=False)
+    # "low" / "elevated" / "high" from the model version's calibration; empty when it has none
+    risk_band = models.CharField(max_length=16, null=True, blank=True)
+    # ML self-checks scored in the background start as "pending" (see ehr/scoring.py)
+    scoring_status = models.CharField(max_length=16, choices=SCORING_STATUS_CHOICES, default=SCORING_DONE)
+    # when a worker moved the row to "running"; requeue_stale only resets old claims
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # clinician-confirmed diagnosis for disease_key; labelled rows feed incremental retraining
+    confirmed_outcome = models.BooleanField(null=True, blank=True)
+    outcome_recorded_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # store version of the model that produced risk_score; explanations must come from the same one
+    model_version = models.CharField(max_length=64, null=True, blank=True, editable=False)
+    # per-feature contributions to risk_score, computed on first view (see ehr/explanations.py)
+    explanation = models.JSONField(null=True, blank=True, editable=False)
+
+    objects = ObservationQuerySet.as_manager()
 
     class Meta:
         ordering = ["-effective_date"]
+        indexes = [
+            # patient timelines: dashboard, records list, doctor's patient detail
+            models.Index(fields=["patient", "-effective_date"], name="obs_patient_date_idx"),
+            # research API: newest first, optionally filtered by code / disease / pseudonym and a date range;
+            # id breaks ties for the keyset cursor (see ehr/pagination.py)
+            models.Index(fields=["-effective_date", "-id"], name="obs_date_id_idx"),
+            models.Index(fields=["code", "-effective_date", "-id"], name="obs_code_date_id_idx"),
+            models.Index(fields=["disease_key", "-effective_date"], name="obs_disease_date_idx"),
+            models.Index(fields=["deidentified_patient_hash", "-effective_date"], name="obs_deid_date_idx"),
+            # partial indexes: alerts and the scoring queue are small slices of the table
+            models.Index(fields=["-effective_date"], condition=models.Q(alert=True), name="obs_alert_date_idx"),
+            models.Index(fields=["effective_date"], condition=models.Q(scoring_status="pending"),
+                         name="obs_pending_idx"),
+        ]
 
     def __str__(self):
         return f"{self.code}={self.value}{(' '+self.unit) if self.unit else ''}"
     
-    def save(self, *args, **kwargs):
+    def set_deidentified_hash(self):
         # compute hash if patient set and hash empty or patient changed
         if self.patient:
             try:
@@ -70,5 +138,132 @@ class Observation(models.Model):
             except Exception:
                 # fail-safe: don't prevent save if deid fails
                 pass
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obs = super().from_db(db, field_names, values)
+        # the label as loaded, so save() can tell a new or corrected one
+        obs._loaded_outcome = obs.__dict__.get("confirmed_outcome", _DEFERRED)
+        return obs
+
+    def _outcome_changed(self, update_fields):
+        if update_fields is not None and "confirmed_outcome" not in update_fields:
+            return False
+        loaded = getattr(self, "_loaded_outcome", None)
+        if loaded is _DEFERRED:
+            # loaded without the label: changed if it has been read or assigned since
+            return "confirmed_outcome" in self.__dict__
+        return self.confirmed_outcome != loaded
+
+    def save(self, *args, **kwargs):
+        self.set_deidentified_hash()
+        # every new or corrected label moves the watermark; clearing one clears its time
+        if self._outcome_changed(kwargs.get("update_fields")):
+            self.outcome_recorded_at = timezone.now() if self.confirmed_outcome is not None else None
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = set(kwargs["update_fields"]) | {"outcome_recorded_at"}
         super().save(*args, **kwargs)
+        self._loaded_outcome = self.confirmed_outcome
+        # saves that only touch e.g. the label or the explanation cannot move the summary
+        update_fields = kwargs.get("update_fields")
+        if PatientRiskSummary.summarizes(self) and (
+                update_fields is None or PatientRiskSummary.SOURCE_FIELDS.intersection(update_fields)):
+            PatientRiskSummary.record([self])
+
+
+class PatientRiskSummary(models.Model):
+    """
+    Latest scored ML Observation per (subject, disease_key), kept up to date as
+    Observations are written so risk can be listed and sorted without scanning
+    them. The subject is the deidentified hash (self-checks and cohort rows may
+    have no Patient); patient is filled in when the Observation has one.
+    `manage.py rebuild_risk_summary` recomputes the table from Observations.
+    """
+    deidentified_patient_hash = models.CharField(max_length=128)
+    disease_key = models.CharField(max_length=128)
+    patient = models.ForeignKey(Patient, related_name="risk_summaries", on_delete=models.CASCADE, null=True, blank=True)
+    observation = models.ForeignKey(Observation, related_name="+", on_delete=models.CASCADE)
+    risk_score = models.FloatField()
+    alert = models.BooleanField(default=False)
+    risk_band = models.CharField(max_length=16, null=True, blank=True)
+    effective_date = models.DateTimeField()
+
+    UPDATE_FIELDS = ["patient", "observation", "risk_score", "alert", "risk_band", "effective_date"]
+    # Observation fields a summary row is built from
+    SOURCE_FIELDS = {"deidentified_patient_hash", "disease_key", "patient", "patient_id", "risk_score", "alert",
+                     "risk_band", "effective_date", "scoring_status"}
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["deidentified_patient_hash", "disease_key"], name="risk_summary_subject_uniq"),
+        ]
+        indexes = [
+            # triage lists: highest risk first, overall or for one disease
+            models.Index(fields=["-risk_score"], name="risk_summary_score_idx"),
+            models.Index(fields=["disease_key", "-risk_score"], name="risk_summary_disease_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.disease_key}={self.risk_score} ({self.deidentified_patient_hash[:12]})"
+
+    @staticmethod
+    def summarizes(obs):
+        """Whether obs is a scored ML Observation with a subject, i.e. can be a summary row."""
+        return bool(obs.disease_key and obs.deidentified_patient_hash and obs.risk_score is not None
+                    and obs.scoring_status == Observation.SCORING_DONE)
+
+    @classmethod
+    def from_observation(cls, obs):
+        return cls(deidentified_patient_hash=obs.deidentified_patient_hash, disease_key=obs.disease_key,
+                   patient_id=obs.patient_id, observation_id=obs.pk, risk_score=obs.risk_score,
+                   alert=obs.alert, risk_band=obs.risk_band, effective_date=obs.effective_date)
+
+    @classmethod
+    def record(cls, observations):
+        """
+        Fold saved Observations into the table: each (subject, disease) row moves to
+        the newest of its current Observation and the given ones, ordered by
+        (effective_date, id) like the research feed. Other Observations are ignored.
+        One read and one upsert per call, so bulk writers pass whole batches.
+        Returns the number of rows written.
+        """
+        latest = {}
+        for obs in observations:
+            if not cls.summarizes(obs):
+                continue
+            key = (obs.deidentified_patient_hash, obs.disease_key)
+            if key not in latest or (obs.effective_date, obs.pk) > (latest[key].effective_date, latest[key].pk):
+                latest[key] = obs
+        if not latest:
+            return 0
+
+        current = {
+            (h, d): (date, obs_id)
+            for h, d, date, obs_id in cls.objects.filter(
+                deidentified_patient_hash__in={h for h, _d in latest}, disease_key__in={d for _h, d in latest}
+            ).values_list("deidentified_patient_hash", "disease_key", "effective_date", "observation_id")
+        }
+        rows = [cls.from_observation(obs) for key, obs in latest.items()
+                if key not in current or (obs.effective_date, obs.pk) >= current[key]]
+        cls.objects.bulk_create(rows, update_conflicts=True, update_fields=cls.UPDATE_FIELDS,
+                                unique_fields=["deidentified_patient_hash", "disease_key"])
+        return len(rows)
+
+    @classmethod
+    def replace_deleted(cls, obs):
+        """
+        Called once obs is deleted. If it was its subject's summary row (removed with it by the
+        CASCADE), the newest remaining scored Observation of that subject and disease takes over.
+        Returns the number of rows written.
+        """
+        key = {"deidentified_patient_hash": obs.deidentified_patient_hash, "disease_key": obs.disease_key}
+        if not (obs.deidentified_patient_hash and obs.disease_key) or cls.objects.filter(**key).exists():
+            return 0
+        newest = (Observation.objects.filter(risk_score__isnull=False, scoring_status=Observation.SCORING_DONE, **key)
+                  .order_by("-effective_date", "-id").first())
+        return cls.record([newest]) if newest is not None else 0
+
 
+@receiver(post_delete, sender=Observation)
+def _replace_deleted_summary(sender, instance, **kwargs):
+    PatientRiskSummary.replace_deleted(instance)
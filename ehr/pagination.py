@@ -0,0 +1,120 @@
+# ehr/pagination.py
+"""
+Keyset ("seek") pagination for the research API.
+
+Rows are ordered by (effective_date, id), newest first, and a cursor holds the
+(effective_date, id) of the row a page ended at. The next page is one range
+read on the (effective_date, id) index, starting just past the cursor, so page
+10,000 costs the same as page 1; LimitOffsetPagination makes the database
+walk and discard every row before the offset. Rows inserted while a client
+pages (new self-checks land at the newest end) never shift or repeat the rows
+of later pages, and the view's filters (code, start/end, ...) apply to every
+page. Cursors are opaque: urlsafe base64 of a small JSON object.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        default = settings.REST_FRAMEWORK.get("PAGE_SIZE") or 100
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, default))
+        except (TypeError, ValueError):
+            return default
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obs, reverse):
+        # obs is a model instance, or a .values() row of the fast list path
+        if isinstance(obs, dict):
+            date, pk = obs["effective_date"], obs["id"]
+        else:
+            date, pk = obs.effective_date, obs.pk
+        payload = {"d": date.isoformat(), "i": str(pk)}
+        if reverse:
+            payload["r"] = 1
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("ascii"))
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode("ascii"))
+
+    def decode_cursor(self, request, pk_field):
+        """(effective_date, id, reverse) from the request's cursor, or None on the first page."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+            date = parse_datetime(payload["d"])
+            pk = pk_field.to_python(payload["i"])
+            reverse = bool(payload.get("r"))
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk, reverse
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model._meta.pk)
+        reverse = cursor is not None and cursor[2]
+        if cursor is not None:
+            date, pk, _reverse = cursor
+            # a range on the leading index column, minus the cursor's own timestamp up to (and including) its id
+            if reverse:
+                queryset = queryset.filter(effective_date__gte=date).exclude(effective_date=date, pk__lte=pk)
+            else:
+                queryset = queryset.filter(effective_date__lte=date).exclude(effective_date=date, pk__gte=pk)
+        ordering = ("effective_date", "id") if reverse else ("-effective_date", "-id")
+
+        rows = list(queryset.order_by(*ordering)[: self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+        # a cursor means the client came from the other side, so there are rows there
+        self.has_next = cursor is not None if reverse else more
+        self.has_previous = more if reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
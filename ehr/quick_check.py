@@ -1,12 +1,14 @@
 # quick_check_nhanes.py
 import pandas as pd
 from ml_nhanes_module import train_and_save_all_models  # only if you need to retrain
-from ml_nhanes_module import predict_risk, get_expected_features, list_models
+from ml_nhanes_module import predict_risk, get_expected_features, get_all_expected_features, list_models
+from ml_nhanes_module.dataset import load_columns
 import json, math
 
-df = pd.read_csv("ehr/merged_nhanes_readable.csv", encoding="Windows-1252")
-
 models = list_models()
+# only the model columns, from the columnar cache (see ml_nhanes_module/dataset.py)
+df = load_columns("ehr/merged_nhanes_readable.csv", get_all_expected_features(models))
+
 print("Models:", models)
 
 def make_sample_from_row(df, row_idx, features):
@@ -38,16 +40,15 @@ print("\nAll smoke tests passed.")
 
 # distribution_check.py
 import pandas as pd, numpy as np
-from ml_nhanes_module import list_models, get_expected_features, predict_risk
+from ml_nhanes_module import list_models, get_expected_features, get_all_expected_features, predict_risk_many
+from ml_nhanes_module.dataset import load_columns
 
-df = pd.read_csv("ehr/merged_nhanes_readable.csv", encoding="Windows-1252")
+df = load_columns("ehr/merged_nhanes_readable.csv", get_all_expected_features())
 for m in list_models():
     feats = get_expected_features(m)
-    probs = []
-    for idx in range(len(df)):
-        sample = {f: (float("nan") if pd.isna(df.loc[idx,f]) else df.loc[idx,f]) if f in df.columns else 0.0 for f in feats}
-        probs.append(predict_risk(m, sample))
-    probs = np.array(probs)
+    # score the whole file in one batch; absent columns are filled with 0.0 as before
+    X = df.reindex(columns=feats, fill_value=0.0)
+    probs = predict_risk_many(m, X)
     print(m, "count:", len(probs), "mean:", probs.mean(), "std:", probs.std(), "min:", probs.min(), "max:", probs.max())
 
 
@@ -0,0 +1,255 @@
+# ehr/scoring.py
+"""
+Risk scoring for ML self-check Observations.
+
+settings.ML_SCORING_MODE decides where predict_risk runs:
+  "sync"   (default) inline in the request, as before
+  "thread" in a small in-process thread pool; the request returns a pending Observation
+  "queue"  the pending Observation row is the job; `manage.py run_scoring_worker`
+           scores it. Needs nothing but the database.
+Pending Observations get risk_score/alert/value filled in when scoring completes.
+Scores are calibrated, banded and thresholded with the served model version's
+risk table when it has one (ml_nhanes_module/calibration.py).
+
+With settings.ML_MICROBATCH["enabled"], concurrent predictions in this process are
+coalesced into batched predict_risk_many calls (see ml_nhanes_module/batcher.py).
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from . import ml_nhanes_module as ml
+from .models import Observation
+
+logger = logging.getLogger("ehr.scoring")
+
+SYNC, THREAD, QUEUE = "sync", "thread", "queue"
+# a RUNNING claim older than this is taken to belong to a crashed worker
+STALE_AFTER = 600
+
+_executor = None
+_executor_lock = threading.Lock()
+_batcher = None
+_batcher_pid = None
+_predictor_configured = False
+
+
+def scoring_mode():
+    mode = getattr(settings, "ML_SCORING_MODE", SYNC)
+    if mode not in (SYNC, THREAD, QUEUE):
+        raise ValueError(f"Unknown ML_SCORING_MODE '{mode}'")
+    return mode
+
+
+def _settings_threshold(disease):
+    thresholds = getattr(settings, "ML_RISK_THRESHOLDS", {})
+    return float(thresholds.get(disease, 0.2))
+
+
+def risk_threshold(disease, root=None):
+    """
+    Alert threshold of disease: the calibrated one of the model version in root (default: the
+    served one; see ml_nhanes_module/calibration.py), or settings.ML_RISK_THRESHOLDS for versions without one.
+    """
+    table = ml.get_risk_table(disease, root=root)
+    return table.threshold if table is not None else _settings_threshold(disease)
+
+
+def observation_threshold(obs):
+    """
+    Alert threshold a scored Observation was judged against: that of its model_version, which
+    need not be the served one. None while it is not scored, or when that version was removed.
+    """
+    if obs.scoring_status != Observation.SCORING_DONE:
+        return None
+    if obs.model_version is None:
+        # scored before versions were recorded, when thresholds came from settings
+        return _settings_threshold(obs.disease_key)
+    root = ml.version_root(obs.model_version)
+    return risk_threshold(obs.disease_key, root) if root is not None else None
+
+
+def assess(disease, prob, root=None):
+    """
+    (probability, threshold, alert, band) of a probability served by the version in root (default:
+    the served one): calibrated when that version has a risk table.
+    """
+    table = ml.get_risk_table(disease, root=root)
+    if table is None:
+        threshold = _settings_threshold(disease)
+        return prob, threshold, prob >= threshold, None
+    calibrated, band, alert, threshold = table.assess(prob)
+    return calibrated, threshold, alert, band
+
+
+def assess_many(disease, probs, root=None):
+    """assess() for an array of probabilities: (probabilities, threshold, alerts, bands or None)."""
+    table = ml.get_risk_table(disease, root=root)
+    if table is None:
+        threshold = _settings_threshold(disease)
+        return probs, threshold, probs >= threshold, None
+    calibrated = table.calibrate(probs)
+    return calibrated, table.threshold, calibrated >= table.threshold, table.bands(calibrated)
+
+
+def get_batcher():
+    """The process's MicroBatcher, or None when micro-batching is disabled."""
+    global _batcher, _batcher_pid
+    conf = getattr(settings, "ML_MICROBATCH", {})
+    if not conf.get("enabled"):
+        return None
+    with _executor_lock:
+        # threads do not survive a fork: each gunicorn worker needs its own batcher
+        if _batcher is None or _batcher_pid != os.getpid():
+            _batcher = ml.MicroBatcher(max_batch=int(conf.get("max_batch", 32)),
+                                       max_wait_ms=float(conf.get("max_wait_ms", 5)))
+            _batcher_pid = os.getpid()
+        return _batcher
+
+
+def predictor_settings():
+    """(serving profile, configure_prediction_cache kwargs) from settings, e.g. for worker processes."""
+    conf = getattr(settings, "ML_PREDICTION_CACHE", {})
+    cache = {"maxsize": conf.get("maxsize", 1024), "ttl": conf.get("ttl", 3600)}
+    return getattr(settings, "ML_SERVING_PROFILE", "full"), cache
+
+
+def _configure_predictor():
+    global _predictor_configured
+    if not _predictor_configured:
+        profile, cache = predictor_settings()
+        ml.configure_prediction_cache(**cache)
+        ml.configure_serving_profile(profile)
+        _predictor_configured = True
+
+
+def predict(disease, features, root=None):
+    """
+    features: a feature dict, or a row already coerced by ml.get_validator(disease, root).
+    root: store version directory to score with (default: the served one).
+    """
+    _configure_predictor()
+    root = root or ml.active_root()
+    row = features
+    if isinstance(features, dict):
+        row = ml.get_validator(disease, root).coerce_row(features, require_all=True)
+    batcher = get_batcher()
+    if batcher is None:
+        return float(ml.predict_row(disease, row, root))
+    # batches skip the prediction cache, so repeated inputs are looked up before queueing
+    key, prob = ml.cached_risk(disease, row, root)
+    if prob is None:
+        prob = batcher.predict(disease, row, root=root)
+        ml.cache_risk(key, prob)
+    return float(prob)
+
+
+def score_features(disease, features, root=None):
+    """
+    Return (probability, threshold, alert, band) for one feature dict or coerced row.
+    Pass the root resolved by the caller (ml.active_root()) when the score is tagged with its version.
+    """
+    return assess(disease, predict(disease, features, root), root)
+
+
+def score_all(features, diseases=None, root=None):
+    """
+    Score one feature dict (holding the union of the models' features) against every
+    model of the version in root (default: the served one). Returns {disease: (probability, threshold, alert, band)}.
+    """
+    _configure_predictor()
+    probs = ml.predict_risk_all(features, diseases, root=root)
+    return {disease: assess(disease, prob, root) for disease, prob in probs.items()}
+
+
+def apply_score(obs, prob, alert, band=None, model_version=None):
+    obs.model_version = model_version
+    obs.value = str(round(prob, 6))
+    obs.risk_score = prob
+    obs.alert = alert
+    obs.risk_band = band
+    obs.scoring_status = Observation.SCORING_DONE
+
+
+def score_observation(obs_id):
+    """
+    Score one pending Observation. The row is claimed with a conditional UPDATE
+    so two workers never score it twice, on any database backend.
+    Returns True if this call scored it.
+    """
+    claimed = Observation.objects.filter(pk=obs_id, scoring_status=Observation.SCORING_PENDING).update(
+        scoring_status=Observation.SCORING_RUNNING, claimed_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    obs = Observation.objects.get(pk=obs_id)
+    # the score and the version it is tagged with come from the same root, even if a promote lands meanwhile
+    root = ml.active_root()
+    try:
+        prob, _threshold, alert, band = score_features(obs.disease_key, obs.features or {}, root)
+    except Exception as e:
+        logger.warning("scoring failed for observation %s: %s", obs_id, e)
+        obs.scoring_status = Observation.SCORING_FAILED
+        obs.value = "error"
+        obs.remarks = f"{obs.remarks or ''}\nScoring error: {e}".strip()
+        obs.save(update_fields=["scoring_status", "value", "remarks"])
+        return True
+
+    apply_score(obs, prob, alert, band, root.name if root is not None else None)
+    obs.save(update_fields=["value", "risk_score", "alert", "risk_band", "scoring_status", "model_version"])
+    return True
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(getattr(settings, "ML_SCORING_THREADS", 2))
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-scoring")
+        return _executor
+
+
+def _score_in_thread(obs_id):
+    try:
+        score_observation(obs_id)
+    except Exception:
+        logger.exception("background scoring crashed for observation %s", obs_id)
+    finally:
+        # threads outside the request cycle must release their own connection
+        connection.close()
+
+
+def enqueue(obs):
+    """Schedule scoring of a pending Observation according to ML_SCORING_MODE."""
+    if scoring_mode() == THREAD:
+        # only start once the row is visible to the pool's own connection
+        transaction.on_commit(lambda: _get_executor().submit(_score_in_thread, obs.pk))
+    # QUEUE: nothing to do, run_scoring_worker polls for pending rows
+
+
+def process_pending(batch_size=50):
+    """Score up to batch_size pending Observations, oldest first. Returns how many were scored."""
+    ids = list(
+        Observation.objects.filter(scoring_status=Observation.SCORING_PENDING)
+        .order_by("effective_date")
+        .values_list("pk", flat=True)[:batch_size]
+    )
+    return sum(1 for obs_id in ids if score_observation(obs_id))
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """
+    Put rows left RUNNING by a crashed worker back in the queue. Only claims older than
+    older_than seconds are reset, so rows live workers are scoring right now stay theirs.
+    """
+    cutoff = timezone.now() - timedelta(seconds=older_than)
+    return (Observation.objects.filter(scoring_status=Observation.SCORING_RUNNING)
+            .filter(models.Q(claimed_at__lt=cutoff) | models.Q(claimed_at__isnull=True))
+            .update(scoring_status=Observation.SCORING_PENDING, claimed_at=None))
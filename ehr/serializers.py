@@ -1,6 +1,8 @@
 # ehr/serializers.py
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Patient, Practitioner, Observation
+from .models import Patient, Practitioner, Observation, PatientRiskSummary
 
 class PatientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,5 +34,66 @@ class DeidentifiedObservationSerializer(serializers.ModelSerializer):
             "risk_score",
             "features",
             "alert",
+            "risk_band",
         ]
         read_only_fields = fields
+
+
+class DeidentifiedRiskSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PatientRiskSummary
+        fields = [
+            "deidentified_patient_hash",
+            "disease_key",
+            "risk_score",
+            "alert",
+            "risk_band",
+            "effective_date",
+        ]
+        read_only_fields = fields
+
+
+def _iso_datetime(value):
+    # what serializers.DateTimeField renders with the default ISO_8601 format
+    if timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+_CONVERTERS = {
+    models.UUIDField: str,
+    models.DateTimeField: _iso_datetime,
+}
+
+
+def compile_row_encoder(model, fields):
+    """
+    Read-only fast path for a fixed projection: returns encode(rows), turning the dicts of
+    model.objects.values(*fields) into the same dicts a ModelSerializer with these fields
+    would produce, without building model instances or running serializer fields per value.
+    Only plain model fields are supported (the converters are picked once, here).
+    """
+    converters = []
+    for name in fields:
+        field = model._meta.get_field(name)
+        convert = next((c for cls, c in _CONVERTERS.items() if isinstance(field, cls)), None)
+        if convert is not None:
+            converters.append((name, convert))
+
+    def encode(rows):
+        out = []
+        for row in rows:
+            # a copy: the paginator still reads the raw date and id of the page's rows for its cursors
+            row = dict(row)
+            for name, convert in converters:
+                value = row[name]
+                if value is not None:
+                    row[name] = convert(value)
+            out.append(row)
+        return out
+
+    return encode
+
+
+encode_deidentified_rows = compile_row_encoder(Observation, DeidentifiedObservationSerializer.Meta.fields)
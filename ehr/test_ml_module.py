@@ -10,9 +10,10 @@ print("Schema saved:", json.dumps(schema, indent=2))
 # 2) Quick runtime check: list saved models and predict using mean values from CSV
 print("Available models:", list_models())
 
-# load CSV to build a sample input (mean values)
-import pandas as pd
-df = pd.read_csv("ehr/merged_nhanes_readable.csv", encoding="Windows-1252")
+# load the model columns to build a sample input (mean values)
+from ml_nhanes_module import get_all_expected_features
+from ml_nhanes_module.dataset import load_columns
+df = load_columns("ehr/merged_nhanes_readable.csv", get_all_expected_features())
 
 for m in list_models():
     feats = get_expected_features(m)
@@ -29,9 +30,6 @@ for m in list_models():
 
 
 from ml_nhanes_module import predict_risk, get_expected_features
-import pandas as pd
-
-df = pd.read_csv("ehr/merged_nhanes_readable.csv", encoding="Windows-1252")
 # 1) Predict for a real patient row (index 0)
 d = "Diabetes"
 feats = get_expected_features(d)
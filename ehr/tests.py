@@ -1,3 +1,1212 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+from django.db import connection
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from . import explanations, export, scoring
+from .ml_nhanes_module import cohort, incremental, predictor
+from .ml_nhanes_module import calibration
+from .ml_nhanes_module.batcher import MicroBatcher
+from .ml_nhanes_module.cache import PredictionCache
+from .ml_nhanes_module import store
+from .ml_nhanes_module.compiled import CompiledModel, export_compiled, parity_sample
+from .ml_nhanes_module.registry import ModelRegistry
+from .ml_nhanes_module.validation import FeatureValidationError
+from .models import Observation, Patient, PatientRiskSummary, Practitioner
+from .serializers import DeidentifiedObservationSerializer
 
 # Create your tests here.
+
+
+class CompiledModelParityTests(SimpleTestCase):
+    """The NumPy engine must score like the joblib preproc/model pairs it was exported from."""
+
+    def test_compiled_matches_sklearn(self):
+        for disease_key in predictor.list_models():
+            with self.subTest(disease=disease_key):
+                compiled = predictor._load_compiled_for(disease_key)
+                if compiled is None:
+                    self.skipTest(f"no up-to-date compiled export for {disease_key}")
+                expected = predictor.get_expected_features(disease_key)
+                X = parity_sample(compiled, n_rows=1000, seed=7)
+                reference = predictor._predict_sklearn(disease_key, expected, X)
+                np.testing.assert_allclose(predictor.predict_risk_many(disease_key, X), reference, rtol=0, atol=1e-6)
+
+    def test_single_row_matches_batch(self):
+        for disease_key in predictor.list_models():
+            with self.subTest(disease=disease_key):
+                expected = predictor.get_expected_features(disease_key)
+                row = {f: float("nan") for f in expected}
+                batch = predictor.predict_risk_many(disease_key, [row, row])
+                self.assertAlmostEqual(predictor.predict_risk(disease_key, row), float(batch[0]), places=12)
+
+
+class LazyImportTests(SimpleTestCase):
+    """Booting Django and importing the views leaves the ML stack unloaded until a prediction needs it."""
+
+    def test_views_do_not_import_ml_stack(self):
+        code = ("import sys, django; django.setup(); import ehr.urls, ehr.views; "
+                "print(','.join(m for m in ('pandas', 'sklearn', 'xgboost', 'ehr.ml_nhanes_module.predictor') "
+                "if m in sys.modules))")
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                             cwd=Path(__file__).resolve().parent.parent, env=os.environ)
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_gunicorn_preload_hooks(self):
+        conf = Path(__file__).resolve().parent.parent / "gunicorn.conf.py"
+        with mock.patch.dict(os.environ, {"ML_PRELOAD": "worker"}):
+            hooks = runpy.run_path(str(conf))
+        self.assertFalse(hooks["preload_app"])
+        server = mock.Mock()
+        with mock.patch("ehr.ml_nhanes_module.preload_models", return_value={"cached": ["schema"]}) as preload:
+            hooks["when_ready"](server)
+            preload.assert_not_called()
+            hooks["post_fork"](server, mock.Mock())
+            preload.assert_called_once()
+        # a broken artifact must not stop the worker from serving other pages
+        with mock.patch("ehr.ml_nhanes_module.preload_models", side_effect=FileNotFoundError("schema.json")):
+            hooks["post_fork"](server, mock.Mock())
+        server.log.warning.assert_called_once()
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """Entries are loaded once and reloaded only when a file they were loaded from changes."""
+
+    def test_reload_on_mtime_change(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = Path(tmp.name) / "model.bin"
+        path.write_text("v1")
+        registry = ModelRegistry()
+        load = path.read_text
+
+        self.assertEqual(registry.get("m", [path], load), "v1")
+        self.assertEqual(registry.get("m", [path], load), "v1")
+        stat = path.stat()
+        path.write_text("v2")   # same size, so only the mtime tells the versions apart
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertEqual(registry.get("m", [path], load), "v2")
+        stats = registry.stats()
+        self.assertEqual((stats["loads"], stats["hits"], stats["reloads"], stats["cached"]), (1, 1, 1, ["m"]))
+
+        registry.invalidate("m")
+        self.assertEqual(registry.get("m", [path], load), "v2")
+        self.assertEqual(registry.stats()["loads"], 2)
+
+
+class DatasetCacheTests(SimpleTestCase):
+    """The columnar cache reads like pandas and is rebuilt whenever the CSV's content changes."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.csv = self.dir / "nhanes.csv"
+        self.cache = self.dir / "cache"
+
+    def write(self, text):
+        self.csv.write_text(text, encoding="Windows-1252")
+
+    def test_load_columns_matches_pandas(self):
+        import pandas as pd
+        from .ml_nhanes_module import dataset
+
+        self.write('SEQN,Gender,"Albumin, urine (µg/mL)"\n1,Male,3.5\n2,,\n3,Female,7\n')
+        frame = dataset.load_columns(self.csv, ["Albumin, urine (µg/mL)", "Gender", "absent"], self.cache)
+        expected = pd.read_csv(self.csv, encoding="Windows-1252")[["Albumin, urine (µg/mL)", "Gender"]]
+        pd.testing.assert_frame_equal(frame, expected, check_dtype=False)
+
+    def test_changed_csv_gets_a_new_cache(self):
+        from .ml_nhanes_module import dataset
+
+        self.write("a,b\n1,2\n")
+        first = dataset.ingest(self.csv, self.cache)
+        self.assertEqual(dataset.ingest(self.csv, self.cache), first)
+        with mock.patch.object(dataset, "_file_sha256", side_effect=AssertionError("re-hashed")):
+            dataset.source_hash(self.csv, self.cache)   # unchanged size and mtime: remembered hash
+
+        self.write("a,b\n1,5\n")   # same size, new content
+        stat = self.csv.stat()
+        os.utime(self.csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        second = dataset.ingest(self.csv, self.cache)
+        self.assertNotEqual(second, first)
+        self.assertEqual(dataset.load_columns(self.csv, ["b"], self.cache)["b"].tolist(), [5])
+        meta = dataset.read_meta(self.csv, self.cache)
+        self.assertEqual(meta["source_sha256"], dataset.source_hash(self.csv, self.cache))
+
+
+class PredictRiskManyTests(SimpleTestCase):
+    """predict_risk_many gives the per-row predict_risk result for every input form."""
+
+    def test_matches_per_row(self):
+        import pandas as pd
+
+        for disease_key in predictor.list_models():
+            with self.subTest(disease_key), \
+                    mock.patch.object(predictor, "_CACHE", PredictionCache(maxsize=0, ttl=None)):
+                features = predictor.get_expected_features(disease_key)
+                X = parity_sample(predictor._load_compiled_for(disease_key), n_rows=40, seed=5)
+                dicts = [dict(zip(features, row)) for row in X]
+                per_row = [predictor.predict_risk(disease_key, d) for d in dicts]
+                for rows in (pd.DataFrame(X, columns=features), dicts, X, X.astype(object)):
+                    np.testing.assert_allclose(predictor.predict_risk_many(disease_key, rows), per_row, atol=1e-12)
+                self.assertEqual(predictor.predict_risk_many(disease_key, X[:0]).shape, (0,))
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def test_hit_miss_and_lru_eviction(self):
+        cache = PredictionCache(maxsize=2, ttl=None)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", 0.1)
+        cache.put("b", 0.2)
+        self.assertEqual(cache.get("a"), 0.1)   # "b" is now the least recently used
+        cache.put("c", 0.3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (0.1, 0.3))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"], stats["size"]), (3, 2, 1, 2))
+
+    def test_ttl_expiry(self):
+        cache = PredictionCache(maxsize=10, ttl=60)
+        with mock.patch("time.monotonic", return_value=1000.0):
+            cache.put("a", 0.5)
+        with mock.patch("time.monotonic", return_value=1059.0):
+            self.assertEqual(cache.get("a"), 0.5)
+        with mock.patch("time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_configure_keeps_omitted_settings(self):
+        cache = PredictionCache(maxsize=100, ttl=3600)
+        cache.configure(maxsize=10)
+        self.assertEqual((cache.maxsize, cache.ttl), (10, 3600))
+        cache.configure(ttl=None)
+        self.assertEqual((cache.maxsize, cache.ttl), (10, None))
+
+    def test_predict_row_keys(self):
+        disease_key = predictor.list_models()[0]
+        row = np.full(len(predictor.get_expected_features(disease_key)), np.nan)
+        with mock.patch.object(predictor, "_CACHE", PredictionCache(maxsize=10, ttl=None)) as cache:
+            first = predictor.predict_row(disease_key, row)
+            # missing values are all the same NaN, so a fresh all-missing row is the same key
+            self.assertEqual(predictor.predict_row(disease_key, row.copy()), first)
+            self.assertEqual(cache.stats()["hits"], 1)
+            # another artifact version (a retrain or promote) must not see the old entry
+            with mock.patch.object(predictor, "_artifact_version", return_value="other-version"):
+                predictor.predict_row(disease_key, row)
+            self.assertEqual(cache.stats()["misses"], 2)
+            self.assertEqual(cache.stats()["size"], 2)
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Concurrent requests are scored as one batch and each caller gets its own result or error."""
+
+    def batcher(self, score_many=None, **kwargs):
+        batcher = MicroBatcher(score_many=score_many, **kwargs)
+        self.addCleanup(batcher.close, 5)
+        return batcher
+
+    @staticmethod
+    def doubled(_disease, rows):
+        if any(r["x"] < 0 for r in rows):
+            raise ValueError("negative")
+        return [2.0 * r["x"] for r in rows]
+
+    def test_fan_out(self):
+        batcher = self.batcher(self.doubled, max_batch=4, max_wait_ms=500)
+        futures = [batcher.submit("d", {"x": x}) for x in range(4)]
+        self.assertEqual([f.result(5) for f in futures], [0.0, 2.0, 4.0, 6.0])
+        stats = batcher.stats()
+        self.assertEqual((stats["requests"], stats["batches"], stats["batch_sizes"]), (4, 1, {4: 1}))
+
+    def test_bad_request_fails_alone(self):
+        batcher = self.batcher(self.doubled, max_batch=3, max_wait_ms=500)
+        futures = [batcher.submit("d", {"x": x}) for x in (1, -1, 2)]
+        self.assertEqual((futures[0].result(5), futures[2].result(5)), (2.0, 4.0))
+        with self.assertRaisesMessage(ValueError, "negative"):
+            futures[1].result(5)
+        self.assertEqual(batcher.stats()["errors"], 1)
+
+    def test_scorer_failure_fails_batch_and_keeps_serving(self):
+        batcher = self.batcher(max_batch=1)
+        with mock.patch.object(batcher, "_scorer", side_effect=[ImportError("no predictor"), self.doubled]):
+            with self.assertRaisesMessage(ImportError, "no predictor"):
+                batcher.predict("d", {"x": 1}, timeout=5)
+            self.assertEqual(batcher.predict("d", {"x": 1}, timeout=5), 2.0)
+
+    def test_scoring_checks_the_cache_before_queueing(self):
+        disease_key = predictor.list_models()[0]
+        features = dict.fromkeys(predictor.get_expected_features(disease_key))
+        self.addCleanup(setattr, scoring, "_batcher", None)
+        with override_settings(ML_MICROBATCH={"enabled": True, "max_batch": 1}), \
+                mock.patch.object(predictor, "_CACHE", PredictionCache(maxsize=10, ttl=None)) as cache:
+            batcher = scoring.get_batcher()
+            self.addCleanup(batcher.close, 5)
+            first = scoring.predict(disease_key, features)
+            self.assertEqual(scoring.predict(disease_key, features), first)
+        self.assertEqual(batcher.stats()["requests"], 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertAlmostEqual(first, predictor.predict_risk(disease_key, features))
+
+
+class ExplanationTests(TestCase):
+    """Contributions add up to the scored margin, per raw feature, from the version that scored the row."""
+    disease = "CVD"   # multi-output and has a one-hot encoded feature
+
+    def setUp(self):
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+        self.X = parity_sample(predictor._load_compiled_for(self.disease), n_rows=50, seed=3)
+
+    def test_contributions_add_up_to_margin(self):
+        records = predictor.explain_many(self.disease, self.X)
+        margins = np.array([r["margin"] for r in records])
+        sums = np.array([r["base_value"] + sum(c["contribution"] for c in r["contributions"]) for r in records])
+        np.testing.assert_allclose(sums, margins, atol=1e-4)
+        # the explained margin is the one behind the served (uncalibrated) probability
+        np.testing.assert_allclose(1.0 / (1.0 + np.exp(-margins)), predictor.predict_risk_many(self.disease, self.X),
+                                   atol=1e-5)
+        np.testing.assert_allclose([r["raw_probability"] for r in records], 1.0 / (1.0 + np.exp(-margins)))
+
+    def test_one_hot_columns_summed_per_feature(self):
+        import xgboost as xgb
+
+        explainer = predictor.get_explainer(self.disease)
+        self.assertGreater(explainer.aggregate.shape[0], explainer.aggregate.shape[1])
+        contributions, base, picked = explainer.explain(self.X)
+        self.assertEqual(contributions.shape, (len(self.X), len(explainer.features)))
+        dmatrix = xgb.DMatrix(np.asarray(explainer.transform(self.X), dtype=np.float32))
+        per_column = np.stack([b.predict(dmatrix, pred_contribs=True) for b in explainer.boosters], axis=1)
+        per_column = per_column[np.arange(len(picked)), picked].astype(np.float64)
+        owner = explainer.aggregate.argmax(axis=1)
+        expected = np.zeros_like(contributions)
+        for col, feature in enumerate(owner):
+            expected[:, feature] += per_column[:, col]
+        np.testing.assert_allclose(contributions, expected, atol=1e-6)
+        np.testing.assert_allclose(base, per_column[:, -1], atol=1e-6)
+
+    def observation(self, model_version):
+        features = dict(zip(predictor.get_expected_features(self.disease),
+                            [None if np.isnan(v) else float(v) for v in self.X[0]]))
+        return Observation.objects.create(code=self.disease, value="0.1", disease_key=self.disease, risk_score=0.1,
+                                          features=features, model_version=model_version,
+                                          effective_date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+    def test_cached_on_observation(self):
+        obs = self.observation(predictor.active_version())
+        explanation = explanations.get_explanation(obs)
+        self.assertEqual(explanation["model_version"], predictor.active_version())
+        stored = Observation.objects.get(pk=obs.pk)
+        self.assertEqual(stored.explanation, explanation)
+        with mock.patch.object(predictor, "explain_many", side_effect=AssertionError("recomputed")):
+            self.assertEqual(explanations.get_explanation(stored), explanation)
+
+    def test_other_model_version_is_not_explained(self):
+        obs = self.observation("retired-version")
+        self.assertIsNone(explanations.get_explanation(obs))
+        self.assertIsNone(Observation.objects.get(pk=obs.pk).explanation)
+
+
+class LabelWatermarkTests(TestCase):
+    """outcome_recorded_at moves with every label write, so incremental retraining sees new and corrected labels."""
+    disease = "Diabetes"
+
+    def labelled(self, n=1):
+        features = {f: 1.0 for f in predictor.get_expected_features(self.disease)}
+        return [Observation.objects.create(code=self.disease, value="0.1", disease_key=self.disease, features=features,
+                                           effective_date=datetime(2024, 1, 1, tzinfo=timezone.utc))
+                for _ in range(n)]
+
+    def test_every_write_path_stamps_the_label(self):
+        obs, updated, bulk = self.labelled(3)
+        self.assertIsNone(obs.outcome_recorded_at)
+        obs.confirmed_outcome = True
+        obs.save()
+        first = obs.outcome_recorded_at
+        self.assertIsNotNone(first)
+
+        obs = Observation.objects.get(pk=obs.pk)
+        obs.save()   # unchanged label: no new timestamp
+        self.assertEqual(obs.outcome_recorded_at, first)
+        obs.confirmed_outcome = False   # a correction
+        obs.save(update_fields=["confirmed_outcome"])
+        self.assertGreater(Observation.objects.get(pk=obs.pk).outcome_recorded_at, first)
+
+        Observation.objects.filter(pk=updated.pk).update(confirmed_outcome=True)
+        self.assertIsNotNone(Observation.objects.get(pk=updated.pk).outcome_recorded_at)
+        bulk.confirmed_outcome = False
+        Observation.objects.bulk_update([bulk], ["confirmed_outcome"])
+        self.assertIsNotNone(Observation.objects.get(pk=bulk.pk).outcome_recorded_at)
+
+    def test_watermark_and_warm_start(self):
+        from .management.commands.retrain_incremental import labelled_batches
+
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+        expected = predictor.get_expected_features(self.disease)
+        rows = self.labelled(4)
+        Observation.objects.filter(pk__in=[o.pk for o in rows[:2]]).update(confirmed_outcome=True)
+        batches, watermark = labelled_batches(self.disease, expected)
+        self.assertEqual(sum(len(labels) for _rows, labels in batches), 2)
+        mark = watermark["value"]
+
+        # later labels, including a correction of an already consumed one, are past the watermark
+        Observation.objects.filter(pk__in=[rows[0].pk, rows[2].pk]).update(confirmed_outcome=False)
+        batches, watermark = labelled_batches(self.disease, expected, since=mark)
+        batches = list(batches)
+        self.assertEqual(sorted(labels for _rows, batch in batches for labels in batch), [0, 0])
+        self.assertGreater(watermark["value"], mark)
+
+        rounds = predictor._load_artifacts_for(self.disease)[1].get_booster().num_boosted_rounds()
+        model, stats, risk = incremental.continue_training(self.disease, batches, rounds_per_batch=3)
+        self.assertIsNone(risk)   # no held-out rows to refit on
+        self.assertEqual((stats["rows"], stats["rounds_before"], stats["rounds_after"]), (2, rounds, rounds + 3))
+        self.assertEqual(model.get_booster().num_boosted_rounds(), rounds + 3)
+
+
+class BackgroundScoringTests(TestCase):
+    """Self-checks are scored inline, by the thread pool after commit, or by run_scoring_worker; each row once."""
+    disease = "Diabetes"
+
+    def setUp(self):
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+
+    def submit(self, mode):
+        with override_settings(ML_SCORING_MODE=mode):
+            response = self.client.post("/patient/self/ml-submit/",
+                                        {"disease": self.disease, "features": "{}", "anon_id": "a"})
+        self.assertEqual(response.status_code, 200)
+        return response.context["observation"]
+
+    def pending(self, **extra):
+        features = dict.fromkeys(predictor.get_expected_features(self.disease))
+        return Observation.objects.create(code=self.disease, value="pending", disease_key=self.disease,
+                                          features=features, scoring_status=Observation.SCORING_PENDING,
+                                          effective_date=datetime(2024, 1, 1, tzinfo=timezone.utc), **extra)
+
+    def assertScored(self, obs):
+        obs = Observation.objects.get(pk=obs.pk)
+        self.assertEqual(obs.scoring_status, Observation.SCORING_DONE)
+        self.assertIsNotNone(obs.risk_score)
+        self.assertEqual(obs.model_version, predictor.active_version())
+
+    def test_sync_scores_inline(self):
+        self.assertScored(self.submit(scoring.SYNC))
+
+    def test_thread_scores_after_commit(self):
+        executor = mock.Mock()
+        executor.submit.side_effect = lambda _fn, obs_id: scoring.score_observation(obs_id)
+        with mock.patch.object(scoring, "_get_executor", return_value=executor), \
+                self.captureOnCommitCallbacks(execute=True):
+            obs = self.submit(scoring.THREAD)
+            self.assertEqual(Observation.objects.get(pk=obs.pk).scoring_status, Observation.SCORING_PENDING)
+        self.assertScored(obs)
+
+    def test_queue_scored_by_worker(self):
+        obs = self.submit(scoring.QUEUE)
+        self.assertEqual(Observation.objects.get(pk=obs.pk).scoring_status, Observation.SCORING_PENDING)
+        call_command("run_scoring_worker", once=True, stdout=io.StringIO())
+        self.assertScored(obs)
+
+    def test_threshold_comes_from_the_scoring_version(self):
+        obs = self.submit(scoring.QUEUE)
+        url = f"/patient/self/ml-status/{obs.pk}/"
+        self.assertIsNone(self.client.get(url).json()["threshold"])   # pending: no version yet
+        call_command("run_scoring_worker", once=True, stdout=io.StringIO())
+        version = Observation.objects.get(pk=obs.pk).model_version
+
+        rng = np.random.default_rng(0)
+        served = rng.uniform(0, 1, 500)
+        table = calibration.RiskTable(calibration.fit_risk_table(served, (rng.random(500) < served).astype(int)))
+        scored_root = predictor.version_root(version)
+
+        def tables(_disease, root=None):
+            # only the version that scored the row has a risk table
+            return table if root == scored_root else None
+
+        with mock.patch("ehr.ml_nhanes_module.get_risk_table", side_effect=tables):
+            self.assertEqual(self.client.get(url).json()["threshold"], table.threshold)
+            self.assertEqual(scoring.risk_threshold(self.disease), scoring._settings_threshold(self.disease))
+        Observation.objects.filter(pk=obs.pk).update(model_version="removed-version")
+        self.assertIsNone(self.client.get(url).json()["threshold"])
+
+    def test_claimed_row_is_not_scored_twice(self):
+        obs = self.pending()
+        score_features = scoring.score_features
+        second = []
+
+        def racing(disease, features, root=None):
+            # another worker reaches the row while this one is scoring it
+            second.append(scoring.score_observation(obs.pk))
+            return score_features(disease, features, root)
+
+        with mock.patch.object(scoring, "score_features", side_effect=racing):
+            self.assertTrue(scoring.score_observation(obs.pk))
+        self.assertEqual(second, [False])
+        self.assertScored(obs)
+
+    def test_version_and_score_come_from_one_root(self):
+        obs = self.pending()
+        served = predictor.active_root()
+        roots = iter([served])
+
+        def promoted():
+            # a promote lands right after the worker resolved the served root
+            return next(roots, served.parent / "promoted-meanwhile")
+
+        with mock.patch("ehr.ml_nhanes_module.active_root", side_effect=promoted), \
+                mock.patch.object(predictor, "active_root", side_effect=promoted):
+            self.assertTrue(scoring.score_observation(obs.pk))
+        self.assertScored(obs)
+        self.assertAlmostEqual(Observation.objects.get(pk=obs.pk).risk_score,
+                               scoring.score_features(self.disease, obs.features)[0])
+
+    def test_failure_marks_row_failed(self):
+        obs = self.pending()
+        with mock.patch.object(scoring, "score_features", side_effect=RuntimeError("boom")):
+            self.assertTrue(scoring.score_observation(obs.pk))
+        obs = Observation.objects.get(pk=obs.pk)
+        self.assertEqual((obs.scoring_status, obs.value, obs.risk_score), (Observation.SCORING_FAILED, "error", None))
+        self.assertIn("Scoring error: boom", obs.remarks)
+
+    def test_requeue_only_stale_claims(self):
+        now = datetime.now(timezone.utc)
+        live = self.pending(claimed_at=now)
+        crashed = self.pending(claimed_at=now - timedelta(hours=1))
+        Observation.objects.update(scoring_status=Observation.SCORING_RUNNING)
+        self.assertEqual(scoring.requeue_stale(older_than=600), 1)
+        status = dict(Observation.objects.values_list("pk", "scoring_status"))
+        self.assertEqual((status[live.pk], status[crashed.pk]),
+                         (Observation.SCORING_RUNNING, Observation.SCORING_PENDING))
+
+
+class ScoreCohortTests(TestCase):
+    """score_cohort streams a file in chunks and writes the same scores as one predict_risk_many call."""
+    disease = "Diabetes"
+
+    def setUp(self):
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+        import pandas as pd
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        features = predictor.get_expected_features(self.disease)
+        self.X = parity_sample(predictor._load_compiled_for(self.disease), n_rows=5, seed=4)
+        frame = pd.DataFrame(self.X, columns=features)
+        frame.insert(0, "SEQN", ["a", None, "b", None, "c"])
+        self.input = self.dir / "cohort.csv"
+        frame.to_csv(self.input, index=False, encoding=cohort.CSV_ENCODING)
+
+    def score(self, **opts):
+        call_command("score_cohort", str(self.input), disease=[self.disease], id_column=["SEQN"], chunksize=2,
+                     workers=0, stdout=io.StringIO(), stderr=io.StringIO(), **opts)
+
+    def test_output_columns_across_chunks(self):
+        import pandas as pd
+
+        out = self.dir / "scores.csv"
+        self.score(output=str(out))
+        frame = pd.read_csv(out)
+        self.assertEqual(list(frame.columns), ["SEQN", "Diabetes_risk", "Diabetes_alert"]
+                         + (["Diabetes_band"] if predictor.get_risk_table(self.disease) else []))
+        self.assertEqual(frame["SEQN"].tolist()[::2], ["a", "b", "c"])
+        np.testing.assert_allclose(frame["Diabetes_risk"], predictor.predict_risk_many(self.disease, self.X),
+                                   atol=1e-6)
+
+    def test_to_observations_keeps_blank_ids_apart(self):
+        self.score(to_observations=True)
+        rows = Observation.objects.filter(disease_key=self.disease)
+        self.assertEqual(rows.count(), 5)
+        self.assertEqual(rows.filter(deidentified_patient_hash__isnull=True).count(), 2)
+        hashes = set(rows.exclude(deidentified_patient_hash__isnull=True)
+                     .values_list("deidentified_patient_hash", flat=True))
+        self.assertEqual(len(hashes), 3)
+        self.assertEqual(set(rows.values_list("model_version", flat=True)), {predictor.active_version()})
+        self.assertEqual(PatientRiskSummary.objects.count(), 3)
+
+    def test_workers_get_the_predictor_settings(self):
+        with mock.patch.object(predictor, "configure_serving_profile") as profile, \
+                mock.patch.object(predictor, "configure_prediction_cache") as cache, \
+                mock.patch.object(predictor, "preload_models"), mock.patch("threadpoolctl.threadpool_limits"):
+            cohort._init_worker("compact", {"maxsize": 7, "ttl": None})
+        profile.assert_called_once_with("compact")
+        cache.assert_called_once_with(maxsize=7, ttl=None)
+
+
+class InputValidationTests(TestCase):
+    """Bad feature values are reported per field, and the self-check answers them with a 400."""
+    disease = "Diabetes"
+
+    def setUp(self):
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+        self.features = predictor.get_expected_features(self.disease)
+
+    def test_errors_per_field(self):
+        first, second = self.features[:2]
+        validator = predictor.get_validator(self.disease)
+        with self.assertRaises(FeatureValidationError) as raised:
+            validator.coerce_row({first: "abc", second: "inf"})
+        self.assertEqual(raised.exception.errors, {first: "expected a number, got 'abc'",
+                                                  second: "must be a finite number"})
+        rows = [dict.fromkeys(self.features, 1.0), dict.fromkeys(self.features, 1.0)]
+        rows[1][second] = "x"
+        with self.assertRaises(FeatureValidationError) as raised:
+            validator.coerce_many(rows)
+        self.assertEqual(raised.exception.errors, {(1, second): "expected a number, got 'x'"})
+
+    def test_union_validator_is_cached_apart(self):
+        union = predictor.get_union_validator([self.disease])
+        self.assertIsNot(predictor.get_validator(self.disease), union)
+        self.assertIs(predictor.get_union_validator([self.disease]), union)
+
+    def submit(self, features):
+        return self.client.post("/patient/self/ml-submit/",
+                                {"disease": self.disease, "features": json.dumps(features), "anon_id": "a"})
+
+    def test_invalid_submission_is_a_400(self):
+        response = self.submit({self.features[0]: "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content.decode(), f"Invalid features: {self.features[0]}: expected a number, got 'abc'")
+        self.assertFalse(Observation.objects.exists())
+
+    def test_unloadable_model_is_a_400(self):
+        with mock.patch("ehr.ml_nhanes_module.get_validator", side_effect=FileNotFoundError("schema.json")):
+            response = self.submit({})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Prediction error: schema.json", response.content.decode())
+
+
+class CompiledExportTests(SimpleTestCase):
+    """export_compiled only writes an export that passes its parity check against the joblib pair."""
+    disease = "CVD"   # multi-output and one-hot encoded: the hardest layout to reproduce
+
+    def setUp(self):
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = Path(tmp.name) / "model.compiled"
+        self.paths = store.artifact_paths(predictor.active_root(), self.disease)
+        self.expected = predictor.get_expected_features(self.disease)
+
+    def test_export_passes_parity(self):
+        err = export_compiled(*self.paths, self.out, self.expected, multilabel=True, n_check=500)
+        self.assertLessEqual(err, 1e-6)
+        compiled = CompiledModel.load(self.out)
+        X = parity_sample(compiled, n_rows=200, seed=11)
+        reference = predictor._predict_sklearn(self.disease, self.expected, X)
+        np.testing.assert_allclose(compiled.predict_positive(X), reference, atol=1e-6)
+        self.assertEqual(sorted(p.name for p in self.out.parent.iterdir()), ["model.compiled"])
+
+    def test_failed_parity_writes_nothing(self):
+        with self.assertRaisesMessage(ValueError, "differs by"):
+            export_compiled(*self.paths, self.out, self.expected, multilabel=True, n_check=200, tol=-1.0)
+        self.assertEqual(list(self.out.parent.iterdir()), [])
+
+
+class ScoreAllTests(TestCase):
+    """One submission scores every model and saves one Observation per disease."""
+
+    def setUp(self):
+        self.diseases = predictor.list_models()
+        if len(self.diseases) < 2:
+            self.skipTest("needs at least two served models")
+        self.features = {}
+        for i, disease_key in enumerate(self.diseases):
+            X = parity_sample(predictor._load_compiled_for(disease_key), n_rows=1, seed=20 + i)
+            for f, v in zip(predictor.get_expected_features(disease_key), X[0]):
+                self.features.setdefault(f, None if np.isnan(v) else float(v))
+        self.api = APIClient()
+        self.api.force_authenticate(User.objects.create_user("screener"))
+
+    def test_predict_risk_all_matches_each_model(self):
+        probs = predictor.predict_risk_all(self.features)
+        self.assertEqual(probs, predictor.predict_risk_all(self.features, parallel=False))
+        for disease_key in self.diseases:
+            own = {f: self.features[f] for f in predictor.get_expected_features(disease_key)}
+            self.assertAlmostEqual(probs[disease_key], predictor.predict_risk(disease_key, own))
+
+    def test_api_saves_one_observation_per_disease(self):
+        response = self.api.post("/api/ml/score-all/", {"features": self.features}, format="json")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["disease"] for r in results], self.diseases)
+        probs = predictor.predict_risk_all(self.features)
+        saved = {o.disease_key: o for o in Observation.objects.all()}
+        self.assertEqual(sorted(saved), sorted(self.diseases))
+        for r in results:
+            obs = saved[r["disease"]]
+            self.assertEqual((str(obs.pk), obs.scoring_status), (r["observation_id"], Observation.SCORING_DONE))
+            self.assertAlmostEqual(obs.risk_score, r["risk"])
+            self.assertEqual(obs.model_version, predictor.active_version())
+            if predictor.get_risk_table(r["disease"]) is None:
+                self.assertAlmostEqual(r["risk"], probs[r["disease"]])
+        self.assertEqual(len({o.deidentified_patient_hash for o in saved.values()}), 1)
+
+    def test_api_rejects_invalid_features(self):
+        field = next(iter(self.features))
+        response = self.api.post("/api/ml/score-all/", {"features": {field: "abc"}}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], {field: "expected a number, got 'abc'"})
+        response = self.api.post("/api/ml/score-all/", {"features": [1, 2]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Observation.objects.exists())
+
+
+def synthetic_training_frame(n_rows, seed=0):
+    """Random lab values in the training columns; each single-label target (1 = yes, 2 = no) follows a feature."""
+    import pandas as pd
+    from .ml_nhanes_module import trainer
+
+    rng = np.random.default_rng(seed)
+    columns = trainer.training_columns()
+    df = pd.DataFrame(rng.normal(50, 10, (n_rows, len(columns))), columns=columns)
+    for target, features in trainer.PREDEFINED_FEATURES.items():
+        df[target] = np.where(df[features[0]] + rng.normal(0, 10, n_rows) > 55, 1, 2)
+    return df
+
+
+class ParallelTrainingTests(SimpleTestCase):
+    """Fits run in a process pool produce the same models as fits run one after another."""
+
+    def test_parallel_matches_serial(self):
+        import joblib
+        from .ml_nhanes_module import trainer
+
+        rng = np.random.default_rng(0)
+        df = synthetic_training_frame(400)
+        jobs = []
+        for disease_key in (trainer.DIABETES_KEY, trainer.LIVER_KEY):
+            target = trainer.TARGET_COLS[disease_key]
+            jobs.append((disease_key, (disease_key, trainer.PREDEFINED_FEATURES[target], target)))
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        serial_dir, parallel_dir = Path(tmp.name) / "serial", Path(tmp.name) / "parallel"
+        serial_dir.mkdir()
+        parallel_dir.mkdir()
+        serial = trainer._run_jobs(df, jobs, parallel=False, workers=None, out_dir=serial_dir)
+        self.assertIsNone(trainer._SHARED_DF)
+        parallel = trainer._run_jobs(df, jobs, parallel=True, workers=2, out_dir=parallel_dir)
+
+        for (disease_key, _args), a, b in zip(jobs, serial, parallel):
+            self.assertEqual(a["features"], b["features"])
+            self.assertAlmostEqual(a["metrics"]["roc_auc"], b["metrics"]["roc_auc"], places=6)
+            models = [joblib.load(store.artifact_paths(d, disease_key)[1]) for d in (serial_dir, parallel_dir)]
+            self.assertIsNone(models[1].get_params()["n_jobs"])   # serving keeps the default thread count
+            X = rng.normal(50, 10, (50, len(a["features"])))
+            np.testing.assert_allclose(models[0].predict_proba(X), models[1].predict_proba(X), atol=1e-6)
+
+
+class TuningTests(SimpleTestCase):
+    """The halving search writes a report whose params the trainer picks up on its next run."""
+
+    def test_tune_and_reuse_params(self):
+        from .ml_nhanes_module import trainer, tuning
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        df = synthetic_training_frame(300, seed=1)
+        with mock.patch.object(trainer, "TUNING_DIR", Path(tmp.name)):
+            report = tuning.tune_disease(df, trainer.DIABETES_KEY, n_candidates=6, max_trees=60, min_trees=10,
+                                         cv=2, n_jobs=1)
+            saved = trainer.load_tuned_params(trainer.DIABETES_KEY)
+            model = trainer._xgb_classifier(params=saved)
+
+        best = report["best_params"]
+        self.assertEqual(saved, best)
+        self.assertEqual(set(best), set(tuning.PARAM_DISTRIBUTIONS) | {"n_estimators"})
+        self.assertEqual(best["n_estimators"], report["best_iteration"] + 1)
+        self.assertLessEqual(best["n_estimators"], 60)
+        # early stopping watched a fold of the 240 training rows, not the 60 held-out ones
+        self.assertEqual((report["early_stopping_rows"], report["holdout"]["n_test"]), (48, 60))
+        self.assertEqual(model.get_params()["max_depth"], best["max_depth"])
+        # successive halving: fewer candidates with more trees in every round
+        rounds = {}
+        for c in report["candidates"]:
+            rounds.setdefault(c["iteration"], []).append(c["n_estimators"])
+        self.assertEqual(len(rounds[0]), 6)
+        sizes = [len(rounds[i]) for i in sorted(rounds)]
+        trees = [rounds[i][0] for i in sorted(rounds)]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertEqual(trees, sorted(trees))
+        self.assertGreater(report["holdout"]["roc_auc"], 0.5)
+
+
+class ArtifactStoreTests(SimpleTestCase):
+    """Publish, promote (hot swap), roll back, garbage-collect and verify versions in a scratch store."""
+
+    def setUp(self):
+        self.source = predictor.active_root()
+        if self.source is None:
+            self.skipTest("no version promoted")
+        self.served = predictor.list_models()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for name, path in (("STORE_DIR", Path(tmp.name) / "store"), ("CURRENT_PATH", Path(tmp.name) / "CURRENT")):
+            patcher = mock.patch.object(store, name, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def publish(self, diseases, **kwargs):
+        """Publish the served artifacts of diseases as a version of the scratch store."""
+        staging = store.staging_dir()
+        schema = json.loads((self.source / "schema.json").read_text(encoding="utf-8"))
+        schema = {k: v for k, v in schema.items() if k in diseases or k == "cvd_components"}
+        (staging / "schema.json").write_text(json.dumps(schema, indent=2), encoding="utf-8")
+        for disease_key in diseases:
+            for path in store.artifact_paths(self.source, disease_key):
+                shutil.copyfile(path, staging / path.name)
+            shutil.copytree(store.compiled_path(self.source, disease_key), store.compiled_path(staging, disease_key))
+        return store.publish(staging, source="test", **kwargs)
+
+    def test_publish_promote_and_hot_swap(self):
+        served = self.served
+        first = self.publish(served, promote=True)
+        self.assertEqual((predictor.active_version(), predictor.list_models()), (first, served))
+        self.assertEqual(self.publish(served), first)   # same artifacts, same version
+
+        second = self.publish(served[:1], parent=first)
+        self.assertEqual(predictor.active_version(), first)   # published, not promoted
+        X = parity_sample(predictor._load_compiled_for(served[0]), n_rows=20, seed=8)
+        before = predictor.predict_risk_many(served[0], X)
+        store.promote_version(second)
+        # the next prediction is served from the new version, without a restart
+        self.assertEqual((predictor.active_version(), predictor.list_models()), (second, served[:1]))
+        self.assertEqual(predictor._load_compiled_for(served[0]).path.parent, store.version_dir(second))
+        np.testing.assert_array_equal(predictor.predict_risk_many(served[0], X), before)
+        self.assertEqual(store.read_manifest(second)["parent"], first)
+
+        call_command("model_store", "promote", first, stdout=io.StringIO())   # roll back
+        self.assertEqual(predictor.list_models(), served)
+        self.assertEqual(store.list_versions(), [first, second])
+
+    def test_gc_keeps_current_and_newest(self):
+        served = self.served
+        oldest = self.publish(served, promote=True)
+        middle = self.publish(served[:1])
+        newest = self.publish(served[:2])
+        stale = store.staging_dir()
+        os.utime(stale, (0, 0))
+        fresh = store.staging_dir()
+
+        self.assertEqual(store.gc(keep=1), [middle])
+        self.assertEqual(store.list_versions(), [oldest, newest])
+        self.assertEqual((stale.exists(), fresh.exists()), (False, True))
+
+    def test_manifest_mismatch_is_not_promoted(self):
+        served = self.served
+        good = self.publish(served, promote=True)
+        bad = self.publish(served[:1])
+        _preproc, model = store.artifact_paths(store.version_dir(bad), served[0])
+        with open(model, "ab") as fh:
+            fh.write(b"corrupt")
+
+        self.assertEqual(store.verify(good), [])
+        self.assertEqual(store.verify(bad), [model.name])
+        with self.assertRaisesMessage(ValueError, f"Version {bad} does not match its manifest: {model.name}"):
+            store.promote_version(bad)
+        with self.assertRaisesMessage(CommandError, model.name):
+            call_command("model_store", "promote", bad, stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, model.name):
+            call_command("model_store", "verify", bad, stdout=io.StringIO())
+        self.assertEqual(predictor.active_version(), good)
+
+    def test_incremental_version_keeps_risk_table(self):
+        disease = next((d for d in self.served if d != predictor.CVD_KEY), None)
+        if disease is None:
+            self.skipTest("no single-label model served")
+        X = parity_sample(predictor._load_compiled_for(disease, self.source), n_rows=600, seed=11)
+        served = predictor._predict_many(disease, X, self.source)
+        y = (served > np.median(served)).astype(int)
+        parent = self.publish(self.served, models={disease: {"risk": calibration.fit_risk_table(served, y)}})
+        expected = json.loads((self.source / "schema.json").read_text(encoding="utf-8"))[disease]
+        rows = [dict(zip(expected, row)) for row in X.tolist()]
+
+        # enough held-out labels: the table is refitted on them
+        model, stats, risk = incremental.continue_training(disease, [(rows, y)], rounds_per_batch=2, version=parent)
+        self.assertEqual(stats["holdout_rows"] + stats["rows"], len(y))
+        self.assertIsNotNone(risk)
+        refit = incremental.build_version(parent, {disease: (model, stats, risk)})
+        entry = store.read_manifest(refit)["models"][disease]
+        self.assertEqual((entry["risk_source"], entry["risk"]["n_rows"]), ("incremental holdout", stats["holdout_rows"]))
+        self.assertIsNotNone(predictor.get_risk_table(disease, root=store.version_dir(refit)))
+
+        # too few: the parent's table is kept, marked as inherited
+        model, stats, risk = incremental.continue_training(disease, [(rows[:20], y[:20])], rounds_per_batch=2,
+                                                           version=parent)
+        self.assertIsNone(risk)
+        inherited = incremental.build_version(parent, {disease: (model, stats, risk)})
+        entry = store.read_manifest(inherited)["models"][disease]
+        self.assertEqual(entry["risk_source"], f"inherited from {parent}")
+        self.assertEqual(entry["risk"], store.read_manifest(parent)["models"][disease]["risk"])
+        self.assertIsNotNone(predictor.get_risk_table(disease, root=store.version_dir(inherited)))
+
+
+class CompactExportTests(SimpleTestCase):
+    """The compact profile prunes trailing trees within the tolerance and stores narrow node arrays."""
+    disease = "Diabetes"
+
+    def setUp(self):
+        if self.disease not in predictor.list_models():
+            self.skipTest(f"no {self.disease} model served")
+        self.full = predictor._load_compiled_for(self.disease, profile="full")
+        names = json.loads((self.full.path / "meta.json").read_text(encoding="utf-8"))["arrays"]
+        self.arrays = {name: np.load(self.full.path / f"{name}.npy") for name in names}
+
+    def test_narrow_arrays_score_the_same(self):
+        from .ml_nhanes_module import compact
+
+        all_trees = np.bincount(self.arrays["tree_output"]).tolist()
+        arrays = compact.narrow(compact.select_trees(self.arrays, all_trees))
+        self.assertEqual(arrays["feature"].dtype, np.int8)
+        self.assertIn(arrays["left"].dtype, (np.int16, np.int32))
+        self.assertLess(arrays["left"].dtype.itemsize, self.arrays["left"].dtype.itemsize)
+        meta = {"features": predictor.get_expected_features(self.disease), "source_sha256": None}
+        X = parity_sample(self.full, n_rows=300, seed=9)
+        np.testing.assert_array_equal(CompiledModel(arrays, meta).predict_positive(X), self.full.predict_positive(X))
+
+    def test_pruning_stays_within_tolerance(self):
+        from .ml_nhanes_module import compact
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        rng = np.random.default_rng(2)
+        X = parity_sample(self.full, n_rows=600, seed=10)
+        y = (rng.random(len(X)) < self.full.predict_positive(X)).astype(int)
+        tol = 1e-3
+        report = compact.export_compact(*store.artifact_paths(predictor.active_root(), self.disease),
+                                        Path(tmp.name) / "model.compact", predictor.get_expected_features(self.disease),
+                                        False, X, y, tol=tol, seed=0)
+        pruned = CompiledModel.load(Path(tmp.name) / "model.compact")
+        self.assertEqual(report["trees"], {"full": len(self.full.roots), "compact": len(pruned.roots)})
+        self.assertLessEqual(len(pruned.roots), len(self.full.roots))
+        self.assertEqual(pruned.feature.dtype, np.int8)
+        # on the rows that chose the cut-off, log loss is within tol of all the trees
+        select = np.random.default_rng(0).permutation(len(X))[: len(X) // 2]
+        losses = [compact._log_loss(y[select].astype(np.float64), m.margins(m.transform(X[select]))[:, 0])
+                  for m in (self.full, pruned)]
+        self.assertLessEqual(losses[1], losses[0] + tol + 1e-9)
+        self.assertLess(abs(report["outputs"][0]["log_loss_delta"]), 0.05)
+
+
+class RiskTableTests(SimpleTestCase):
+    """Calibration, bands and alert threshold fitted on a held-out split with a known miscalibration."""
+
+    def split(self, n=4000, seed=0):
+        rng = np.random.default_rng(seed)
+        true = rng.beta(1, 4, n)
+        served = np.sqrt(true)   # overestimates every risk
+        return served, (rng.random(n) < true).astype(int)
+
+    def test_fit_calibrate_band_and_threshold(self):
+        served, y = self.split()
+        entry = calibration.fit_risk_table(served, y)
+        json.dumps(entry, allow_nan=False)   # stored in the manifest
+        self.assertEqual(entry["calibration"]["method"], "isotonic")
+        table = calibration.RiskTable(entry)
+
+        calibrated = table.calibrate(served)
+        self.assertAlmostEqual(calibrated.mean(), y.mean(), places=3)
+        self.assertLess(calibrated.mean(), served.mean())
+        self.assertTrue(np.all(np.diff(table.calibrate(np.linspace(0, 1, 101))) >= 0))
+        # the alert keeps ALERT_SENSITIVITY of the positives, "high" HIGH_SENSITIVITY
+        flagged = calibrated[y == 1] >= table.threshold
+        self.assertGreaterEqual(flagged.mean(), calibration.ALERT_SENSITIVITY)
+        self.assertGreaterEqual((calibrated[y == 1] >= table.edges[1]).mean(), calibration.HIGH_SENSITIVITY)
+        self.assertLessEqual(table.threshold, table.edges[1])
+        self.assertEqual(list(table.bands(np.array([0.0, table.threshold, table.edges[1], 1.0]))),
+                         ["low", "elevated", "high", "high"])
+        sensitivity = entry["thresholds"]["sensitivity"]
+        self.assertEqual(sensitivity, sorted(sensitivity, reverse=True))
+
+        for p in (0.05, 0.3, 0.9):
+            value, band, alert, threshold = table.assess(p)
+            self.assertAlmostEqual(value, float(table.calibrate(p)))
+            self.assertEqual((band, alert, threshold), (table.bands(np.array([value]))[0], value >= threshold,
+                                                         table.threshold))
+
+    def test_platt_below_isotonic_minimum(self):
+        served, y = self.split()
+        positives, negatives = np.flatnonzero(y == 1), np.flatnonzero(y == 0)
+        for n_positive, method in ((calibration.MIN_ISOTONIC_POSITIVES, "isotonic"),
+                                   (calibration.MIN_ISOTONIC_POSITIVES - 1, "platt")):
+            rows = np.concatenate([positives[:n_positive], negatives])
+            self.assertEqual(calibration.fit_calibration(served[rows], y[rows])["method"], method)
+
+        # Platt scaling recovers a known log-odds transform
+        rng = np.random.default_rng(1)
+        served = rng.uniform(0.01, 0.99, 20000)
+        y = (rng.random(len(served)) < 1 / (1 + np.exp(-(0.5 * calibration._logit(served) - 1.0)))).astype(int)
+        with mock.patch.object(calibration, "MIN_ISOTONIC_POSITIVES", len(y) + 1):
+            fitted = calibration.fit_calibration(served, y)
+        self.assertEqual(fitted["method"], "platt")
+        self.assertAlmostEqual(fitted["a"], 0.5, delta=0.05)
+        self.assertAlmostEqual(fitted["b"], -1.0, delta=0.05)
+
+    def test_single_class_split_has_no_table(self):
+        self.assertIsNone(calibration.fit_risk_table([0.1, 0.4, 0.8], [0, 0, 0]))
+
+    def test_scoring_uses_the_table(self):
+        table = calibration.RiskTable(calibration.fit_risk_table(*self.split()))
+        with mock.patch("ehr.ml_nhanes_module.get_risk_table", return_value=table):
+            value, threshold, alert, band = scoring.assess("Diabetes", 0.6)
+            self.assertEqual(scoring.risk_threshold("Diabetes"), table.threshold)
+        self.assertEqual((value, band, alert, threshold), table.assess(0.6))
+
+
+class CompileModelsCommandTests(SimpleTestCase):
+    def test_unknown_version(self):
+        with self.assertRaisesMessage(CommandError, "No published version 'no-such-version'"):
+            call_command("compile_models", model_version="no-such-version", stdout=io.StringIO())
+
+
+class ObservationQueryPlanTests(TestCase):
+    """The Observation access paths must be answered from the indexes of migrations 0010/0011, not a table scan."""
+
+    def plan(self, qs):
+        if connection.vendor == "postgresql":
+            # on near-empty test tables a sequential scan is cheapest; rule it out to see the index path
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        elif connection.vendor != "sqlite":
+            self.skipTest(f"no query plan expectations for {connection.vendor}")
+        return qs.explain()
+
+    def assertUsesIndex(self, qs, index_name):
+        plan = self.plan(qs)
+        self.assertIn(index_name, plan, f"expected {index_name} in the plan:\n{plan}")
+
+    def test_patient_timeline(self):
+        self.assertUsesIndex(Observation.objects.filter(patient_id=1).order_by("-effective_date")[:8],
+                             "obs_patient_date_idx")
+
+    def test_research_feed(self):
+        start, end = datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.assertUsesIndex(Observation.objects.all()[:50], "obs_date_id_idx")
+        self.assertUsesIndex(Observation.objects.filter(effective_date__gte=start)[:50], "obs_date_id_idx")
+        self.assertUsesIndex(Observation.objects.filter(code="Diabetes", effective_date__gte=start,
+                                                        effective_date__lte=end)[:50], "obs_code_date_id_idx")
+
+    def test_keyset_page(self):
+        # the query KeysetPagination issues for the page after a cursor, with and without a code filter
+        cursor, pk = datetime(2024, 6, 1, tzinfo=timezone.utc), "8d4f0e64-4c65-4c3e-9b7e-0d8f1b3f2a11"
+        for qs, index_name in ((Observation.objects.all(), "obs_date_id_idx"),
+                               (Observation.objects.filter(code="Diabetes"), "obs_code_date_id_idx")):
+            page = (qs.filter(effective_date__lte=cursor).exclude(effective_date=cursor, pk__gte=pk)
+                    .order_by("-effective_date", "-id")[:101])
+            self.assertUsesIndex(page, index_name)
+
+    def test_research_filters(self):
+        self.assertUsesIndex(Observation.objects.filter(disease_key="CVD")[:50], "obs_disease_date_idx")
+        self.assertUsesIndex(Observation.objects.filter(deidentified_patient_hash="abc")[:50], "obs_deid_date_idx")
+        self.assertUsesIndex(Observation.objects.filter(alert=True)[:50], "obs_alert_date_idx")
+
+    def test_scoring_queue(self):
+        qs = Observation.objects.filter(scoring_status=Observation.SCORING_PENDING).order_by("effective_date")[:50]
+        self.assertUsesIndex(qs, "obs_pending_idx")
+
+
+class KeysetPaginationTests(TestCase):
+    """/api/observations/ pages by (effective_date, id) cursor."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("researcher"))
+        self.t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # three rows per timestamp, so page boundaries fall between rows with the same effective_date
+        for i in range(30):
+            Observation.objects.create(code="Diabetes" if i % 2 else "CVD", value="0",
+                                       effective_date=self.t0 + timedelta(days=i // 3))
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            body = self.client.get(url).json()
+            ids += [row["id"] for row in body["results"]]
+            url, pages = body["next"], pages + 1
+            if pages == 1:
+                # a row arriving mid-walk is newer than everything paged so far and must not shift later pages
+                Observation.objects.create(code="Diabetes", value="1", effective_date=self.t0 + timedelta(days=99))
+        return ids, pages
+
+    def test_walk_is_complete_and_stable(self):
+        expected = [str(pk) for pk in Observation.objects.order_by("-effective_date", "-id")
+                    .values_list("id", flat=True)]
+        ids, pages = self.walk("/api/observations/?page_size=7")
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 5)
+
+    def test_previous_returns_the_same_page(self):
+        first = self.client.get("/api/observations/?page_size=4").json()
+        self.assertIsNone(first["previous"])
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_filters_apply_to_every_page(self):
+        start, end = self.t0 + timedelta(days=2), self.t0 + timedelta(days=7)
+        expected = [str(pk) for pk in Observation.objects.filter(code="Diabetes", effective_date__gte=start,
+                                                                 effective_date__lte=end)
+                    .order_by("-effective_date", "-id").values_list("id", flat=True)]
+        ids, _pages = self.walk(f"/api/observations/?code=Diabetes&start={start:%Y-%m-%d}&end={end:%Y-%m-%d}"
+                                "&page_size=2")
+        self.assertEqual(ids, expected)
+
+    def test_fast_path_matches_serializer(self):
+        Observation.objects.filter(code="CVD").update(features={"age": 50, "nested": {"a": [1, 2]}}, risk_score=0.25,
+                                                      risk_band="high", unit="mg/dL")
+        expected = json.loads(json.dumps(DeidentifiedObservationSerializer(
+            Observation.objects.order_by("-effective_date", "-id"), many=True).data))
+        self.assertEqual(self.client.get("/api/observations/?page_size=1000").json()["results"], expected)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get("/api/observations/?cursor=not-a-cursor").status_code, 404)
+
+
+class ExportTests(TestCase):
+    """/api/observations/export/ streams the same rows and fields as the paged list."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("researcher"))
+        t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i in range(25):
+            Observation.objects.create(code="Diabetes" if i % 2 else "CVD", value=str(i), risk_score=i / 25,
+                                       features={"age": i, "bmi": None} if i % 3 else None,
+                                       effective_date=t0 + timedelta(hours=i))
+        self.listed = self.client.get("/api/observations/?code=Diabetes&page_size=1000").json()["results"]
+
+    def fetch(self, query):
+        response = self.client.get(f"/api/observations/export/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_ndjson_matches_list(self):
+        body = self.fetch("code=Diabetes")
+        self.assertEqual([json.loads(line) for line in body.decode().splitlines()], self.listed)
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.fetch("code=Diabetes&fmt=csv").decode())))
+        self.assertEqual([r["id"] for r in rows], [r["id"] for r in self.listed])
+        self.assertEqual(list(rows[0]), export.FIELDS)
+
+    @unittest.skipUnless(export.parquet_available(), "pyarrow is not installed")
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(io.BytesIO(self.fetch("code=Diabetes&fmt=parquet")))
+        self.assertEqual(table.column_names, export.FIELDS)
+        self.assertEqual(table.column("id").to_pylist(), [r["id"] for r in self.listed])
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get("/api/observations/export/?fmt=xml").status_code, 400)
+
+
+class PatientRiskSummaryTests(TestCase):
+    """PatientRiskSummary follows the latest scored ML Observation per subject and disease."""
+
+    def setUp(self):
+        self.t0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.patient = Patient.objects.create(given="Ada", family="Lovelace", identifier="P-1")
+
+    def ml(self, hours, risk, disease="Diabetes", patient=None, **extra):
+        # the self-check views always set the hash (compute_deid_hash in utils.py)
+        patient = patient or self.patient
+        fields = dict(patient=patient, deidentified_patient_hash=f"h-{patient.pk}", code=disease, value=str(risk),
+                      disease_key=disease, risk_score=risk, alert=risk >= 0.5,
+                      effective_date=self.t0 + timedelta(hours=hours))
+        fields.update(extra)
+        return Observation(**fields)
+
+    def summary(self, disease="Diabetes"):
+        return PatientRiskSummary.objects.get(patient=self.patient, disease_key=disease)
+
+    def test_save_keeps_latest(self):
+        self.ml(1, 0.2).save()
+        newest = self.ml(3, 0.7)
+        newest.save()
+        self.ml(2, 0.9).save()   # older than the current one: ignored
+        summary = self.summary()
+        self.assertEqual((summary.observation_id, summary.risk_score, summary.alert), (newest.pk, 0.7, True))
+
+    def test_pending_counts_once_scored(self):
+        obs = self.ml(1, 0.3, risk_score=None, scoring_status=Observation.SCORING_PENDING)
+        obs.save()
+        self.assertFalse(PatientRiskSummary.objects.exists())
+        obs.risk_score, obs.scoring_status = 0.3, Observation.SCORING_DONE
+        obs.save(update_fields=["risk_score", "scoring_status"])
+        self.assertEqual(self.summary().risk_score, 0.3)
+
+    def test_only_score_saves_record(self):
+        obs = self.ml(1, 0.3)
+        obs.save()
+        with mock.patch.object(PatientRiskSummary, "record") as record:
+            obs.explanation = {"x": 0.1}
+            obs.save(update_fields=["explanation"])
+            obs.confirmed_outcome = True
+            obs.save(update_fields=["confirmed_outcome"])
+            record.assert_not_called()
+            obs.save(update_fields=["risk_score", "alert"])
+            record.assert_called_once_with([obs])
+        pending = self.ml(2, 0.5, risk_score=None, scoring_status=Observation.SCORING_PENDING)
+        with mock.patch.object(PatientRiskSummary, "record") as record:
+            pending.save()
+        record.assert_not_called()
+
+    def test_delete_falls_back_to_previous(self):
+        older, middle, newest = self.ml(1, 0.2), self.ml(2, 0.6), self.ml(3, 0.7)
+        for obs in (older, middle, newest):
+            obs.save()
+        middle.delete()   # not the summary row: nothing to do
+        self.assertEqual(self.summary().observation_id, newest.pk)
+        newest.delete()
+        summary = self.summary()
+        self.assertEqual((summary.observation_id, summary.risk_score, summary.alert), (older.pk, 0.2, False))
+        Observation.objects.filter(pk=older.pk).delete()
+        self.assertFalse(PatientRiskSummary.objects.exists())
+
+    def test_bulk_record_and_rebuild(self):
+        batch = [self.ml(1, 0.1), self.ml(2, 0.6), self.ml(1, 0.4, disease="CVD"),
+                 self.ml(5, 0.8, patient=Patient.objects.create(given="B", family="B"))]
+        Observation.objects.bulk_create(batch)
+        self.assertEqual(PatientRiskSummary.record(batch), 3)
+        incremental = sorted(PatientRiskSummary.objects.values_list(
+            "deidentified_patient_hash", "disease_key", "observation_id", "risk_score"))
+        self.assertEqual(self.summary().observation_id, batch[1].pk)
+
+        PatientRiskSummary.objects.all().delete()
+        call_command("rebuild_risk_summary", stdout=io.StringIO())
+        self.assertEqual(sorted(PatientRiskSummary.objects.values_list(
+            "deidentified_patient_hash", "disease_key", "observation_id", "risk_score")), incremental)
+
+    def test_dashboard_sorts_by_risk(self):
+        low = Patient.objects.create(given="Low", family="Aaron")
+        Patient.objects.create(given="None", family="Abel")
+        self.ml(1, 0.2, patient=low).save()
+        self.ml(1, 0.9).save()
+        user = User.objects.create_user("doc")
+        Practitioner.objects.create(user=user, name="Dr")
+        self.client.force_login(user)
+        response = self.client.get("/doctor/dashboard/?sort=risk")
+        self.assertEqual([p.family for p in response.context["patients"]], ["Lovelace", "Aaron", "Abel"])
@@ -1,10 +1,11 @@
 # ehr/urls.py
 from rest_framework import routers
 from django.urls import path, include
-from .views import PatientViewSet, PractitionerViewSet, ObservationViewSet
+from .views import PatientViewSet, PractitionerViewSet, ObservationViewSet, RiskSummaryViewSet
 
 router = routers.DefaultRouter()
 router.register(r"observations", ObservationViewSet, basename="observation")
+router.register(r"risk-summaries", RiskSummaryViewSet, basename="risk-summary")
 
 # ehr/urls.py
 from django.urls import path, include
@@ -17,6 +18,7 @@ from rest_framework import routers
 app_name = "patient"
 urlpatterns = [
     path("", views.home, name="home"),
+    path("api/ml/score-all/", views.ScoreAllAPIView.as_view(), name="api_score_all"),
     path("api/", include(router.urls)),
     path("patient/register/", views.RegisterView.as_view(), name="register"),
     path("patient/login/", views.LoginView.as_view(), name="login"),
@@ -33,6 +35,8 @@ urlpatterns = [
     path("doctor/patient/<uuid:patient_id>/observation/<uuid:obs_id>/edit/", views.observation_edit, name="observation_edit"),
     path("patient/self/ml-entry/", views.patient_entry, name="patient_entry_self"),
     path("patient/self/ml-submit/", views.patient_submit, name="patient_submit_self"),
+    path("patient/self/ml-status/<uuid:pk>/", views.patient_score_status, name="patient_score_status"),
+    path("patient/self/ml-explain/<uuid:pk>/", views.patient_explanation, name="patient_explanation"),
 ]
 
 
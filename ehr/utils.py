@@ -1,4 +1,4 @@
-import hmac, hashlib
+import hmac, hashlib, math
 from django.conf import settings
 
 def deidentify_patient(patient):
@@ -8,3 +8,13 @@ def deidentify_patient(patient):
     base = (patient.identifier or str(patient.id)).encode()
     digest = hmac.new(secret, base, hashlib.sha256).hexdigest()
     return digest  # store this in Observation.deidentified_patient_hash
+
+def compute_deid_hash(identifier: str) -> str:
+    # hash of the ML self-check submitter (patient/user pk, anon id) or cohort subject id
+    salt = getattr(settings, "ML_PATIENT_HASH_SALT", "change_this_in_prod")
+    return hashlib.sha256(f"{identifier}{salt}".encode("utf-8")).hexdigest()
+
+def json_safe_features(features):
+    # NaN is not valid JSON (the JSONField CHECK constraint rejects it); store blanks as null,
+    # which the predictor treats as missing again when the row is scored later
+    return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in features.items()}
@@ -9,24 +9,33 @@ from django.utils.decorators import method_decorator
 from django.urls import reverse_lazy
 from django.http import HttpResponseForbidden
 from django.conf import settings
-from django.http import HttpResponseBadRequest
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.db.models import Count, F, Max, Prefetch, Q
 
 from .forms import PatientRegisterForm, PatientProfileForm, CustomAuthenticationForm, ObservationForm
-from .models import Practitioner, Patient, Observation
+from .models import Practitioner, Patient, Observation, PatientRiskSummary
 from .decorators import practitioner_required
+from .utils import compute_deid_hash, json_safe_features
 from . import models
 
 # ehr/views.py — append these imports near the top if not present
 import json
-import hashlib
 
-from rest_framework import viewsets, permissions, authentication
+from rest_framework import viewsets, permissions, authentication, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from .models import Observation
-from .serializers import DeidentifiedObservationSerializer
+from .serializers import DeidentifiedObservationSerializer, DeidentifiedRiskSummarySerializer, encode_deidentified_rows
+from .pagination import KeysetPagination
+from . import export
 
 
-from .ml_nhanes_module import list_models, get_expected_features, predict_risk
+# attribute access is lazy: the ML stack is imported on the first prediction, not at boot
+from . import ml_nhanes_module as ml
+from . import scoring
+from . import explanations
 
 
 # Create your views here.
@@ -51,13 +60,15 @@ class ObservationViewSet(viewsets.ModelViewSet):
 
 class ObservationViewSet(viewsets.ReadOnlyModelViewSet):
     """
-    Read-only API for deidentified observations.
+    Read-only API for deidentified observations, newest first.
     Auth: TokenAuthentication. Permissions: IsAuthenticated.
+    Paged with an opaque ?cursor= (follow "next"/"previous"); ?page_size= up to 1000.
     """
     queryset = Observation.objects.all()
     serializer_class = DeidentifiedObservationSerializer
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -71,6 +82,69 @@ class ObservationViewSet(viewsets.ReadOnlyModelViewSet):
         end = self.request.query_params.get("end")
         if end:
             qs = qs.filter(effective_date__lte=end)
+        # research filters; each has a (column, -effective_date) index, alerts a partial one
+        disease = self.request.query_params.get("disease_key")
+        if disease:
+            qs = qs.filter(disease_key=disease)
+        patient_hash = self.request.query_params.get("deidentified_patient_hash")
+        if patient_hash:
+            qs = qs.filter(deidentified_patient_hash=patient_hash)
+        alert = self.request.query_params.get("alert")
+        if alert is not None:
+            qs = qs.filter(alert=alert.lower() in ("1", "true", "yes"))
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        # fast path: a .values() projection of the serializer's fields, encoded without model instances
+        qs = self.filter_queryset(self.get_queryset()).values(*DeidentifiedObservationSerializer.Meta.fields)
+        page = self.paginate_queryset(qs)
+        return self.get_paginated_response(encode_deidentified_rows(page))
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export_feed(self, request):
+        """
+        The whole filtered feed in one streamed response: ?fmt=ndjson (default), csv or parquet.
+        Same filters and fields as the paged list; the access is logged to ehr.audit when the stream ends.
+        """
+        fmt = request.query_params.get("fmt", "ndjson").lower()
+        if fmt not in export.FORMATS:
+            return Response({"detail": f"fmt must be one of {', '.join(export.FORMATS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if fmt == "parquet" and not export.parquet_available():
+            return Response({"detail": "Parquet export needs pyarrow installed on the server"},
+                            status=status.HTTP_501_NOT_IMPLEMENTED)
+        qs = self.get_queryset().order_by("-effective_date", "-id")
+        content_type, extension = export.FORMATS[fmt]
+        response = StreamingHttpResponse(
+            export.stream(qs, fmt, request.user.username, request.META.get("QUERY_STRING", "")),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="observations.{extension}"'
+        return response
+
+
+class RiskSummaryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only API for the latest risk per deidentified subject and disease, highest first.
+    Auth: TokenAuthentication. Permissions: IsAuthenticated.
+    Optional filters: disease_key, alert, risk_band.
+    """
+    queryset = PatientRiskSummary.objects.order_by("-risk_score", "id")
+    serializer_class = DeidentifiedRiskSummarySerializer
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        disease = self.request.query_params.get("disease_key")
+        if disease:
+            qs = qs.filter(disease_key=disease)
+        alert = self.request.query_params.get("alert")
+        if alert is not None:
+            qs = qs.filter(alert=alert.lower() in ("1", "true", "yes"))
+        band = self.request.query_params.get("risk_band")
+        if band:
+            qs = qs.filter(risk_band=band)
         return qs
 
 
@@ -161,14 +235,16 @@ class RecordDetailView(View):
         if patient is not None:
             # patient viewing own record (strict)
             record = get_object_or_404(Observation, pk=pk, patient=patient)
-            return render(request, "patient/record_detail.html", {"patient": patient, "record": record})
+            return render(request, "patient/record_detail.html", {"patient": patient, "record": record,
+                                                                  "explanation": explanations.get_explanation(record)})
 
         # 2) If not a patient, allow practitioner/staff/superuser to view by pk
         if hasattr(request.user, "practitioner") or request.user.is_staff or request.user.is_superuser:
             # find the record (if it doesn't exist, 404 is appropriate)
             record = get_object_or_404(Observation, pk=pk)
             patient = record.patient
-            return render(request, "patient/record_detail.html", {"patient": patient, "record": record})
+            return render(request, "patient/record_detail.html", {"patient": patient, "record": record,
+                                                                  "explanation": explanations.get_explanation(record)})
 
         # 3) all other authenticated users are denied
         return HttpResponseForbidden("You are not authorized to view this record.")
@@ -192,10 +268,22 @@ class DoctorLoginView(View):
 def doctor_dashboard(request):
     # list patients (optionally restrict to those in practitioner's care)
     q = request.GET.get("q")
-    patients = Patient.objects.all().order_by("family")
+    # latest risk per disease comes from PatientRiskSummary: one aggregate query plus one prefetch
+    patients = Patient.objects.annotate(
+        max_risk=Max("risk_summaries__risk_score"),
+        alerts=Count("risk_summaries", filter=Q(risk_summaries__alert=True)),
+    ).prefetch_related(
+        Prefetch("risk_summaries", queryset=PatientRiskSummary.objects.order_by("-risk_score"))
+    )
+    sort = "risk" if request.GET.get("sort") == "risk" else "name"
+    if sort == "risk":
+        patients = patients.order_by(F("max_risk").desc(nulls_last=True), "family")
+    else:
+        patients = patients.order_by("family")
     if q:
-        patients = patients.filter(models.Q(given__icontains=q) | models.Q(family__icontains=q) | models.Q(identifier__icontains=q))
-    return render(request, "doctor/dashboard.html", {"practitioner": request.user.practitioner, "patients": patients})
+        patients = patients.filter(Q(given__icontains=q) | Q(family__icontains=q) | Q(identifier__icontains=q))
+    return render(request, "doctor/dashboard.html", {"practitioner": request.user.practitioner, "patients": patients,
+                                                     "sort": sort})
 
 @practitioner_required
 def doctor_patient_detail(request, patient_id):
@@ -238,34 +326,108 @@ def observation_edit(request, patient_id, obs_id):
 
 
 # Add these patient-facing views (paste anywhere in the file, e.g., after DashboardView)
-def _compute_deid_hash(identifier: str) -> str:
-    salt = getattr(settings, "ML_PATIENT_HASH_SALT", "change_this_in_prod")
-    return hashlib.sha256(f"{identifier}{salt}".encode("utf-8")).hexdigest()
-
-def _coerce_feature_values(expected_features, raw_dict):
-    out = {}
-    for f in expected_features:
-        v = raw_dict.get(f)
-        if v is None or v == "":
-            out[f] = float("nan")   # let imputer handle missing
-            continue
-        try:
-            out[f] = float(v)
-        except Exception:
-            # keep categoricals as strings
-            out[f] = str(v)
-    return out
+def _field_errors_text(error):
+    return "Invalid features: " + "; ".join(f"{field}: {msg}" for field, msg in error.errors.items())
+
+ALL_DISEASES = "__all__"
+
+def _resolve_submitter(request, data):
+    """(Patient or None, deidentified hash) for whoever submitted a self-check."""
+    patient_obj = None
+    if request.user.is_authenticated:
+        patient_obj = getattr(request.user, "patient", None)
+        if patient_obj:
+            deid = compute_deid_hash(str(patient_obj.pk))
+        else:
+            deid = compute_deid_hash(str(request.user.pk))
+    else:
+        anon_id = data.get("anon_id") or data.get("email") or request.META.get("REMOTE_ADDR") or "anon"
+        deid = compute_deid_hash(str(anon_id))
+    return patient_obj, deid
+
+def _ml_observation(patient_obj, deid, disease, features, prob=None, alert_flag=False, band=None, model_version=None):
+    """
+    Unsaved Observation for an ML self-check; prob=None means scoring is still pending.
+    model_version: the store version that produced prob (the name of the root it was scored with).
+    """
+    pending = prob is None
+    return Observation(
+        patient=patient_obj,
+        code=disease,
+        value="pending" if pending else str(round(prob, 6)),
+        unit="probability",
+        effective_date=timezone.now(),
+        performer=None,
+        remarks="ML self-check",
+        disease_key=disease,
+        risk_score=prob,
+        features=json_safe_features(features),
+        deidentified_patient_hash=deid,
+        alert=alert_flag,
+        risk_band=band,
+        model_version=None if pending else model_version,
+        scoring_status=Observation.SCORING_PENDING if pending else Observation.SCORING_DONE,
+    )
+
+def _score_all_and_save(raw, patient_obj, deid):
+    """
+    Full screening: coerce the union of every model's features once, score all
+    models (concurrently, unless scoring runs in the background) and write all
+    Observations with one bulk_create. Returns one result dict per disease.
+    Raises FeatureValidationError for invalid values.
+    """
+    # scores and the version they are tagged with come from one root, whatever gets promoted meanwhile
+    root = ml.active_root()
+    version = root.name if root is not None else None
+    diseases = ml.list_models()
+    validator = ml.get_union_validator(diseases, root)
+    features = validator.as_features(validator.coerce_row(raw))
+    per_disease = {d: {f: features[f] for f in ml.get_expected_features(d)} for d in diseases}
+
+    if scoring.scoring_mode() == scoring.SYNC:
+        scores = scoring.score_all(features, diseases, root)
+    else:
+        # the threshold depends on the version that ends up scoring the row: unknown until then
+        scores = {d: (None, None, False, None) for d in diseases}
+
+    observations = []
+    for d in diseases:
+        prob, _threshold, alert_flag, band = scores[d]
+        obs = _ml_observation(patient_obj, deid, d, per_disease[d], prob, alert_flag, band, version)
+        # bulk_create bypasses Observation.save()
+        obs.set_deidentified_hash()
+        observations.append(obs)
+    Observation.objects.bulk_create(observations)
+    PatientRiskSummary.record(observations)
+
+    results = []
+    for obs in observations:
+        pending = obs.scoring_status == Observation.SCORING_PENDING
+        if pending:
+            scoring.enqueue(obs)
+        results.append({
+            "disease": obs.disease_key,
+            "risk": obs.risk_score,
+            "threshold": scores[obs.disease_key][1],
+            "alert": obs.alert,
+            "band": obs.risk_band,
+            "observation": obs,
+            "pending": pending,
+        })
+    return results
 
 def patient_entry(request):
     """
     Public patient self-check page.
     If the user has a linked Patient record, it will be used; otherwise submission is saved as anonymous (hashed id).
     """
-    models = list_models()
-    schema = {m: get_expected_features(m) for m in models}
+    models = ml.list_models()
+    schema = {m: ml.get_expected_features(m) for m in models}
+    schema[ALL_DISEASES] = ml.get_all_expected_features(models)
     patient_obj = getattr(request.user, "patient", None) if request.user.is_authenticated else None
     return render(request, "patient/patient_entry.html", {
         "models": models,
+        "all_diseases": ALL_DISEASES,
         "schema_json": json.dumps(schema),
         "patient": patient_obj,
     })
@@ -275,14 +437,17 @@ def patient_submit(request):
     """
     Handles patient-submitted features. Accepts form fields named exactly as features.
     Saves an Observation and renders result page.
+    disease="__all__" scores every model and saves one Observation per disease.
     """
     disease = request.POST.get("disease")
     if not disease:
         return HttpResponseBadRequest("Missing disease")
 
-    expected = get_expected_features(disease)
-    if expected is None:
-        return HttpResponseBadRequest("Unknown disease")
+    expected = None
+    if disease != ALL_DISEASES:
+        expected = ml.get_expected_features(disease)
+        if expected is None:
+            return HttpResponseBadRequest("Unknown disease")
 
     # Prefer a single JSON 'features' field; else read individual fields from POST
     features_raw = request.POST.get("features")
@@ -295,52 +460,129 @@ def patient_submit(request):
         # build raw dict from POST — pick only expected keys
         raw = {k: v for k, v in request.POST.items()}
 
-    raw_subset = {f: raw.get(f) for f in expected}
-    features = _coerce_feature_values(expected, raw_subset)
-
     # resolve patient / deid hash
-    patient_obj = None
-    if request.user.is_authenticated:
-        patient_obj = getattr(request.user, "patient", None)
-        if patient_obj:
-            deid = _compute_deid_hash(str(patient_obj.pk))
-        else:
-            deid = _compute_deid_hash(str(request.user.pk))
-    else:
-        anon_id = request.POST.get("anon_id") or request.POST.get("email") or request.META.get("REMOTE_ADDR") or "anon"
-        deid = _compute_deid_hash(str(anon_id))
+    patient_obj, deid = _resolve_submitter(request, request.POST)
 
-    # call model
+    if disease == ALL_DISEASES:
+        try:
+            results = _score_all_and_save(raw, patient_obj, deid)
+        except ml.FeatureValidationError as e:
+            return HttpResponseBadRequest(_field_errors_text(e))
+        except Exception as e:
+            return HttpResponseBadRequest(f"Prediction error: {e}")
+        return render(request, "patient/patient_result_all.html", {"results": results})
+
+    # one float row in schema order; blanks are missing values for the imputer
+    root = ml.active_root()
     try:
-        prob = float(predict_risk(disease, features))
+        validator = ml.get_validator(disease, root)
+        row = validator.coerce_row(raw)
+    except ml.FeatureValidationError as e:
+        return HttpResponseBadRequest(_field_errors_text(e))
     except Exception as e:
+        # missing or unreadable artifacts
         return HttpResponseBadRequest(f"Prediction error: {e}")
+    features = validator.as_features(row)
 
-    # threshold from settings
-    thresholds = getattr(settings, "ML_RISK_THRESHOLDS", {})
-    threshold = float(thresholds.get(disease, 0.2))
-    alert_flag = prob >= threshold
+    version = root.name if root is not None else None
+    if scoring.scoring_mode() == scoring.SYNC:
+        # call model
+        try:
+            prob, threshold, alert_flag, band = scoring.score_features(disease, row, root)
+        except Exception as e:
+            return HttpResponseBadRequest(f"Prediction error: {e}")
+    else:
+        # scored in the background; risk_score/alert/threshold are filled in when it completes
+        prob, threshold, alert_flag, band = None, None, False, None
 
     # Save as Observation (fill required fields)
-    obs = Observation.objects.create(
-        patient=patient_obj,
-        code=disease,
-        value=str(round(prob, 6)),
-        unit="probability",
-        effective_date=timezone.now(),
-        performer=None,
-        remarks="ML self-check",
-        disease_key=disease,
-        risk_score=prob,
-        features=features,
-        deidentified_patient_hash=deid,
-        alert=alert_flag
-    )
+    obs = _ml_observation(patient_obj, deid, disease, features, prob, alert_flag, band, version)
+    obs.save()
+    pending = obs.scoring_status == Observation.SCORING_PENDING
+    if pending:
+        scoring.enqueue(obs)
 
     return render(request, "patient/patient_result.html", {
         "disease": disease,
         "risk": prob,
         "threshold": threshold,
         "alert": alert_flag,
-        "observation": obs
+        "band": band,
+        "observation": obs,
+        "pending": pending,
+    })
+
+class ScoreAllAPIView(APIView):
+    """
+    POST {"features": {...}, "anon_id": optional} -> risk for every model.
+    Features are parsed once for all models and the Observations are written in one bulk insert.
+    """
+
+    def post(self, request):
+        features = request.data.get("features")
+        if not isinstance(features, dict):
+            return Response({"detail": "Expected a 'features' object"}, status=status.HTTP_400_BAD_REQUEST)
+        patient_obj, deid = _resolve_submitter(request, request.data)
+        try:
+            results = _score_all_and_save(features, patient_obj, deid)
+        except ml.FeatureValidationError as e:
+            return Response({"detail": "Invalid features", "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response({"detail": f"Prediction error: {e}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": [
+            {
+                "disease": r["disease"],
+                "risk": r["risk"],
+                "threshold": r["threshold"],
+                "alert": r["alert"],
+                "band": r["band"],
+                "status": r["observation"].scoring_status,
+                "observation_id": str(r["observation"].pk),
+            }
+            for r in results
+        ]})
+
+def _can_view_self_check(user, obs):
+    """Self-checks linked to a patient are only visible to that patient and to practitioners/staff."""
+    if obs.patient_id is None:
+        return True
+    is_owner = user.is_authenticated and getattr(user, "patient", None) is not None and user.patient.pk == obs.patient_id
+    is_staff = user.is_authenticated and (hasattr(user, "practitioner") or user.is_staff or user.is_superuser)
+    return is_owner or is_staff
+
+def patient_score_status(request, pk):
+    """
+    JSON status of a self-check Observation, polled by the result page while it is pending.
+    Observations linked to a patient are only visible to that patient and to practitioners/staff.
+    """
+    obs = get_object_or_404(Observation, pk=pk, disease_key__isnull=False)
+    if not _can_view_self_check(request.user, obs):
+        return HttpResponseForbidden("You are not authorized to view this record.")
+    return JsonResponse({
+        "id": str(obs.pk),
+        "disease": obs.disease_key,
+        "status": obs.scoring_status,
+        "risk": obs.risk_score,
+        "threshold": scoring.observation_threshold(obs),
+        "alert": obs.alert,
+        "band": obs.risk_band,
     })
+
+def patient_explanation(request, pk):
+    """
+    JSON feature contributions of a scored self-check, computed on the first request
+    and served from Observation.explanation afterwards.
+    """
+    obs = get_object_or_404(Observation, pk=pk, disease_key__isnull=False)
+    if not _can_view_self_check(request.user, obs):
+        return HttpResponseForbidden("You are not authorized to view this record.")
+    if obs.scoring_status != Observation.SCORING_DONE:
+        return JsonResponse({"id": str(obs.pk), "status": obs.scoring_status, "explanation": None}, status=409)
+    explanation = explanations.get_explanation(obs)
+    if explanation is None:
+        if obs.explanation is None and not explanations.same_version(obs, ml.active_version()):
+            return JsonResponse({"detail": f"This result was scored by model version {obs.model_version}, "
+                                           "which is no longer served, and cannot be explained."}, status=404)
+        return JsonResponse({"detail": "This result cannot be explained."}, status=404)
+    return JsonResponse({"id": str(obs.pk), "disease": obs.disease_key, "risk": obs.risk_score,
+                         "status": obs.scoring_status, "explanation": explanation})
@@ -135,6 +135,7 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# only used for model versions without a calibrated risk table (see ml_nhanes_module/calibration.py)
 ML_RISK_THRESHOLDS = {
     "Diabetes": 0.20,
     "Liver Condition": 0.20,
@@ -142,6 +143,29 @@ ML_RISK_THRESHOLDS = {
     "CVD": 0.15,
 }
 
+# where self-check scoring runs: "sync" (inline), "thread" (in-process pool) or
+# "queue" (DB-backed; run `python manage.py run_scoring_worker` alongside the web process)
+ML_SCORING_MODE = os.environ.get("ML_SCORING_MODE", "sync")
+ML_SCORING_THREADS = int(os.environ.get("ML_SCORING_THREADS", "2"))
+
+# coalesce concurrent single-row predictions into batches (helps threaded workers / the thread pool)
+ML_MICROBATCH = {
+    "enabled": os.environ.get("ML_MICROBATCH", "0") == "1",
+    "max_batch": int(os.environ.get("ML_MICROBATCH_MAX_BATCH", "32")),
+    "max_wait_ms": float(os.environ.get("ML_MICROBATCH_MAX_WAIT_MS", "5")),
+}
+
+# memo of repeated self-check inputs; entries are keyed by model artifact version
+# so a retrain never serves stale scores. maxsize 0 disables it, ttl in seconds (None = no expiry)
+ML_PREDICTION_CACHE = {
+    "maxsize": int(os.environ.get("ML_PREDICTION_CACHE_SIZE", "1024")),
+    "ttl": float(os.environ.get("ML_PREDICTION_CACHE_TTL", "3600")),
+}
+
+# "compact" serves the pruned exports built by `compile_models --profile compact` (less memory per
+# worker, slightly different scores; see each export's report.json); "full" the exact ones
+ML_SERVING_PROFILE = os.environ.get("ML_SERVING_PROFILE", "full")
+
 # secure salt for de-id; set this in prod env instead of using fallback
 ML_PATIENT_HASH_SALT = os.environ.get("ML_PATIENT_HASH_SALT", "change_this_in_prod")
 
@@ -0,0 +1,32 @@
+# gunicorn.conf.py — picked up automatically when gunicorn is started from the repo root
+#
+# ML_PRELOAD controls when the risk models are loaded:
+#   off    (default) each worker loads them on its first prediction
+#   worker load them in every worker right after fork, before it takes requests
+#   master load the app and models once in the master; workers share those pages copy-on-write
+import os
+
+ML_PRELOAD = os.environ.get("ML_PRELOAD", "off").lower()
+
+preload_app = ML_PRELOAD == "master"
+
+
+def _preload_models(log):
+    from ehr.ml_nhanes_module import preload_models
+    try:
+        stats = preload_models()
+    except Exception as e:
+        # a missing/broken artifact should not stop the site from serving non-ML pages
+        log.warning("ML preload failed: %s", e)
+        return
+    log.info("ML models preloaded: %s", ", ".join(stats["cached"]))
+
+
+def when_ready(server):
+    if ML_PRELOAD == "master":
+        _preload_models(server.log)
+
+
+def post_fork(server, worker):
+    if ML_PRELOAD == "worker":
+        _preload_models(server.log)